@@ -8,7 +8,12 @@
 # Visit https://docs.turta.io for documentation.
 
 from enum import Enum
-from time import sleep
+from time import sleep, monotonic
+from collections import deque
+from math import ceil
+from concurrent.futures import Future
+import threading
+import struct
 import serial
 
 #Enumerations
@@ -49,6 +54,12 @@ class LED_STATES(Enum):
     ON  = "0"
     OFF = "1"
 
+#LED_POLICIES: Status LED signalling during transmit and receive
+class LED_POLICIES(Enum):
+    DISABLED  = 0
+    COALESCED = 1
+    SYNC      = 2
+
 #MODES: Operating modes
 class RADIO_MODES(Enum):
     LORA = "lora"
@@ -169,18 +180,1296 @@ class SPREADING_FACTORS(Enum):
     SF11 = "sf11"
     SF12 = "sf12"   
 
+#MAC_STATES: LoRaWAN stack states, bits 1 to 4 of mac get status
+class MAC_STATES(Enum):
+    IDLE                 = 0
+    TRANSMISSION         = 1
+    BEFORE_RX1           = 2
+    RX1_OPEN             = 3
+    BETWEEN_RX1_AND_RX2  = 4
+    RX2_OPEN             = 5
+    RETRANSMISSION_DELAY = 6
+    APB_DELAY            = 7
+    CLASS_C_RX2_1_OPEN   = 8
+    CLASS_C_RX2_2_OPEN   = 9
+
+#Parameters which change on their own and are never served from the shadow cache
+SHADOW_VOLATILE = ("snr", "rssi", "upctr", "dnctr", "mcastdnctr", "status", "gwnb", "mrgn")
+
+#Unsolicited lines: Second responses and radio events which are not replies to a command
+EVENT_PREFIXES = ("radio_rx", "radio_err", "radio_tx_ok", "mac_rx", "mac_tx_ok", "mac_err", "accepted", "denied")
+
+#Radio defaults after reset, used until a parameter is set or read back
+RADIO_DEFAULTS = {"mod": "lora", "sf": "sf12", "bw": "125", "cr": "4/5", "crc": "on", "prlen": "8", "bitrate": "50000", "sync": "34"}
+RADIO_DEFAULT_FREQ = {REGIONS.US_RN2903: 923300000, REGIONS.EU_RN2483: 868100000}
+
+#Maximum radio tx payload in bytes for each modulation
+RADIO_MAX_PAYLOAD = {"lora": 255, "fsk": 64}
+
+#Responses counted as errors by the link statistics
+ERROR_RESPONSES = ("invalid_param", "err", "busy", "not_joined", "no_free_ch", "silent", "frame_counter_err_rejoin_needed", "mac_paused", "invalid_data_len", "keys_not_init", "denied", "radio_err", "mac_err")
+
+#Second responses ending a LoRaWAN uplink and a join
+MAC_TX_OUTCOMES = ("mac_tx_ok", "mac_rx", "mac_err", "invalid_data_len")
+MAC_JOIN_OUTCOMES = ("accepted", "denied")
+
+#Default time limits for the second response of an uplink and a join, in seconds
+MAC_TX_TIMEOUT = 60
+MAC_JOIN_TIMEOUT = 30
+
+#Auto-baud: Rates tried by default, fastest first; break length, probe timeout in seconds
+AUTO_BAUD_RATES = (230400, 115200)
+AUTO_BAUD_BREAK = 0.01
+AUTO_BAUD_PROBE_TIMEOUT = 0.25
+
+#Commands after which the module answers at its reset baud rate
+RESET_COMMANDS = ("sys reset", "sys factoryRESET")
+
+#Upper bounds of the round-trip latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+#UART recordings: File signature, and record header of direction, microseconds since the previous record and data length
+RECORDING_MAGIC = b"TLR\x01"
+RECORDING_HEADER = struct.Struct(">cIH")
+RECORDING_WRITE = b"W"
+RECORDING_READ = b"R"
+
+_CMD_TYPE_VALUES = frozenset(e.value for e in CMD_TYPES)
+
+#Time on Air
+
+def time_on_air(payload_length, spreading_factor = SPREADING_FACTORS.SF7, bandwidth = RADIO_BW.BW_125, coding_rate = CODING_RATES.R_4_5, crc_header = CRC_HEADER_STATES.ON, preamble = 8, mode = RADIO_MODES.LORA, fsk_bitrate = 50000, sync_length = 3, explicit_header = True, low_dr_optimize = None):
+    """Calculates the time a packet occupies the channel.
+
+    Parameters:
+    payload_length (int or list): Payload length in bytes, or a sequence of payload lengths
+    spreading_factor (SPREADING_FACTORS): Spreading factor, for LoRa modulation (Default is SF7)
+    bandwidth (RADIO_BW): Radio bandwidth, for LoRa modulation (Default is BW_125)
+    coding_rate (CODING_RATES): Coding rate, for LoRa modulation (Default is R_4_5)
+    crc_header (CRC_HEADER_STATES): The state of the CRC (Default is ON)
+    preamble (int): Preamble length; symbols for LoRa, bytes for FSK (Default is 8)
+    mode (RADIO_MODES): Modulation method (Default is LORA)
+    fsk_bitrate (int): Bit rate, for FSK modulation (Default is 50000)
+    sync_length (int): Sync word length in bytes, for FSK modulation (Default is 3)
+    explicit_header (bool): LoRa explicit header mode, as used by the module (Default is True)
+    low_dr_optimize (bool): Low data rate optimization; None enables it for symbols of 16 ms or longer (Default is None)
+
+    Returns:
+    float or list: Time on air in seconds, a list if a sequence of payload lengths is given"""
+
+    if mode not in RADIO_MODES:
+        raise ValueError('mode is not a member of RADIO_MODES.')
+    if crc_header not in CRC_HEADER_STATES:
+        raise ValueError('crc_header is not a member of CRC_HEADER_STATES.')
+
+    if mode == RADIO_MODES.FSK:
+        if fsk_bitrate < 1 or fsk_bitrate > 300000:
+            raise ValueError('fsk_bitrate is outside of 1 and 300000.')
+        #Preamble, sync word, length byte, payload and CRC
+        overhead = preamble + sync_length + 1 + (2 if crc_header == CRC_HEADER_STATES.ON else 0)
+        byte_time = 8.0 / fsk_bitrate
+        calc = lambda length: (overhead + length) * byte_time
+    else:
+        if spreading_factor not in SPREADING_FACTORS:
+            raise ValueError('spreading_factor is not a member of SPREADING_FACTORS.')
+        if bandwidth not in RADIO_BW:
+            raise ValueError('bandwidth is not a member of RADIO_BW.')
+        if coding_rate not in CODING_RATES:
+            raise ValueError('coding_rate is not a member of CODING_RATES.')
+
+        sf = int(spreading_factor.value[2:])
+        cr = int(coding_rate.value[2:]) - 4
+        t_sym = (2 ** sf) / (float(bandwidth.value) * 1000)
+        de = 1 if (t_sym >= 0.016 if low_dr_optimize is None else low_dr_optimize) else 0
+        ih = 0 if explicit_header else 1
+        crc_bits = 16 if crc_header == CRC_HEADER_STATES.ON else 0
+        t_preamble = (preamble + 4.25) * t_sym
+        divisor = 4.0 * (sf - 2 * de)
+        calc = lambda length: t_preamble + (8 + max(ceil((8 * length - 4 * sf + 28 + crc_bits - 20 * ih) / divisor) * (cr + 4), 0)) * t_sym
+
+    if hasattr(payload_length, "__iter__"):
+        return [calc(length) for length in payload_length]
+    return calc(payload_length)
+
+class _Reply(object):
+    """Response slot for a command waiting on the background reader."""
+
+    __slots__ = ("done", "line", "received_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.line = ""
+        self.received_at = None
+
+class _CommandStats(object):
+    """Counters for one command type and subcommand."""
+
+    __slots__ = ("count", "bytes_out", "bytes_in", "latency_total", "latency_max", "overhead_total", "histogram", "timeouts", "errors")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.overhead_total = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.timeouts = 0
+        self.errors = 0
+
+class LinkStats(object):
+    """Latency and throughput statistics of the UART link, per command type and subcommand."""
+
+    def __init__(self, baudrate = 57600, log_size = 0):
+        """Initiates the statistics.
+
+        Parameters:
+        baudrate (int): Serial port baud rate, used to estimate the time spent on the UART (Default is 57600)
+        log_size (int): Number of recent commands kept in the rolling log, 0 disables it (Default is 0)"""
+
+        self.baudrate = baudrate
+        self.cache_hits = 0
+        self.log = deque(maxlen = log_size) if log_size > 0 else None
+        self._commands = {}
+        self._started = monotonic()
+        self._lock = threading.Lock()
+
+    def set_log_size(self, log_size):
+        """Enables, resizes or disables the rolling log of recent commands.
+
+        Parameters:
+        log_size (int): Number of recent commands to keep, 0 disables the log"""
+
+        if log_size < 0:
+            raise ValueError('log_size should be at least 0.')
+
+        with self._lock:
+            self.log = deque(self.log or (), maxlen = log_size) if log_size > 0 else None
+
+    @staticmethod
+    def classify(line):
+        """Splits a command line into its command type and subcommand.
+
+        Parameters:
+        line (str): Command line
+
+        Returns:
+        tuple: Command type (str, a CMD_TYPES value) and subcommand (str, empty if there is none)"""
+
+        words = line.split(" ", 3)
+        if len(words) > 1 and words[0] + " " + words[1] in _CMD_TYPE_VALUES:
+            return (words[0] + " " + words[1], words[2] if len(words) > 2 and words[1] in ("set", "get") else "")
+        return (words[0], words[1] if len(words) > 1 else "")
+
+    def record(self, line, res, latency, overhead = 0.0):
+        """Records a command and its response.
+
+        Parameters:
+        line (str): Command line
+        res (str): Response from the device, empty if the device did not respond in time
+        latency (float): Time from writing the command until the response was read, in seconds
+        overhead (float): Time spent in the library before the command was written, in seconds (Default is 0)"""
+
+        key = self.classify(line)
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+
+        with self._lock:
+            stats = self._commands.get(key)
+            if stats is None:
+                stats = self._commands[key] = _CommandStats()
+            stats.count += 1
+            stats.bytes_out += len(line) + 2
+            stats.bytes_in += len(res) + 2 if res else 0
+            stats.latency_total += latency
+            stats.overhead_total += overhead
+            if latency > stats.latency_max:
+                stats.latency_max = latency
+            stats.histogram[bucket] += 1
+            if res == "":
+                stats.timeouts += 1
+            elif res in ERROR_RESPONSES:
+                stats.errors += 1
+            if self.log is not None:
+                self.log.append((monotonic(), line, res, latency))
+
+    def snapshot(self):
+        """Returns the statistics collected so far.
+
+        Returns:
+        dict: Statistics per command type and subcommand, and totals. Latencies are in seconds; uart_time estimates the part of the latency spent transferring the bytes at the baud rate."""
+
+        with self._lock:
+            commands = {}
+            totals = {"count": 0, "bytes_out": 0, "bytes_in": 0, "timeouts": 0, "errors": 0, "latency_total": 0.0, "overhead_total": 0.0}
+            for (cmd_type, sub), stats in self._commands.items():
+                uart_time = (stats.bytes_out + stats.bytes_in) * 10.0 / self.baudrate
+                commands.setdefault(cmd_type, {})[sub] = {
+                    "count": stats.count,
+                    "bytes_out": stats.bytes_out,
+                    "bytes_in": stats.bytes_in,
+                    "latency_mean": stats.latency_total / stats.count,
+                    "latency_max": stats.latency_max,
+                    "latency_histogram": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["inf"], stats.histogram)),
+                    "uart_time_mean": uart_time / stats.count,
+                    "overhead_mean": stats.overhead_total / stats.count,
+                    "timeouts": stats.timeouts,
+                    "errors": stats.errors
+                }
+                for name in totals:
+                    totals[name] += getattr(stats, name)
+
+            elapsed = monotonic() - self._started
+            totals["elapsed"] = elapsed
+            totals["cache_hits"] = self.cache_hits
+            totals["commands_per_second"] = totals["count"] / elapsed if elapsed > 0 else 0.0
+            totals["bytes_per_second"] = (totals["bytes_out"] + totals["bytes_in"]) / elapsed if elapsed > 0 else 0.0
+            return {"commands": commands, "totals": totals}
+
+    def reset(self):
+        """Clears the statistics and the rolling log."""
+
+        with self._lock:
+            self._commands.clear()
+            self.cache_hits = 0
+            self._started = monotonic()
+            if self.log is not None:
+                self.log.clear()
+
+class RecordingSerial(object):
+    """Serial port wrapper which logs every write and read with its monotonic time.
+
+    Each record is a RECORDING_HEADER followed by the data; reads which timed out are recorded with no data."""
+
+    def __init__(self, device, path):
+        """Starts recording.
+
+        Parameters:
+        device (serial.Serial): Serial port to wrap
+        path (str): Recording file, overwritten if it exists; lines are truncated to 65535 bytes"""
+
+        self.device = device
+        self.path = path
+        self.records = 0
+        self._file = open(path, "wb")
+        self._file.write(RECORDING_MAGIC)
+        self._last = monotonic()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    #Settings the driver changes are written through to the wrapped port
+
+    @property
+    def timeout(self):
+        """float: Read timeout of the wrapped serial port."""
+
+        return self.device.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.device.timeout = value
+
+    @property
+    def baudrate(self):
+        """int: Baud rate of the wrapped serial port."""
+
+        return self.device.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self.device.baudrate = value
+
+    def _record(self, direction, data):
+        """Appends a record to the recording.
+
+        Parameters:
+        direction (bytes): RECORDING_WRITE or RECORDING_READ
+        data (bytes): Data written or read"""
+
+        with self._lock:
+            if self._file is None:
+                return
+            now = monotonic()
+            delta = min(int((now - self._last) * 1000000), 0xFFFFFFFF)
+            self._last = now
+            data = data[0:0xFFFF]
+            self._file.write(RECORDING_HEADER.pack(direction, delta, len(data)))
+            self._file.write(data)
+            self.records += 1
+
+    def write(self, data):
+        self._record(RECORDING_WRITE, bytes(data))
+        return self.device.write(data)
+
+    def readline(self, *args):
+        data = self.device.readline(*args)
+        self._record(RECORDING_READ, data)
+        return data
+
+    def read(self, *args):
+        data = self.device.read(*args)
+        if data:
+            self._record(RECORDING_READ, data)
+        return data
+
+    def flush(self):
+        """Writes the buffered records to the recording file."""
+
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+        if hasattr(self.device, "flush"):
+            self.device.flush()
+
+    def stop(self):
+        """Closes the recording file. The serial port stays open.
+
+        Returns:
+        serial.Serial: The wrapped serial port"""
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return self.device
+
+    def close(self):
+        """Closes the recording file and the serial port."""
+
+        self.stop()
+        self.device.close()
+
+def read_recording(path):
+    """Reads a UART recording.
+
+    Parameters:
+    path (str): Recording file
+
+    Returns:
+    list: (seconds since the recording started, direction, data) tuples; direction is RECORDING_WRITE or RECORDING_READ"""
+
+    with open(path, "rb") as f:
+        content = f.read()
+    if not content.startswith(RECORDING_MAGIC):
+        raise ValueError('path is not a UART recording.')
+
+    records = []
+    t = 0.0
+    pos = len(RECORDING_MAGIC)
+    while pos + RECORDING_HEADER.size <= len(content):
+        direction, delta, length = RECORDING_HEADER.unpack_from(content, pos)
+        pos += RECORDING_HEADER.size
+        data = content[pos:pos + length]
+        pos += length
+        t += delta / 1000000.0
+        records.append((t, direction, data))
+    return records
+
+class ReplaySerial(object):
+    """Serial port stand-in which returns the reads of a UART recording, for RN2XX3(port = ReplaySerial(path)).
+
+    Recorded reads are returned in order, each at its recorded time from the first access divided by the speed. Writes are compared with the recorded writes; differences are counted in mismatches."""
+
+    def __init__(self, path, speed = 1.0, timeout = 2):
+        """Loads a recording.
+
+        Parameters:
+        path (str): Recording file
+        speed (float): Replay speed; 1 is the original timing, 0 returns the reads without delay (Default is 1)
+        timeout (float): Time in seconds readline() waits once the recording is exhausted (Default is 2)"""
+
+        if speed < 0:
+            raise ValueError('speed should be at least 0.')
+
+        records = read_recording(path)
+        self.reads = deque((t, data) for t, direction, data in records if direction == RECORDING_READ)
+        self.writes = deque(data for t, direction, data in records if direction == RECORDING_WRITE)
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+        self.mismatches = 0
+        self.unexpected = []
+        self._start = None
+        self._offset = records[0][0] if records else 0.0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def _wait(self, t):
+        """Sleeps until a recorded time is reached.
+
+        Parameters:
+        t (float): Recorded time in seconds"""
+
+        if self._start is None:
+            self._start = monotonic()
+        if self.speed > 0:
+            remaining = self._start + (t - self._offset) / self.speed - monotonic()
+            if remaining > 0:
+                self._cancel.wait(remaining)
+
+    def write(self, data):
+        with self._lock:
+            if self._start is None:
+                self._start = monotonic()
+            expected = self.writes.popleft() if self.writes else None
+            if expected != bytes(data):
+                self.mismatches += 1
+                self.unexpected.append(bytes(data))
+        return len(data)
+
+    def readline(self, *args):
+        with self._lock:
+            record = self.reads.popleft() if self.reads else None
+        if record is None:
+            if self.timeout:
+                self._cancel.wait(self.timeout)
+            return b""
+        self._wait(record[0])
+        return record[1]
+
+    def read(self, size = 1):
+        return self.readline()
+
+    def cancel_read(self):
+        self._cancel.set()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self._cancel.set()
+
+    @property
+    def exhausted(self):
+        """bool: True once every recorded read has been returned."""
+
+        return not self.reads
+
+class MacStatus(object):
+    """Decoded 'mac get status' bitfield."""
+
+    __slots__ = ("value", "joined", "state", "automatic_reply", "adr", "silent", "paused", "rx_done", "link_check",
+        "channels_updated", "power_updated", "nbrep_updated", "prescaler_updated", "rx2_updated", "rx_timing_updated",
+        "rejoin_needed", "multicast")
+
+    def __init__(self, value):
+        """Decodes the status.
+
+        Parameters:
+        value (int): Status bitfield"""
+
+        self.value = value
+        self.joined = bool(value & 0x1)
+        state = (value >> 1) & 0xF
+        self.state = MAC_STATES(state) if state in [e.value for e in MAC_STATES] else state
+        self.automatic_reply = bool(value & (1 << 5))
+        self.adr = bool(value & (1 << 6))
+        self.silent = bool(value & (1 << 7))
+        self.paused = bool(value & (1 << 8))
+        self.rx_done = bool(value & (1 << 9))
+        self.link_check = bool(value & (1 << 10))
+        self.channels_updated = bool(value & (1 << 11))
+        self.power_updated = bool(value & (1 << 12))
+        self.nbrep_updated = bool(value & (1 << 13))
+        self.prescaler_updated = bool(value & (1 << 14))
+        self.rx2_updated = bool(value & (1 << 15))
+        self.rx_timing_updated = bool(value & (1 << 16))
+        self.rejoin_needed = bool(value & (1 << 17))
+        self.multicast = bool(value & (1 << 18))
+
+    def __repr__(self):
+        return "MacStatus(0x%08X, joined=%s, state=%s)" % (self.value, self.joined, self.state)
+
+class MacOutcome(object):
+    """Final outcome of a LoRaWAN uplink or join."""
+
+    __slots__ = ("status", "port", "data", "started_at", "completed_at")
+
+    def __init__(self, line, started_at):
+        """Decodes the response which ended the operation.
+
+        Parameters:
+        line (str): First response if it was not 'ok', otherwise the second response; empty if the module did not answer in time
+        started_at (float): Monotonic time the command was sent"""
+
+        words = line.split(" ")
+        self.status = words[0]
+        self.port = None
+        self.data = None
+        if self.status == "mac_rx" and len(words) > 1:
+            self.port = int(words[1])
+            self.data = bytes.fromhex(words[2]) if len(words) > 2 else b""
+        self.started_at = started_at
+        self.completed_at = monotonic()
+
+    @property
+    def ok(self):
+        """bool: True if the uplink was sent or the join was accepted."""
+
+        return self.status in ("mac_tx_ok", "mac_rx", "accepted")
+
+    def __repr__(self):
+        return "MacOutcome(%s, port=%s, data=%r)" % (self.status, self.port, self.data)
+
+class _MacOperation(object):
+    """A LoRaWAN uplink or join waiting to be sent or for its second response."""
+
+    __slots__ = ("command", "outcomes", "timeout", "future", "done", "line", "answered")
+
+    def __init__(self, command, outcomes, timeout, future, done):
+        self.command = command
+        self.outcomes = outcomes
+        self.timeout = timeout
+        self.future = future
+        self.done = done
+        self.line = ""
+        self.answered = False
+
+def _enum_parser(enum):
+    """Returns a parser converting a response to a member of an enumeration, case insensitively."""
+
+    values = dict((e.value.lower(), e) for e in enum)
+    return lambda res: values[res.lower()]
+
+#Typed parameters: Parser for each radio get and mac get response
+RADIO_PARAMETERS = {
+    "mod": _enum_parser(RADIO_MODES), "freq": int, "pwr": int, "sf": _enum_parser(SPREADING_FACTORS), "afcbw": float, "rxbw": float,
+    "bitrate": int, "fdev": int, "prlen": int, "crc": _enum_parser(CRC_HEADER_STATES), "iqi": _enum_parser(IQI_STATES),
+    "cr": _enum_parser(CODING_RATES), "wdt": int, "bw": _enum_parser(RADIO_BW), "snr": int, "rssi": int, "sync": str, "bt": _enum_parser(GFBTS)
+}
+MAC_PARAMETERS = {
+    "adr": _enum_parser(AR_STATES), "ar": _enum_parser(AR_STATES), "class": _enum_parser(DEVICE_CLASS), "dr": int, "devaddr": str,
+    "deveui": str, "appeui": str, "rxdelay1": int, "rxdelay2": int, "retx": int, "pwridx": int, "sync": str, "dcycleps": int,
+    "mrgn": int, "gwnb": int, "status": lambda res: MacStatus(int(res, 16)), "upctr": int, "dnctr": int
+}
+
+def parse_parameter(parsers, name, res):
+    """Converts a get response to its type.
+
+    Parameters:
+    parsers (dict): RADIO_PARAMETERS or MAC_PARAMETERS
+    name (str): Parameter name
+    res (str): Response from the device
+
+    Returns:
+    object: Parsed value, None if the device did not answer with a valid value"""
+
+    try:
+        return parsers[name](res.strip())
+    except (KeyError, ValueError, AttributeError):
+        return None
+
+class StatusSnapshot(object):
+    """Radio and LoRaWAN parameters read in one exchange by RN2XX3.status_snapshot(). Attributes are named radio_<parameter> and mac_<parameter>, and hold None if the module did not answer."""
+
+    __slots__ = ("taken_at", "duration") + tuple("radio_" + name for name in RADIO_PARAMETERS) + tuple("mac_" + name for name in MAC_PARAMETERS)
+
+    def __init__(self, taken_at, duration):
+        self.taken_at = taken_at
+        self.duration = duration
+
+    def as_dict(self):
+        """Returns the snapshot as a dict.
+
+        Returns:
+        dict: Attribute names and values"""
+
+        return dict((name, getattr(self, name, None)) for name in self.__slots__)
+
+class LinkSample(object):
+    """Link quality of one received packet."""
+
+    __slots__ = ("time", "sender", "length", "snr", "rssi", "sequence")
+
+    def __init__(self, time, sender, length, snr, rssi, sequence):
+        self.time = time
+        self.sender = sender
+        self.length = length
+        self.snr = snr
+        self.rssi = rssi
+        self.sequence = sequence
+
+def _percentile(values, p):
+    """Returns the nearest-rank percentile of sorted values.
+
+    Parameters:
+    values (list): Sorted values
+    p (float): Percentile, between 0 and 100
+
+    Returns:
+    float: Percentile, None if there are no values"""
+
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(ceil(p / 100.0 * len(values))) - 1))]
+
+class LinkQualityMonitor(object):
+    """Fixed-size ring buffer of per-packet SNR and RSSI, with rolling statistics and loss estimates per sender.
+
+    Senders and sequence numbers are taken from the payloads by the optional sender and sequence functions. Loss is estimated from gaps in the sequence numbers."""
+
+    def __init__(self, capacity = 256, sender = None, sequence = None, sequence_modulo = 256):
+        """Initiates the monitor.
+
+        Parameters:
+        capacity (int): Number of samples kept, overall and per sender (Default is 256)
+        sender (function): Returns the sender of a payload (bytes); None puts every packet under sender None (Default is None)
+        sequence (function): Returns the sequence number of a payload (bytes); None disables loss estimation (Default is None)
+        sequence_modulo (int): Sequence numbers wrap around at this value (Default is 256)"""
+
+        if capacity < 1:
+            raise ValueError('capacity should be at least 1.')
+
+        self.capacity = capacity
+        self.sequence_modulo = sequence_modulo
+        self.samples = deque(maxlen = capacity)
+        self._sender = sender
+        self._sequence = sequence
+        self._by_sender = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, payload, snr, rssi = None):
+        """Adds a received packet.
+
+        Parameters:
+        payload (bytes): Received payload
+        snr (int): Signal to noise ratio of the packet in dB, None if unknown
+        rssi (int): Signal strength of the packet in dBm, None if unknown (Default is None)
+
+        Returns:
+        LinkSample: The recorded sample"""
+
+        try:
+            sender = self._sender(payload) if self._sender is not None else None
+            sequence = self._sequence(payload) if self._sequence is not None else None
+        except (IndexError, ValueError, TypeError):
+            sender = None
+            sequence = None
+        sample = LinkSample(monotonic(), sender, len(payload), snr, rssi, sequence)
+
+        with self._lock:
+            self.samples.append(sample)
+            history = self._by_sender.get(sender)
+            if history is None:
+                history = self._by_sender[sender] = deque(maxlen = self.capacity)
+                self._counters[sender] = [0, 0, None]
+            history.append(sample)
+
+            #Received, expected and last sequence number
+            counters = self._counters[sender]
+            counters[0] += 1
+            if sequence is None or counters[2] is None:
+                counters[1] += 1
+            else:
+                gap = (sequence - counters[2]) % self.sequence_modulo
+                if gap == 0:
+                    counters[0] -= 1                        #Duplicate
+                elif gap <= self.sequence_modulo // 2:
+                    counters[1] += gap
+                else:
+                    counters[1] += 1                        #Sender restarted or reordered
+            if sequence is not None:
+                counters[2] = sequence
+        return sample
+
+    def senders(self):
+        """Returns the senders seen so far.
+
+        Returns:
+        list: Senders"""
+
+        with self._lock:
+            return list(self._by_sender)
+
+    def statistics(self, sender = None):
+        """Returns rolling statistics of a sender's recent packets.
+
+        Parameters:
+        sender (object): Sender, as returned by the sender function (Default is None)
+
+        Returns:
+        dict: Packet count, SNR and RSSI mean and percentiles, received and expected packets and estimated loss; None if the sender is unknown"""
+
+        with self._lock:
+            history = self._by_sender.get(sender)
+            if history is None:
+                return None
+            history = list(history)
+            received, expected, last = self._counters[sender]
+
+        res = {"count": len(history), "last_seen": history[-1].time, "received": received, "expected": expected,
+            "loss": 1.0 - float(received) / expected if expected and self._sequence is not None else None}
+        for name in ("snr", "rssi"):
+            values = sorted(getattr(sample, name) for sample in history if getattr(sample, name) is not None)
+            res[name + "_mean"] = float(sum(values)) / len(values) if values else None
+            res[name + "_min"] = values[0] if values else None
+            res[name + "_p10"] = _percentile(values, 10)
+            res[name + "_p50"] = _percentile(values, 50)
+            res[name + "_p90"] = _percentile(values, 90)
+        return res
+
+    def summary(self):
+        """Returns the statistics of every sender.
+
+        Returns:
+        dict: Statistics by sender"""
+
+        return dict((sender, self.statistics(sender)) for sender in self.senders())
+
+    def reset(self):
+        """Clears the samples and counters."""
+
+        with self._lock:
+            self.samples.clear()
+            self._by_sender.clear()
+            self._counters.clear()
+
+class CommandBatch(object):
+    """Commands collected by RN2XX3.batch() and sent in one pipelined exchange."""
+
+    def __init__(self, lora, window):
+        self._lora = lora
+        self.window = window
+        self.commands = []
+        self.results = []
+
+    def __enter__(self):
+        self.owner = self._lora._batch_owner()
+        self._lora._batch = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lora._batch = None
+        if exc_type is None and self.commands:
+            self.results = list(zip(self.commands, self._lora._pipeline(self.commands, self.window)))
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._lora._batch = None
+        if exc_type is None and self.commands:
+            self.results = list(zip(self.commands, await self._lora._pipeline(self.commands, self.window)))
+        return False
+
+    @property
+    def ok(self):
+        """bool: True if every command in the batch was answered with 'ok'."""
+
+        return all(res == "ok" for cmd, res in self.results)
+
+    @property
+    def failed(self):
+        """list: (command, response) pairs which were not answered with 'ok'."""
+
+        return [(cmd, res) for cmd, res in self.results if res != "ok"]
+
 class RN2XX3:
     """Microchip RN2XX3 LoRa Module"""
 
     #UART Device
-    sp = serial.Serial('/dev/serial0', 57600, timeout=2, write_timeout=2)
+    port = '/dev/serial0'
+    baudrate = 57600
+    timeout = 2
+    write_timeout = 2
+    _sp = None
 
     #Variables
     auto = CONFIG_MODES.NONE
     err_on = False
+    is_initialized = False
+    events_dropped = 0
+    led_policy = LED_POLICIES.SYNC
+    link_quality = None
+    firmware_version = None
+    region = REGIONS.US_RN2903
+    startup_time = None
+    _reader = None
+    _batch = None
+    _mac_op = None
+    _rssi_supported = True
+    auto_baud = None
+    reset_baudrate = 57600
 
     #UART Communication
 
+    @property
+    def sp(self):
+        """serial.Serial: UART device, opened on first use. A serial port object passed as port is not opened again after close()."""
+
+        if self._sp is None:
+            if not isinstance(self.port, str):
+                raise serial.SerialException('port object is closed; pass a new one to use the module again.')
+            with self._port_lock:
+                if self._sp is None:
+                    self._sp = serial.Serial(self.port, self.baudrate, timeout=self.timeout, write_timeout=self.write_timeout)
+        return self._sp
+
+    @sp.setter
+    def sp(self, device):
+        self._sp = device
+
+    def is_open(self):
+        """Returns whether the serial port has been opened.
+
+        Returns:
+        bool: True if the serial port is open"""
+
+        return self._sp is not None and self._sp.is_open
+
+    def start_recording(self, path):
+        """Records every line written to and read from the UART, with monotonic timestamps, until stop_recording() is called. Use ReplaySerial to play the recording back.
+
+        Parameters:
+        path (str): Recording file, overwritten if it exists"""
+
+        self.stop_recording()
+        self.sp = RecordingSerial(self.sp, path)
+
+    def stop_recording(self):
+        """Stops the UART recording and closes the recording file."""
+
+        if isinstance(self.sp, RecordingSerial):
+            self.sp = self.sp.stop()
+
+    def _command(self, line, refresh = False):
+        """Writes a command line to the UART device and reads its response.
+
+        Parameters:
+        line (str): Command line to send
+        refresh (bool): Bypasses the shadow cache (Default is False)
+
+        Returns:
+        str: Response from the device, None if the command is queued in a batch"""
+
+        entered = monotonic()
+        batch = self._batch
+        if batch is not None and batch.owner is not self._batch_owner():
+            #Commands from other threads, such as the LED writer, are not part of the batch
+            batch = None
+
+        cached = None if refresh else self._cached_response(line)
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return cached if batch is None else None
+
+        if batch is not None:
+            batch.commands.append(line)
+            return None
+
+        with self._cmd_lock:
+            written = monotonic()
+            if self._reader is None:
+                self.sp.write((line + "\r\n").encode("utf-8"))
+                self._check_reset(line)
+                res = self.sp.readline()[0:-2].decode("utf-8")
+                received = monotonic()
+            else:
+                reply = _Reply()
+                with self._event_cond:
+                    self._pending.append(reply)
+                self.sp.write((line + "\r\n").encode("utf-8"))
+                self._check_reset(line)
+                res = self._wait_reply(reply)
+                received = reply.received_at or monotonic()
+
+        self.stats.record(line, res, received - written, written - entered)
+        self._on_response(line, res)
+        return res
+
+    def _check_reset(self, line):
+        """Returns the serial port to the reset baud rate after a reset command is written, as the module answers at that rate.
+
+        Parameters:
+        line (str): Command line written"""
+
+        if self.baudrate != self.reset_baudrate and line in RESET_COMMANDS:
+            self._set_port_baudrate(self.reset_baudrate)
+
+    def _pipeline(self, lines, window):
+        """Writes a sequence of command lines without waiting for each response, keeping up to <window> commands in flight.
+
+        Parameters:
+        lines (list): Command lines to send
+        window (int): Maximum number of commands awaiting a response
+
+        Returns:
+        list: Responses from the device, in command order"""
+
+        responses = []
+        written = []
+        received = []
+        with self._cmd_lock:
+            if self._reader is None:
+                while len(responses) < len(lines):
+                    while len(written) < len(lines) and len(written) - len(responses) < window:
+                        written.append(monotonic())
+                        self.sp.write((lines[len(written) - 1] + "\r\n").encode("utf-8"))
+                    responses.append(self.sp.readline()[0:-2].decode("utf-8"))
+                    received.append(monotonic())
+            else:
+                replies = []
+                for line in lines:
+                    if len(replies) - len(responses) >= window:
+                        responses.append(self._wait_reply(replies[len(responses)]))
+                    reply = _Reply()
+                    with self._event_cond:
+                        self._pending.append(reply)
+                    written.append(monotonic())
+                    self.sp.write((line + "\r\n").encode("utf-8"))
+                    replies.append(reply)
+                while len(responses) < len(replies):
+                    responses.append(self._wait_reply(replies[len(responses)]))
+                received = [reply.received_at or monotonic() for reply in replies]
+
+        for line, res, sent_at, received_at in zip(lines, responses, written, received):
+            self.stats.record(line, res, received_at - sent_at)
+            self._on_response(line, res)
+        return responses
+
+    def _wait_reply(self, reply):
+        """Waits for a response slot to be filled by the background reader.
+
+        Parameters:
+        reply (_Reply): Response slot
+
+        Returns:
+        str: Response from the device, empty if the device did not respond in time"""
+
+        if not reply.done.wait(self.sp.timeout):
+            with self._event_cond:
+                if reply in self._pending:
+                    self._pending.remove(reply)
+        return reply.line
+
+    def batch(self, window = 4):
+        """Collects the commands issued inside a 'with' block and sends them in one pipelined exchange when the block ends. Command methods return None inside the block; the responses are in the batch's results.
+
+        Parameters:
+        window (int): Maximum number of commands awaiting a response (Default is 4)
+
+        Returns:
+        CommandBatch: Batch context, results are (command, response) pairs"""
+
+        if window < 1:
+            raise ValueError('window should be at least 1.')
+        return CommandBatch(self, window)
+
+    def _batch_owner(self):
+        """Returns the caller whose commands go into an open batch.
+
+        Returns:
+        threading.Thread: Current thread"""
+
+        return threading.current_thread()
+
+    #Shadow Configuration Cache
+
+    def _cache_key(self, line):
+        """Splits a radio/mac set or get command line into its cache key and value.
+
+        Parameters:
+        line (str): Command line
+
+        Returns:
+        tuple: Cache key (or None if not cacheable), verb ('set' or 'get') and value"""
+
+        words = line.split(" ")
+        if len(words) < 3 or words[0] not in ("radio", "mac") or words[1] not in ("set", "get"):
+            return None, None, None
+        if words[2] == "ch" and len(words) >= 5:
+            key = (words[0], "ch " + words[3], words[4])
+            value = ' '.join(words[5:])
+        else:
+            key = (words[0], words[2])
+            value = ' '.join(words[3:])
+        if key[1] in SHADOW_VOLATILE:
+            return None, None, None
+        return key, words[1], value
+
+    def _cached_response(self, line):
+        """Answers a command from the shadow cache if possible.
+
+        Parameters:
+        line (str): Command line
+
+        Returns:
+        str: 'ok' for a redundant set, the cached value for a get, or None if the command must be sent"""
+
+        if not self.config_cache:
+            return None
+        key, verb, value = self._cache_key(line)
+        if key is None or key not in self._shadow:
+            return None
+        if verb == "get":
+            return self._shadow[key]
+        return "ok" if self._shadow[key] == value else None
+
+    def _update_cache(self, line, res):
+        """Updates the shadow cache with a command and its response.
+
+        Parameters:
+        line (str): Command line
+        res (str): Response from the device"""
+
+        words = line.split(" ")
+        if words[0:2] in (["sys", "reset"], ["sys", "factoryRESET"], ["mac", "reset"], ["mac", "join"], ["mac", "tx"], ["mac", "resume"]):
+            #The module or its LoRaWAN stack has reconfigured itself
+            self._shadow.clear()
+            return
+
+        key, verb, value = self._cache_key(line)
+        if key is None:
+            return
+        if verb == "set":
+            if res == "ok":
+                self._shadow[key] = value
+            else:
+                self._shadow.pop(key, None)
+        elif res not in ("", "invalid_param"):
+            self._shadow[key] = res
+
+    def _on_response(self, line, res):
+        """Tracks the effects of a command once its response has arrived.
+
+        Parameters:
+        line (str): Command line
+        res (str): Response from the device"""
+
+        self._update_cache(line, res)
+        if res == "ok" and line.startswith("radio tx "):
+            length = (len(line) - 9) // 2
+            freq = self._radio_setting("freq")
+            self.airtime[freq] = self.airtime.get(freq, 0.0) + self.radio_time_on_air(length)
+
+    def invalidate_cache(self):
+        """Clears the shadow configuration cache; next get and set commands are sent to the module."""
+
+        self._shadow.clear()
+
+    #Airtime
+
+    def _radio_setting(self, name):
+        """Returns a radio parameter from the shadow cache, or its value after reset.
+
+        Parameters:
+        name (str): Radio parameter name
+
+        Returns:
+        str or int: Parameter value, frequency in Hz as int"""
+
+        if name == "freq":
+            try:
+                return int(self._shadow[("radio", "freq")])
+            except (KeyError, ValueError):
+                return RADIO_DEFAULT_FREQ[self.region]
+        return self._shadow.get(("radio", name), RADIO_DEFAULTS[name])
+
+    def radio_time_on_air(self, payload_length):
+        """Calculates the time on air for the radio's current settings.
+
+        Parameters:
+        payload_length (int or list): Payload length in bytes, or a sequence of payload lengths
+
+        Returns:
+        float or list: Time on air in seconds"""
+
+        try:
+            return time_on_air(payload_length,
+                spreading_factor = SPREADING_FACTORS(self._radio_setting("sf")),
+                bandwidth = RADIO_BW(self._radio_setting("bw")),
+                coding_rate = CODING_RATES(self._radio_setting("cr")),
+                crc_header = CRC_HEADER_STATES(self._radio_setting("crc")),
+                preamble = int(self._radio_setting("prlen")),
+                mode = RADIO_MODES(self._radio_setting("mod")),
+                fsk_bitrate = int(self._radio_setting("bitrate")),
+                sync_length = max(len(self._radio_setting("sync")) // 2, 1))
+        except ValueError:
+            #A cached value has an unexpected format, use the defaults
+            return time_on_air(payload_length, spreading_factor = SPREADING_FACTORS.SF12)
+
+    def radio_max_payload(self):
+        """Returns the largest payload radio tx accepts with the current modulation.
+
+        Returns:
+        int: Maximum payload length in bytes"""
+
+        return RADIO_MAX_PAYLOAD.get(self._radio_setting("mod"), RADIO_MAX_PAYLOAD["lora"])
+
+    def reset_airtime(self):
+        """Clears the per-channel airtime totals."""
+
+        self.airtime = {}
+
+    #Link Quality
+
+    def enable_link_quality(self, capacity = 256, sender = None, sequence = None, sequence_modulo = 256):
+        """Captures the SNR, and the RSSI where the firmware supports it, of every packet received by check_data(), check_bytes() and receive_bytes(). The query is pipelined with re-arming the receiver.
+
+        Parameters:
+        capacity (int): Number of samples kept, overall and per sender (Default is 256)
+        sender (function): Returns the sender of a payload (bytes); None puts every packet under sender None (Default is None)
+        sequence (function): Returns the sequence number of a payload (bytes); None disables loss estimation (Default is None)
+        sequence_modulo (int): Sequence numbers wrap around at this value (Default is 256)
+
+        Returns:
+        LinkQualityMonitor: Monitor collecting the samples, also available as link_quality"""
+
+        self.link_quality = LinkQualityMonitor(capacity, sender, sequence, sequence_modulo)
+        return self.link_quality
+
+    def disable_link_quality(self):
+        """Stops capturing the link quality of received packets."""
+
+        self.link_quality = None
+
+    def _link_quality_lines(self, rearm):
+        """Returns the commands reading the link quality of the last packet.
+
+        Parameters:
+        rearm (bool): Appends 'radio rx 0' to restart continuous reception
+
+        Returns:
+        list: Command lines"""
+
+        lines = ["radio get snr"]
+        if self._rssi_supported:
+            lines.append("radio get rssi")
+        if rearm:
+            lines.append("radio rx 0")
+        return lines
+
+    def _record_link_quality(self, payload, lines, responses):
+        """Adds a packet and its link quality responses to the monitor.
+
+        Parameters:
+        payload (bytes): Received payload
+        lines (list): Commands from _link_quality_lines()
+        responses (list): Responses from the device"""
+
+        snr = parse_parameter(RADIO_PARAMETERS, "snr", responses[0])
+        rssi = None
+        if len(lines) > 1 and lines[1] == "radio get rssi":
+            if responses[1] == "invalid_param":
+                #Firmware without 'radio get rssi'
+                self._rssi_supported = False
+            rssi = parse_parameter(RADIO_PARAMETERS, "rssi", responses[1])
+
+        monitor = self.link_quality
+        if monitor is not None:
+            monitor.record(payload, snr, rssi)
+
+    def _capture_link_quality(self, payload, rearm):
+        """Reads the link quality of the last packet, optionally restarting the receiver in the same exchange.
+
+        Parameters:
+        payload (bytes): Received payload
+        rearm (bool): Restarts continuous reception"""
+
+        lines = self._link_quality_lines(rearm)
+        self._record_link_quality(payload, lines, self._pipeline(lines, len(lines)))
+
+    #Typed Parameters
+
+    def radio_get_value(self, name, refresh = False):
+        """Reads a radio parameter and converts it to its type; ints for numeric values, enumeration members for settings.
+
+        Parameters:
+        name (str): Radio parameter name, a key of RADIO_PARAMETERS
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        object: Parameter value, None if the module did not answer with a valid value"""
+
+        if name not in RADIO_PARAMETERS:
+            raise ValueError('name is not a member of RADIO_PARAMETERS.')
+
+        return parse_parameter(RADIO_PARAMETERS, name, self._read_data(CMD_TYPES.RADIO_GET, [name], refresh))
+
+    def mac_get_value(self, name, refresh = False):
+        """Reads a LoRaWAN parameter and converts it to its type; ints for numeric values, enumeration members for settings and MacStatus for the status.
+
+        Parameters:
+        name (str): LoRaWAN parameter name, a key of MAC_PARAMETERS
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        object: Parameter value, None if the module did not answer with a valid value"""
+
+        if name not in MAC_PARAMETERS:
+            raise ValueError('name is not a member of MAC_PARAMETERS.')
+
+        return parse_parameter(MAC_PARAMETERS, name, self._read_data(CMD_TYPES.MAC_GET, [name], refresh))
+
+    def mac_get_status_flags(self):
+        """Reads and decodes the LoRaWAN stack status.
+
+        Returns:
+        MacStatus: Decoded status, None if the module did not answer with a valid value"""
+
+        return self.mac_get_value("status")
+
+    def _snapshot_lines(self, refresh):
+        """Lists the get commands of a status snapshot and the answers already in the shadow cache.
+
+        Parameters:
+        refresh (bool): Ignores the shadow cache
+
+        Returns:
+        tuple: (attribute, parsers, name, command line) tuples, and the cached responses by command line"""
+
+        queries = [("radio_" + name, RADIO_PARAMETERS, name, "radio get " + name) for name in RADIO_PARAMETERS]
+        queries += [("mac_" + name, MAC_PARAMETERS, name, "mac get " + name) for name in MAC_PARAMETERS]
+        answers = {}
+        if not refresh:
+            for query in queries:
+                cached = self._cached_response(query[3])
+                if cached is not None:
+                    answers[query[3]] = cached
+        return queries, answers
+
+    def _snapshot_record(self, queries, answers, start):
+        """Builds a status snapshot from the responses.
+
+        Parameters:
+        queries (list): Queries from _snapshot_lines()
+        answers (dict): Responses by command line
+        start (float): Monotonic time the snapshot was started
+
+        Returns:
+        StatusSnapshot: Parsed parameters"""
+
+        now = monotonic()
+        snapshot = StatusSnapshot(now, now - start)
+        for attribute, parsers, name, line in queries:
+            setattr(snapshot, attribute, parse_parameter(parsers, name, answers.get(line, "")))
+        return snapshot
+
+    def status_snapshot(self, window = 8, refresh = False):
+        """Reads every radio and LoRaWAN parameter in RADIO_PARAMETERS and MAC_PARAMETERS in one pipelined exchange. Parameters in the shadow cache are not sent to the module.
+
+        Parameters:
+        window (int): Maximum number of commands awaiting a response (Default is 8)
+        refresh (bool): Reads every parameter from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        StatusSnapshot: Parsed parameters"""
+
+        if window < 1:
+            raise ValueError('window should be at least 1.')
+
+        start = monotonic()
+        queries, answers = self._snapshot_lines(refresh)
+        lines = [query[3] for query in queries if query[3] not in answers]
+        answers.update(zip(lines, self._pipeline(lines, window)))
+        return self._snapshot_record(queries, answers, start)
+
     def _write_data(self, cmd_type, data):
         """Writes data to the UART device.
 
@@ -191,37 +1480,91 @@ class RN2XX3:
         Returns:
         str: Response from the device"""
 
-        wb = str(cmd_type.value + " " + ' '.join([str(e) for e in data]))
+        return self._command(str(cmd_type.value + " " + ' '.join([str(e) for e in data])))
 
-        self.sp.write((wb + "\r\n").encode("utf-8"))
-        res = self.sp.readline()[0:-2].decode("utf-8")
-        return res if res is not None else "no_response"
-
-    def _read_data(self, cmd_type, data):
+    def _read_data(self, cmd_type, data, refresh = False):
         """Reads data from the UART device.
 
         Parameters:
         cmd_type (str): Command type
         data (str): Payload to send
+        refresh (bool): Bypasses the shadow cache (Default is False)
 
         Returns:
         str: Response from the device"""
 
-        rb = str(cmd_type.value + " " + ' '.join([str(e) for e in data]))
+        return self._command(str(cmd_type.value + " " + ' '.join([str(e) for e in data])), refresh)
+
+    def _read_line(self, timeout = None):
+        """Reads an unsolicited line, from the event queue if the background reader is running.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the serial port timeout)
+
+        Returns:
+        str: Received line, empty if nothing was received in time"""
+
+        if self._reader is None:
+            if timeout is None or timeout == self.sp.timeout:
+                return self.sp.readline()[0:-2].decode("utf-8")
+            with self._cmd_lock:
+                #Commands from other threads would read with the shortened timeout
+                port_timeout = self.sp.timeout
+                self.sp.timeout = max(timeout, 0.001)
+                try:
+                    line = self.sp.readline()
+                finally:
+                    self.sp.timeout = port_timeout
+                if line and not line.endswith(b"\r\n"):
+                    #The line was cut by the timeout
+                    line += self.sp.readline()
+                return line[0:-2].decode("utf-8")
+
+        with self._event_cond:
+            if not self._events:
+                self._event_cond.wait(self.sp.timeout if timeout is None else timeout)
+            return self._events.popleft() if self._events else ""
 
-        self.sp.write((rb + "\r\n").encode("utf-8"))
-        res = self.sp.readline()[0:-2].decode("utf-8")
-        return res if res is not None else "no_response"
+    def wait_tx_done(self, timeout = None):
+        """Waits for the second response of radio tx, sent when the transmission ends. Other lines received meanwhile stay queued if the background reader is running, otherwise they are discarded.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the serial port timeout)
+
+        Returns:
+        str: 'radio_tx_ok' or 'radio_err', empty if the transmission did not end in time"""
+
+        deadline = monotonic() + (self.sp.timeout if timeout is None else timeout)
+        others = []
+        res = ""
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            line = self._read_line(remaining)
+            if line == "radio_tx_ok" or line == "radio_err":
+                res = line
+                break
+            if line != "":
+                others.append(line)
+
+        if others and self._reader is not None:
+            with self._event_cond:
+                self._events.extendleft(reversed(others))
+        return res
 
-    def check_data(self):
+    def check_data(self, timeout = None):
         """Checks the serial port buffer for received data.
 
+        Parameters:
+        timeout (float): Maximum time to wait for an event when the background reader is running. (Default is the serial port timeout)
+
         Returns:
         str: If auto mode is selected, the function returns received data. If manual mode is selected, it returns the LoRa module's raw output."""
 
-        res = self.sp.readline()[0:-2].decode("utf-8")
+        res = self._read_line(timeout)
 
-        if res is "":
+        if res == "":
             return None
         else:
             if self.auto == CONFIG_MODES.NONE:
@@ -234,15 +1577,18 @@ class RN2XX3:
             else:
                 return None
 
-    def check_uart_buffer(self):
+    def check_uart_buffer(self, timeout = None):
         """Checks the serial port buffer for received data.
 
+        Parameters:
+        timeout (float): Maximum time to wait for an event when the background reader is running. (Default is the serial port timeout)
+
         Returns:
         str: UART read buffer."""
 
-        res = self.sp.readline()[0:-2].decode("utf-8")
+        res = self._read_line(timeout)
 
-        if res is "":
+        if res == "":
             return None
         else:
             return res
@@ -251,41 +1597,318 @@ class RN2XX3:
         """Writes data to the UART device.
 
         Parameters:
-        data (str): Payload to send
+        data (str): Command line to send
         
         Returns:
         str: Response from the device"""
 
-        wb = str(cmd_type.value + " " + ' '.join([str(e) for e in data]))
+        return self._command(str(data))
+
+    #UART Baud Rate
+
+    def _serial_device(self):
+        """Returns the serial device, unwrapped from a recorder.
+
+        Returns:
+        serial.Serial: Serial device"""
+
+        sp = self.sp
+        return sp.device if isinstance(sp, RecordingSerial) else sp
+
+    def _set_port_baudrate(self, rate):
+        """Changes the serial port baud rate once the pending output is sent.
+
+        Parameters:
+        rate (int): Baud rate"""
+
+        device = self._serial_device()
+        device.flush()
+        device.baudrate = rate
+        self.baudrate = rate
+        self.stats.baudrate = rate
+
+    def _try_baudrate(self, rate):
+        """Sends the auto-baud sequence for a rate and checks that the module answers at it.
+
+        Parameters:
+        rate (int): Baud rate
+
+        Returns:
+        bool: True if the module answered 'sys get ver' at the rate"""
+
+        device = self._serial_device()
+        device.send_break(AUTO_BAUD_BREAK)
+        self._set_port_baudrate(rate)
+        self.sp.write(b"\x55")
+        device.flush()
+        sleep(AUTO_BAUD_BREAK)
+        device.reset_input_buffer()
+
+        timeout = device.timeout
+        device.timeout = AUTO_BAUD_PROBE_TIMEOUT
+        try:
+            self.sp.write(b"sys get ver\r\n")
+            res = self.sp.readline()[0:-2].decode("utf-8", "replace")
+        finally:
+            device.timeout = timeout
+        return res.startswith("RN2")
+
+    def negotiate_baudrate(self, rates = AUTO_BAUD_RATES):
+        """Switches the UART to the fastest rate the module accepts, using its auto-baud detection: a break condition, then 0x55 at the new rate. Each rate is checked with 'sys get ver'; if none answers, the reset baud rate is restored the same way. Also wakes the module from sleep.
+
+        The module returns to the reset baud rate on reset. Set auto_baud to negotiate again after sys_reset(), sys_factory_reset() and sys_sleep().
+
+        Parameters:
+        rates (list): Baud rates to try, fastest first (Default is AUTO_BAUD_RATES)
+
+        Returns:
+        int: Baud rate in use, None if the module did not answer at any rate"""
+
+        if not hasattr(self._serial_device(), "send_break"):
+            #Replayed traffic: the rate is whatever was recorded
+            return self.baudrate
+
+        restart = self._reader is not None
+        if restart:
+            self.stop_reader()
+        try:
+            with self._cmd_lock:
+                for rate in list(rates) + [self.reset_baudrate]:
+                    if self._try_baudrate(rate):
+                        return rate
+                return None
+        finally:
+            if restart:
+                self.start_reader(self._events.maxlen)
+
+    #Background Reader
+
+    def start_reader(self, event_queue_size = 64):
+        """Starts a background thread which reads every line from the UART once. Command responses are handed to the waiting caller, unsolicited lines are queued for check_data() and passed to the event callbacks.
+
+        Parameters:
+        event_queue_size (int): Maximum number of unread events; oldest events are dropped when full. (Default is 64)"""
+
+        if event_queue_size < 1:
+            raise ValueError('event_queue_size should be at least 1.')
+        if self._reader is not None:
+            return
+
+        with self._event_cond:
+            self._events = deque(self._events, maxlen = event_queue_size)
+        self._reader_running = True
+        self._reader = threading.Thread(target = self._reader_routine, name = "RN2XX3 reader", daemon = True)
+        self._reader.start()
+
+    def stop_reader(self):
+        """Stops the background reader thread. Unread events remain available to check_data()."""
+
+        if self._reader is None:
+            return
+
+        self._reader_running = False
+        if hasattr(self.sp, "cancel_read"):
+            self.sp.cancel_read()
+        if self._reader is not threading.current_thread():
+            self._reader.join(self.sp.timeout + 1 if self.sp.timeout is not None else None)
+        self._reader = None
+
+        with self._event_cond:
+            for reply in self._pending:
+                reply.done.set()
+            self._pending.clear()
+
+    def add_event_callback(self, callback):
+        """Registers a function called from the reader thread for every unsolicited line. Callbacks should return quickly and must not send commands to the module.
+
+        Parameters:
+        callback (function): Function taking the received line (str)"""
+
+        self._callbacks.append(callback)
 
-        self.sp.write((wb + "\r\n").encode("utf-8"))
-        res = self.sp.readline()[0:-2].decode("utf-8")
-        return res if res is not None else "no_response"
+    def remove_event_callback(self, callback):
+        """Unregisters an event callback.
 
-    def _auto_rx_routine(self, data):
+        Parameters:
+        callback (function): Previously registered function"""
+
+        self._callbacks.remove(callback)
+
+    def _reader_routine(self):
+        """Reads lines from the UART until the reader is stopped."""
+
+        partial = b""
+        while self._reader_running:
+            try:
+                chunk = self.sp.readline()
+            except (serial.SerialException, TypeError, OSError):
+                break
+            if not chunk:
+                continue
+
+            partial += chunk
+            if not partial.endswith(b"\r\n"):
+                continue
+            line = partial[0:-2].decode("utf-8", "replace")
+            partial = b""
+            self._dispatch(line)
+
+    def _dispatch(self, line):
+        """Routes a line either to the oldest waiting command or to the event queue.
+
+        Parameters:
+        line (str): Line received from the UART"""
+
+        with self._event_cond:
+            op = self._mac_op
+            #Second responses which are not events, such as invalid_data_len, are not command replies once the operation is answered
+            second = op is not None and op.answered and line.startswith(op.outcomes)
+            if not line.startswith(EVENT_PREFIXES) and self._pending and not second:
+                reply = self._pending.popleft()
+                reply.line = line
+                reply.received_at = monotonic()
+                reply.done.set()
+                return
+
+            if op is not None and line.startswith(op.outcomes):
+                #Second response of the uplink or join in progress
+                self._mac_op = None
+                op.line = line
+                op.done.set()
+            else:
+                if len(self._events) == self._events.maxlen:
+                    self.events_dropped += 1
+                self._events.append(line)
+                self._event_cond.notify()
+
+        for callback in list(self._callbacks):
+            try:
+                callback(line)
+            except Exception:
+                pass
+
+    def check_bytes(self, timeout = None):
+        """Checks the serial port buffer for a received packet. If auto RX mode is selected, the receiver is restarted. Lines other than received packets are discarded; use check_uart_buffer() for raw output.
+
+        Parameters:
+        timeout (float): Maximum time to wait for an event when the background reader is running. (Default is the serial port timeout)
+
+        Returns:
+        bytes: Received payload, None if no packet is received"""
+
+        res = self._read_line(timeout)
+
+        if self.auto == CONFIG_MODES.LORA_RX:
+            return self._auto_rx_routine(res, True)
+        elif res.startswith("radio_rx", 0, 8):
+            return bytes.fromhex(res[8:].strip())
+        else:
+            return None
+
+    def _drain_radio_events(self):
+        """Discards packets and receive errors left over from an earlier receive window, so they are not taken for the result of the next one."""
+
+        if self._reader is None:
+            while getattr(self.sp, "in_waiting", 0):
+                self.sp.readline()
+            return
+
+        with self._event_cond:
+            stale = [line for line in self._events if line.startswith("radio_rx", 0, 8) or line == "radio_err"]
+            for line in stale:
+                self._events.remove(line)
+
+    def _take_radio_rx(self):
+        """Removes a packet which arrived while the receiver was being stopped.
+
+        Returns:
+        str: The radio_rx line, empty if there is none"""
+
+        if self._reader is None:
+            return ""
+        with self._event_cond:
+            for line in self._events:
+                if line.startswith("radio_rx", 0, 8):
+                    self._events.remove(line)
+                    return line
+        return ""
+
+    def receive_bytes(self, timeout):
+        """Opens the receiver and waits for one packet. The radio should be configured and the MAC paused. Lines other than the packet are discarded.
+
+        Parameters:
+        timeout (float): Maximum time to wait for a packet in seconds
+
+        Returns:
+        bytes: Received payload, None if no packet is received in time"""
+
+        self._drain_radio_events()
+        res = self.radio_rx(0)
+        if res == "busy":
+            #The receiver is still open from an earlier call
+            self.radio_rxstop()
+            self._drain_radio_events()
+            res = self.radio_rx(0)
+        if res != "ok":
+            return None
+
+        line = ""
+        deadline = monotonic() + timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            line = self._read_line(remaining)
+            if line.startswith("radio_rx", 0, 8) or line == "radio_err":
+                break
+            line = ""
+
+        if line == "":
+            #A packet may arrive while the receiver is being stopped
+            line = self.radio_rxstop()
+            if line.startswith("radio_rx", 0, 8):
+                #The packet came before the response to rxstop
+                self._read_line()
+            else:
+                line = self._take_radio_rx()
+
+        if line.startswith("radio_rx", 0, 8):
+            res = bytes.fromhex(line[8:].strip())
+            if self.link_quality is not None:
+                self._capture_link_quality(res, False)
+            return res
+        return None
+
+    def _auto_rx_routine(self, data, binary = False):
         """Processes received data.
 
         Parameters:
         data (str): Received data from the UART
+        binary (bool): Returns the payload as bytes instead of decoding it as UTF-8 (Default is False)
 
         Returns:
-        str: Received data"""
+        str: Received data (bytes if binary is selected)"""
 
         res = None
 
         if data == "radio_err":                             #If radio error has occured
-            self.set_led(LEDS.CON, LED_STATES.OFF)          #Turn CON LED off
-            self.set_led(LEDS.ERR, LED_STATES.ON)           #Turn ERR LED on
+            self._led(LEDS.CON, LED_STATES.OFF)             #Turn CON LED off
+            self._led(LEDS.ERR, LED_STATES.ON)              #Turn ERR LED on
             self.radio_rx(0)                                #Restart radio
-            self.set_led(LEDS.ERR, LED_STATES.OFF)          #Turn ERR LED off
-            self.set_led(LEDS.CON, LED_STATES.ON)           #Turn CON LED on
+            self._led(LEDS.ERR, LED_STATES.OFF)             #Turn ERR LED off
+            self._led(LEDS.CON, LED_STATES.ON)              #Turn CON LED on
             return res
 
         elif data.startswith("radio_rx", 0, 8):             #If a message has received
-            self.set_led(LEDS.ACT, LED_STATES.ON)           #Turn ACT LED on
-            self.radio_rx(0)                                #Process received data
-            res = bytes.fromhex(data[10:]).decode("utf-8")  #Remove "radio_rx  " characters from the buffer
-            self.set_led(LEDS.ACT, LED_STATES.OFF)          #Turn ACT LED off
+            self._led(LEDS.ACT, LED_STATES.ON)              #Turn ACT LED on
+            res = bytes.fromhex(data[8:].strip())           #Remove "radio_rx  " characters from the buffer
+            if self.link_quality is None:
+                self.radio_rx(0)                            #Restart radio
+            else:
+                self._capture_link_quality(res, True)       #Read SNR and restart radio in one exchange
+            if not binary:
+                res = res.decode("utf-8")
+            self._led(LEDS.ACT, LED_STATES.OFF)             #Turn ACT LED off
             return res
 
         else:
@@ -304,39 +1927,211 @@ class RN2XX3:
         if len(data) > 255:
             raise ValueError('data length is outside of 0 and 255.')
 
+        return self.send_bytes(data.encode("utf-8"))
+
+    def send_bytes(self, data):
+        """Broadcasts binary data for auto TX mode operation.
+
+        Parameters:
+        data (bytes): Data to send (bytes, bytearray or memoryview; up to 255 bytes for LoRa modulation and 64 bytes for FSK modulation)
+
+        Returns:
+        str: Response from the LoRa module"""
+
+        if isinstance(data, memoryview):
+            data = data.cast("B")
+        elif not isinstance(data, (bytes, bytearray)):
+            raise TypeError('data should be bytes, bytearray or memoryview.')
+        limit = self.radio_max_payload()
+        if len(data) > limit:
+            raise ValueError('data length is outside of 0 and ' + str(limit) + '.')
+
         res = None
-        wb = data.encode("utf-8").hex()
+        wb = data.hex()
         if self.err_on == True:
             self.err_on = False
-            self.set_led(LEDS.ERR, LED_STATES.OFF)
-        self.set_led(LEDS.ACT, LED_STATES.ON)
+            self._led(LEDS.ERR, LED_STATES.OFF)
+        self._led(LEDS.ACT, LED_STATES.ON)
         res = self.radio_tx(wb)
-        self.set_led(LEDS.ACT, LED_STATES.OFF)
+        self._led(LEDS.ACT, LED_STATES.OFF)
         if res == "busy" or res == "invalid_param" or res == "err":
             self.err_on = True
-            self.set_led(LEDS.ERR, LED_STATES.ON)
+            self._led(LEDS.ERR, LED_STATES.ON)
         return res
 
+    #LoRaWAN Operations
+
+    def send_uplink(self, data, portno = 1, uplink_payload_type = UPLINK_PAYLOAD_TYPES.UNCONFIRMED, timeout = MAC_TX_TIMEOUT):
+        """Queues a LoRaWAN uplink and returns without waiting. Uplinks and joins are sent one at a time, in order, from a background thread; the future completes once the module reports the outcome, after the receive windows.
+
+        The second response is taken out of the event stream, so it is not returned by check_data(). Event callbacks still receive it. Starts the background reader if it is not running.
+
+        Parameters:
+        data (bytes): Application payload (bytes, bytearray or memoryview)
+        portno (int): Port number (1 to 223) (Default is 1)
+        uplink_payload_type (UPLINK_PAYLOAD_TYPES): Uplink payload type, either confirmed or unconfirmed (UPLINK_PAYLOAD_TYPES.UNCONFIRMED is default)
+        timeout (float): Maximum time to wait for the second response in seconds (Default is MAC_TX_TIMEOUT)
+
+        Returns:
+        Future: Resolves with a MacOutcome; status is the second response, or the first response if it was not 'ok'"""
+
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError('data should be bytes, bytearray or memoryview.')
+        if uplink_payload_type not in UPLINK_PAYLOAD_TYPES:
+            raise ValueError('uplink_payload_type is not a member of UPLINK_PAYLOAD_TYPES.')
+        if portno < 1 or portno > 223:
+            raise ValueError('portno is outside of 1 and 223.')
+        command = ' '.join(["mac tx", uplink_payload_type.value, str(portno), bytes(data).hex()])
+        return self._submit_mac(command, MAC_TX_OUTCOMES, timeout)
+
+    def join_network(self, mode, timeout = MAC_JOIN_TIMEOUT):
+        """Queues a join attempt and returns without waiting, see send_uplink().
+
+        Parameters:
+        mode (JOIN_PROCEDURE_TYPES): Join procedure type
+        timeout (float): Maximum time to wait for the second response in seconds (Default is MAC_JOIN_TIMEOUT)
+
+        Returns:
+        Future: Resolves with a MacOutcome; status is 'accepted' or 'denied', or the first response if it was not 'ok'"""
+
+        if mode not in JOIN_PROCEDURE_TYPES:
+            raise ValueError('mode is not a member of JOIN_PROCEDURE_TYPES.')
+        return self._submit_mac("mac join " + mode.value, MAC_JOIN_OUTCOMES, timeout)
+
+    def _submit_mac(self, command, outcomes, timeout):
+        """Queues a LoRaWAN operation for the worker thread.
+
+        Parameters:
+        command (str): Command line
+        outcomes (tuple): Second responses which end the operation
+        timeout (float): Maximum time to wait for the second response in seconds
+
+        Returns:
+        Future: Resolves with a MacOutcome"""
+
+        if self._reader is None:
+            self.start_reader()
+        op = _MacOperation(command, outcomes, timeout, Future(), threading.Event())
+        with self._mac_cond:
+            self._mac_queue.append(op)
+            if self._mac_worker is None:
+                self._mac_worker = threading.Thread(target = self._mac_worker_routine, name = "RN2XX3 LoRaWAN", daemon = True)
+                self._mac_worker.start()
+        return op.future
+
+    def _mac_worker_routine(self):
+        """Sends the queued LoRaWAN operations one at a time and completes their futures. Exits when the queue is empty."""
+
+        while True:
+            with self._mac_cond:
+                if not self._mac_queue:
+                    self._mac_worker = None
+                    return
+                op = self._mac_queue.popleft()
+            if not op.future.set_running_or_notify_cancel():
+                continue
+
+            started_at = monotonic()
+            try:
+                #Armed before the command is sent, so a fast second response is not missed
+                with self._event_cond:
+                    self._mac_op = op
+                res = self._command(op.command)
+                if res == "ok":
+                    with self._event_cond:
+                        op.answered = True
+                    op.done.wait(op.timeout)
+                    res = op.line
+                with self._event_cond:
+                    if self._mac_op is op:
+                        self._mac_op = None
+                op.future.set_result(MacOutcome(res, started_at))
+            except Exception as e:
+                with self._event_cond:
+                    if self._mac_op is op:
+                        self._mac_op = None
+                op.future.set_exception(e)
+
+    def _cancel_mac(self):
+        """Cancels the queued LoRaWAN operations and ends the one in progress."""
+
+        with self._mac_cond:
+            while self._mac_queue:
+                self._mac_queue.popleft().future.cancel()
+        with self._event_cond:
+            op = self._mac_op
+        if op is not None:
+            op.done.set()
+
     #Initialization
 
-    def __init__(self, region = REGIONS.US_RN2903, auto_config = CONFIG_MODES.NONE, freq_us = 915000000, freq_eu = 868000000):
-        """Initiates the RN2XX3A LoRa module.
+    def __init__(self, region = REGIONS.US_RN2903, auto_config = CONFIG_MODES.NONE, freq_us = 915000000, freq_eu = 868000000, background_reader = False, config_cache = True, ready_timeout = 3, led_policy = LED_POLICIES.SYNC, port = '/dev/serial0', baudrate = 57600, timeout = 2, write_timeout = 2, record_path = None, auto_baud = None):
+        """Initiates the RN2XX3A LoRa module. Each instance opens its own serial port on first use, so several modules can be driven side by side.
         
         Parameters:
         region (REGIONS): LoRa Module region.
         auto_config (CONFIG_MODES): LoRa Module operating mode. NONE is for manual configuration. LORA_TX and LORA_RX are for automatic configuration. (MODES.CONFIG_MODES.NONE is default)
-        freq (int): LoRa radio frequency for auto configuration. (Default is 915000000)"""
+        freq (int): LoRa radio frequency for auto configuration. (Default is 915000000)
+        background_reader (bool): Starts the background reader thread, see start_reader(). (Default is False)
+        config_cache (bool): Keeps a shadow copy of radio and mac parameters, skipping redundant set commands and serving get commands from it. (Default is True)
+        ready_timeout (float): Maximum time in seconds to wait for the module to answer after reset; fixed delays are used if it does not. (Default is 3)
+        led_policy (LED_POLICIES): Status LED signalling during transmit and receive, see set_led_policy(). (LED_POLICIES.SYNC is default)
+        port (str): Serial port device, such as '/dev/ttyUSB0' for a USB attached module, or an opened serial port object such as ReplaySerial. (Default is '/dev/serial0')
+        baudrate (int): Serial port baud rate; also the module's baud rate after reset. (Default is 57600)
+        timeout (float): Response timeout in seconds. (Default is 2)
+        write_timeout (float): Write timeout in seconds. (Default is 2)
+        record_path (str): Records the UART traffic from initialization on to this file, see start_recording(). (Default is None)
+        auto_baud (list): Baud rates to negotiate after reset and sleep, fastest first, see negotiate_baudrate(); None keeps the reset baud rate. (Default is None)"""
 
         if region not in REGIONS:
             raise ValueError('region is not a member of REGIONS.')
         if auto_config not in CONFIG_MODES:
             raise ValueError('auto_config is not a member of CONFIG_MODES.')
+        if led_policy not in LED_POLICIES:
+            raise ValueError('led_policy is not a member of LED_POLICIES.')
+
+        self.port = port
+        self.baudrate = baudrate
+        self.reset_baudrate = baudrate
+        self.auto_baud = auto_baud
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.region = region
+        if not isinstance(port, str):
+            self._sp = port
+        self.config_cache = config_cache
+        self.ready_timeout = ready_timeout
+        self._init_link()
+        if record_path is not None:
+            self.start_recording(record_path)
+        if background_reader:
+            self.start_reader()
+        self.set_led_policy(led_policy)
 
         freq = freq_us if region == REGIONS.US_RN2903 else freq_eu
 
         self._set_initial_settings(auto_config, freq)
         self.is_initialized = True
-        sleep(0.5)
+
+    def _init_link(self):
+        """Creates the per-instance command and event state."""
+
+        self._port_lock = threading.Lock()
+        self._cmd_lock = threading.RLock()
+        self._event_cond = threading.Condition()
+        self._pending = deque()
+        self._events = deque(maxlen = 64)
+        self._callbacks = []
+        self._shadow = {}
+        self.airtime = {}
+        self.stats = LinkStats(self.baudrate)
+        self._led_cond = threading.Condition()
+        self._led_wanted = {LEDS.CON: LED_STATES.OFF, LEDS.ACT: LED_STATES.OFF, LEDS.ERR: LED_STATES.OFF}
+        self._led_applied = dict(self._led_wanted)
+        self._led_writer = None
+        self._mac_cond = threading.Condition()
+        self._mac_queue = deque()
+        self._mac_worker = None
 
     #System Commands (Sys)
 
@@ -352,6 +2147,8 @@ class RN2XX3:
         if length < 100 or length > 4294967296:
             raise ValueError('length is outside of 100 and 4294967296.')
         res = self._write_data(CMD_TYPES.SYS, ["sleep", length])
+        if self.auto_baud is not None and res == "ok":
+            self.negotiate_baudrate(self.auto_baud)
         return res
 
     def sys_reset(self):
@@ -361,8 +2158,29 @@ class RN2XX3:
         str: Response from the device"""
 
         res = self._write_data(CMD_TYPES.SYS, ["reset"])
+        if self.auto_baud is not None and res.startswith("RN2"):
+            self.negotiate_baudrate(self.auto_baud)
         return res
 
+    def wait_ready(self, timeout = 3):
+        """Probes the module with 'sys get ver' until it answers with its firmware version.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds (Default is 3)
+
+        Returns:
+        bool: True if the module is ready"""
+
+        deadline = monotonic() + timeout
+        while True:
+            ver = self.sys_get_ver()
+            if ver.startswith("RN2"):
+                self.firmware_version = ver
+                return True
+            if monotonic() >= deadline:
+                return False
+            sleep(0.05)
+
     def sys_factory_reset(self):
         """Resets the module’s configuration data and user EEPROM to factory default values and restarts the module.
 
@@ -370,6 +2188,8 @@ class RN2XX3:
         str: Firmware version and release date (RN2XX3 X.Y.Z MMM DD YYYY HH:MM:SS)"""
 
         res = self._write_data(CMD_TYPES.SYS, ["factoryRESET"])
+        if self.auto_baud is not None and res.startswith("RN2"):
+            self.negotiate_baudrate(self.auto_baud)
         return res
 
     def sys_set_nvm(self, address, data):
@@ -895,123 +2715,148 @@ class RN2XX3:
         res = self._write_data(CMD_TYPES.MAC_SET, ["upctr", f_cnt_up])
         return res
 
-    def mac_get_adr(self):
+    def mac_get_adr(self, refresh = False):
         """Returns the state of the adaptive data rate mechanism.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: state of the adaptive data rate mechanism (on or off)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["adr"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["adr"], refresh)
         return val
 
-    def mac_get_appeui(self):
+    def mac_get_appeui(self, refresh = False):
         """Returns the application identifier for the module. The application identifier is a value given to the device by the network.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: 8-byte hexadecimal number representing the application EUI"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["appeui"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["appeui"], refresh)
         return val
 
-    def mac_get_ar(self):
+    def mac_get_ar(self, refresh = False):
         """Returns the current state for the automatic reply (AR) parameter.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The state of the automatic reply (on or off)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["ar"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["ar"], refresh)
         return val
 
-    def mac_get_ch_freq(self, channel_id):
+    def mac_get_ch_freq(self, channel_id, refresh = False):
         """Returns the frequency on the requested <channelID>.
 
         Parameters:
         channel_id (int): Channel number (0 to 71)
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
 
         Returns:
         str: The frequency of the channel"""
         
         if channel_id < 0 or channel_id > 71:
             raise ValueError('channel_id is outside of 0 and 71.')
-        val = self._read_data(CMD_TYPES.MAC_GET, ["ch freq", channel_id])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["ch freq", channel_id], refresh)
         return val
 
-    def mac_get_ch_dcycle(self, channel_id):
+    def mac_get_ch_dcycle(self, channel_id, refresh = False):
         """Returns the duty cycle on the requested <channelID>.
 
         Parameters:
         channel_id (int): Channel number (0 to 15)
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
 
         Returns:
         str: Duty cycle of the channel (0 to 65535)"""
         
         if channel_id < 0 or channel_id > 15:
             raise ValueError('channel_id is outside of 0 and 15.')
-        val = self._read_data(CMD_TYPES.MAC_GET, ["ch freq", channel_id])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["ch freq", channel_id], refresh)
         return val
 
-    def mac_get_ch_drrange(self, channel_id):
+    def mac_get_ch_drrange(self, channel_id, refresh = False):
         """Returns the allowed data rate index range on the requested <channelID>.
 
         Parameters:
         channel_id (int): Channel number (0 to 71 for US, 0 to 15 for EU)
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
 
         Returns:
         str: Minimum and maximum data rate of the channel"""
 
         if channel_id < 0 or channel_id > 71:
             raise ValueError('channel_id is outside of 0 and 71.')
-        val = self._read_data(CMD_TYPES.MAC_GET, ["ch drrange", channel_id])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["ch drrange", channel_id], refresh)
         return val
 
-    def mac_get_ch_status(self, channel_id):
+    def mac_get_ch_status(self, channel_id, refresh = False):
         """Returns if <channelID> is currently enabled for use.
 
         Parameters:
         channel_id (int): Channel number (0 to 71 for US, 0 to 15 for EU)
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
 
         Returns:
         str: The state of the channel (on or off)"""
 
         if channel_id < 0 or channel_id > 71:
             raise ValueError('channel_id is outside of 0 and 71.')
-        val = self._read_data(CMD_TYPES.MAC_GET, ["ch status", channel_id])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["ch status", channel_id], refresh)
         return val
 
-    def mac_get_class(self):
+    def mac_get_class(self, refresh = False):
         """Return the LoRaWAN operation class as set in the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: A single letter (A or C)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["class"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["class"], refresh)
         return val
 
-    def mac_get_dcycleps(self):
+    def mac_get_dcycleps(self, refresh = False):
         """Returns the duty cycle prescaler.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The prescaler value (0 to 65535)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["dcycleps"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["dcycleps"], refresh)
         return val
 
-    def mac_get_devaddr(self):
+    def mac_get_devaddr(self, refresh = False):
         """Returns the current end-device address of the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: 4-byte hexadecimal number representing the device address (00000000 to FFFFFFFF)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["devaddr"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["devaddr"], refresh)
         return val
 
-    def mac_get_deveui(self):
+    def mac_get_deveui(self, refresh = False):
         """Returns the globally unique end-device identifier, as set in the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: 8-byte hexadecimal number representing the device EUI"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["deveui"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["deveui"], refresh)
         return val
 
     def mac_get_dnctr(self):
@@ -1023,13 +2868,16 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.MAC_GET, ["dnctr"])
         return val
 
-    def mac_get_dr(self):
+    def mac_get_dr(self, refresh = False):
         """Returns the current data rate.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Current data rate"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["dr"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["dr"], refresh)
         return val
 
     def mac_get_gwnb(self):
@@ -1041,22 +2889,28 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.MAC_GET, ["gwnb"])
         return val
 
-    def mac_get_mcast(self):
+    def mac_get_mcast(self, refresh = False):
         """Returns the multicast state as set in the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The multicast state of the module (on or off)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["mcast"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["mcast"], refresh)
         return val
 
-    def mac_get_mcastdevaddr(self):
+    def mac_get_mcastdevaddr(self, refresh = False):
         """Returns the current multicast end-device address of the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: 4-byte hexadecimal number representing the device multicast address (00000000 to FFFFFFFF)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["mcastdevaddr"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["mcastdevaddr"], refresh)
         return val
 
     def mac_get_mcastdnctr(self):
@@ -1077,49 +2931,64 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.MAC_GET, ["mrgn"])
         return val
 
-    def mac_get_pwridx(self):
+    def mac_get_pwridx(self, refresh = False):
         """Returns the current output power index value.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Current output power index value"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["pwridx"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["pwridx"], refresh)
         return val
 
-    def mac_get_retx(self):
+    def mac_get_retx(self, refresh = False):
         """Returns the currently configured number of retransmissions which are attempted for a confirmed uplink communication when no downlink response has been received.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The number of retransmissions (0 to 255)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["retx"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["retx"], refresh)
         return val
 
-    def mac_get_rx2(self):
+    def mac_get_rx2(self, refresh = False):
         """Returns the current data rate and frequency configured to be used during the second Receive window.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The data rate configured for the second Receive window and the frequency configured for the second Receive window"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["rx2"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["rx2"], refresh)
         return val
 
-    def mac_get_rxdelay1(self):
+    def mac_get_rxdelay1(self, refresh = False):
         """Returns the interval, in milliseconds, for rxdelay1.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The interval, in milliseconds, for rxdelay1 (0 to 65535)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["rxdelay1"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["rxdelay1"], refresh)
         return val
 
-    def mac_get_rxdelay2(self):
+    def mac_get_rxdelay2(self, refresh = False):
         """Returns the interval, in milliseconds, for rxdelay2.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The interval, in milliseconds, for rxdelay2 (0 to 65535)"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["rxdelay2"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["rxdelay2"], refresh)
         return val
 
     def mac_get_status(self):
@@ -1131,13 +3000,16 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.MAC_GET, ["status"])
         return val
 
-    def mac_get_sync(self):
+    def mac_get_sync(self, refresh = False):
         """Returns the synchronization word for the LoRaWAN communication.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: One byte long hexadecimal number representing the synchronization word for the LoRaWAN communication"""
 
-        val = self._read_data(CMD_TYPES.MAC_GET, ["sync"])
+        val = self._read_data(CMD_TYPES.MAC_GET, ["sync"], refresh)
         return val
 
     def mac_get_upctr(self):
@@ -1422,112 +3294,148 @@ class RN2XX3:
         res = self._write_data(CMD_TYPES.RADIO_SET, ["wdt", watchdog])
         return res
 
-    def radio_get_afcbw(self):
+    def radio_get_afcbw(self, refresh = False):
         """Reads back the status of the Automatic Frequency Correction Bandwidth.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Automatic frequency correction band, in kHz"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["afcbw"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["afcbw"], refresh)
         return val
 
-    def radio_get_bitrate(self):
+    def radio_get_bitrate(self, refresh = False):
         """Reads back the configured bit rate for FSK communications.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The configured bit rate (1 to 300000)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["bitrate"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["bitrate"], refresh)
         return val
 
-    def radio_get_bt(self):
+    def radio_get_bt(self, refresh = False):
         """Reads back the current configuration for data shaping applied to FSK transmissions.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The configuration for data shaping"""
         
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["bt"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["bt"], refresh)
         return val
 
-    def radio_get_bw(self):
+    def radio_get_bw(self, refresh = False):
         """Reads back the current operating radio bandwidth used by the transceiver.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The current operating radio bandwidth, in kHz"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["bw"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["bw"], refresh)
         return val
 
-    def radio_get_cr(self):
+    def radio_get_cr(self, refresh = False):
         """Reads back the current value settings used for the coding rate during communication.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The current value settings used for the coding rate."""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["cr"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["cr"], refresh)
         return val
 
-    def radio_get_crc(self):
+    def radio_get_crc(self, refresh = False):
         """Reads back the status of the CRC header, to determine if it is to be included during operation.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Status of the CRC header (on or off)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["crc"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["crc"], refresh)
         return val
 
-    def radio_get_fdev(self):
+    def radio_get_fdev(self, refresh = False):
         """Reads frequency deviation setting on the transceiver.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Frequency deviation setting (0 to 200000)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["fdev"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["fdev"], refresh)
         return val
 
-    def radio_get_freq(self):
+    def radio_get_freq(self, refresh = False):
         """Reads back the current operation frequency of the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Frequency in Hz"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["freq"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["freq"], refresh)
         return val
 
-    def radio_get_iqi(self):
+    def radio_get_iqi(self, refresh = False):
         """Reads back the status of the Invert IQ functionality.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Status of the Invert IQ functionality (on or off)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["iqi"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["iqi"], refresh)
         return val
 
-    def radio_get_mod(self):
+    def radio_get_mod(self, refresh = False):
         """Reads back the current mode of operation of the module.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Current mode of operation of the module (lora or fsk)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["mod"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["mod"], refresh)
         return val
 
-    def radio_get_prlen(self):
+    def radio_get_prlen(self, refresh = False):
         """Reads the current preamble length used for communication.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The preamble length (0 to 65535)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["prlen"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["prlen"], refresh)
         return val
 
-    def radio_get_pwr(self):
+    def radio_get_pwr(self, refresh = False):
         """Reads back the current power level settings used in operation.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: Current power level"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["pwr"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["pwr"], refresh)
         return val
 
     def radio_get_rssi(self):
@@ -1539,22 +3447,28 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.RADIO_GET, ["rssi"])
         return val
 
-    def radio_get_rxbw(self):
+    def radio_get_rxbw(self, refresh = False):
         """Reads back the signal bandwidth used for receiving.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The signal bandwidth, in kHz"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["rxbw"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["rxbw"], refresh)
         return val
 
-    def radio_get_sf(self):
+    def radio_get_sf(self, refresh = False):
         """Reads back the current spreading factor being used by the transceiver.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The current spreading factor"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["sf"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["sf"], refresh)
         return val
 
     def radio_get_snr(self):
@@ -1566,22 +3480,28 @@ class RN2XX3:
         val = self._read_data(CMD_TYPES.RADIO_GET, ["snr"])
         return val
 
-    def radio_get_sync(self):
+    def radio_get_sync(self, refresh = False):
         """Reads back the configured synchronization word used for radio communication.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The synchronization word used for radio communication"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["sync"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["sync"], refresh)
         return val
 
-    def radio_get_wdt(self):
+    def radio_get_wdt(self, refresh = False):
         """Reads back the length used for the watchdog time-out in milliseconds.
 
+        Parameters:
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
         Returns:
         str: The length used for the watchdog time-out (0 to 4294967295)"""
 
-        val = self._read_data(CMD_TYPES.RADIO_GET, ["wdt"])
+        val = self._read_data(CMD_TYPES.RADIO_GET, ["wdt"], refresh)
         return val
 
     #Module Configuration
@@ -1594,47 +3514,66 @@ class RN2XX3:
         freq (int): LoRa radio frequency for auto configuration. (Default is 915000000 for US)."""
 
         self.auto = auto_config
-        self.sys_reset()
+        start = monotonic()
 
-        self.config_led(LEDS.CON)
-        self.config_led(LEDS.ACT)
-        self.config_led(LEDS.ERR)
+        #The reset response is the firmware version banner, sent once the module is ready
+        banner = self.sys_reset()
+        if banner.startswith("RN2"):
+            self.firmware_version = banner
+            ready = True
+        else:
+            ready = self.wait_ready(self.ready_timeout)
+            if ready and self.auto_baud is not None:
+                self.negotiate_baudrate(self.auto_baud)
 
-        self.set_led(LEDS.CON, LED_STATES.OFF)
-        self.set_led(LEDS.ACT, LED_STATES.OFF)
-        self.set_led(LEDS.ERR, LED_STATES.OFF)
+        with self.batch():
+            self.config_led(LEDS.CON)
+            self.config_led(LEDS.ACT)
+            self.config_led(LEDS.ERR)
 
-        sleep(0.5)
+            self.set_led(LEDS.CON, LED_STATES.OFF)
+            self.set_led(LEDS.ACT, LED_STATES.OFF)
+            self.set_led(LEDS.ERR, LED_STATES.OFF)
+
+        if not ready:
+            sleep(0.5)                                      #Fallback: Readiness is not confirmed
 
         if auto_config == CONFIG_MODES.LORA_RX:
-            self.radio_set_mod(RADIO_MODES.LORA)            #radio set mod lora
-            self.radio_set_freq(freq)                       #radio set freq <freq>
-            self.radio_set_sf(SPREADING_FACTORS.SF7)        #radio set sf sf7
-            self.radio_set_bw(RADIO_BW.BW_125)              #radio set bw 125
-            self.radio_set_cr(CODING_RATES.R_4_5)           #radio set cr 4/5
-            self.radio_set_crc(CRC_HEADER_STATES.ON)        #radio set crc on
-            self.radio_set_sync(12)                         #radio set sync 12
-            self.radio_set_wdt(0)                           #radio set wdt 0
-            self.radio_set_pwr(14)                          #radio set pwr 14
-            sleep(0.1)
+            with self.batch():
+                self.radio_set_mod(RADIO_MODES.LORA)        #radio set mod lora
+                self.radio_set_freq(freq)                   #radio set freq <freq>
+                self.radio_set_sf(SPREADING_FACTORS.SF7)    #radio set sf sf7
+                self.radio_set_bw(RADIO_BW.BW_125)          #radio set bw 125
+                self.radio_set_cr(CODING_RATES.R_4_5)       #radio set cr 4/5
+                self.radio_set_crc(CRC_HEADER_STATES.ON)    #radio set crc on
+                self.radio_set_sync(12)                     #radio set sync 12
+                self.radio_set_wdt(0)                       #radio set wdt 0
+                self.radio_set_pwr(14)                      #radio set pwr 14
+            if not ready:
+                sleep(0.1)
             self.mac_pause()                                #mac pause
-            sleep(0.1)
+            if not ready:
+                sleep(0.1)
             self.radio_rx(0)                                #radio rx 0
-            self.set_led(LEDS.CON, LED_STATES.ON)
+            self._led(LEDS.CON, LED_STATES.ON)
         elif auto_config == CONFIG_MODES.LORA_TX:
-            self.radio_set_mod(RADIO_MODES.LORA)            #radio set mod lora
-            self.radio_set_freq(freq)                       #radio set freq <freq>
-            self.radio_set_sf(SPREADING_FACTORS.SF7)        #radio set sf sf7
-            self.radio_set_bw(RADIO_BW.BW_125)              #radio set bw 125
-            self.radio_set_cr(CODING_RATES.R_4_5)           #radio set cr 4/5
-            self.radio_set_crc(CRC_HEADER_STATES.ON)        #radio set crc on
-            self.radio_set_sync(12)                         #radio set sync 12
-            self.radio_set_wdt(0)                           #radio set wdt 0
-            self.radio_set_pwr(14)                          #radio set pwr 14
-            sleep(0.1)
+            with self.batch():
+                self.radio_set_mod(RADIO_MODES.LORA)        #radio set mod lora
+                self.radio_set_freq(freq)                   #radio set freq <freq>
+                self.radio_set_sf(SPREADING_FACTORS.SF7)    #radio set sf sf7
+                self.radio_set_bw(RADIO_BW.BW_125)          #radio set bw 125
+                self.radio_set_cr(CODING_RATES.R_4_5)       #radio set cr 4/5
+                self.radio_set_crc(CRC_HEADER_STATES.ON)    #radio set crc on
+                self.radio_set_sync(12)                     #radio set sync 12
+                self.radio_set_wdt(0)                       #radio set wdt 0
+                self.radio_set_pwr(14)                      #radio set pwr 14
+            if not ready:
+                sleep(0.1)
             self.mac_pause()                                #mac pause
         else:
             pass
+
+        self.startup_time = monotonic() - start
         return
 
     #LED Control
@@ -1669,19 +3608,98 @@ class RN2XX3:
         res = self._write_data(CMD_TYPES.SYS_SET, ["pindig", led.value, state.value])
         return res
 
+    def set_led_policy(self, policy):
+        """Selects how the status LEDs follow transmit and receive activity.
+
+        Parameters:
+        policy (LED_POLICIES): DISABLED leaves the LEDs alone, COALESCED applies the latest state from a background writer and skips redundant changes, SYNC sets each LED before continuing
+
+        The coalesced policy shares the serial port with the caller, so it starts the background reader if it is not running."""
+
+        if policy not in LED_POLICIES:
+            raise ValueError('policy is not a member of LED_POLICIES.')
+
+        if policy == LED_POLICIES.COALESCED and self._reader is None:
+            self.start_reader()
+        with self._led_cond:
+            self.led_policy = policy
+            self._led_cond.notify()
+            #The writer clears _led_writer under the lock when it ends, so exactly one is running
+            if policy == LED_POLICIES.COALESCED and self._led_writer is None:
+                self._led_writer = threading.Thread(target = self._led_writer_routine, name = "RN2XX3 LED writer", daemon = True)
+                self._led_writer.start()
+
+    def _led(self, led, state):
+        """Sets an LED from the transmit and receive paths, following the LED policy.
+
+        Parameters:
+        led (LEDS): LEDs; Con, Act or Err
+        state (LED_STATES): LED state, on or off"""
+
+        if self.led_policy == LED_POLICIES.SYNC:
+            self.set_led(led, state)
+            with self._led_cond:
+                self._led_wanted[led] = self._led_applied[led] = state
+        elif self.led_policy == LED_POLICIES.COALESCED:
+            with self._led_cond:
+                self._led_wanted[led] = state
+                self._led_cond.notify()
+
+    def _led_writer_routine(self):
+        """Applies the latest wanted LED states while the coalesced policy is selected."""
+
+        while True:
+            with self._led_cond:
+                while self.led_policy == LED_POLICIES.COALESCED and self._led_wanted == self._led_applied:
+                    self._led_cond.wait()
+                #Snapshot the changes; the UART is written without holding the lock
+                changes = [(led, state) for led, state in self._led_wanted.items() if self._led_applied[led] != state]
+                if not changes and self.led_policy != LED_POLICIES.COALESCED:
+                    self._led_writer = None
+                    return
+
+            for led, state in changes:
+                try:
+                    self.set_led(led, state)
+                except Exception:
+                    with self._led_cond:
+                        self._led_writer = None
+                    return
+                with self._led_cond:
+                    self._led_applied[led] = state
+
     #Disposal
 
-    def __del__(self):
-        """Releases the resources. Stops the radio if auto mode is selected."""
+    def close(self):
+        """Stops the radio if auto mode is selected, turns the LEDs off and closes the serial port. A port given by its device name is opened again by the next command; a serial port object is not."""
 
         try:
-            if self.is_initialized:
+            if self.is_initialized and self.is_open():
                 if(self.auto != CONFIG_MODES.NONE):
                     self.radio_rxstop()
+                self.set_led_policy(LED_POLICIES.DISABLED)
                 self.set_led(LEDS.CON, LED_STATES.OFF)
                 self.set_led(LEDS.ACT, LED_STATES.OFF)
                 self.set_led(LEDS.ERR, LED_STATES.OFF)
-                self.sp.close()
-                del self.is_initialized
+        finally:
+            self._cancel_mac()
+            self.stop_reader()
+            if self._sp is not None:
+                self._sp.close()
+                self._sp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        """Releases the resources. Stops the radio if auto mode is selected."""
+
+        try:
+            self.close()
+            del self.is_initialized
         except:
             pass
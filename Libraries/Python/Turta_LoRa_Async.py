@@ -0,0 +1,819 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Asyncio Library for Microchip RN2903A/RN2483A LoRa Module.
+# Version 1.0.0
+# Released: November 5th, 2019
+
+# Visit https://docs.turta.io for documentation.
+
+import asyncio
+from collections import deque
+from time import monotonic
+import serial
+
+try:
+    from .Turta_LoRa import *
+    from .Turta_LoRa import _MacOperation
+except ImportError:
+    from Turta_LoRa import *
+    from Turta_LoRa import _MacOperation
+
+class AsyncRN2XX3(RN2XX3):
+    """Microchip RN2XX3 LoRa Module, asyncio interface.
+
+    Command methods inherited from RN2XX3 (sys_*, mac_*, radio_*, config_led and set_led) validate their parameters immediately and return an awaitable response. Use 'async with lora.batch():' to pipeline commands. The event loop reads the serial port, so the background reader, UART recording and baud rate negotiation are not available."""
+
+    @property
+    def sp(self):
+        """serial.Serial: UART device, opened by open(); None while closed."""
+
+        return self._sp
+
+    @sp.setter
+    def sp(self, device):
+        self._sp = device
+
+    @property
+    def auto_baud(self):
+        """None: Baud rate negotiation is not available on the asyncio interface."""
+
+        return None
+
+    @auto_baud.setter
+    def auto_baud(self, rates):
+        if rates is not None:
+            raise NotImplementedError('auto_baud is not available on AsyncRN2XX3.')
+
+    def __init__(self, region = REGIONS.US_RN2903, auto_config = CONFIG_MODES.NONE, freq_us = 915000000, freq_eu = 868000000, port = '/dev/serial0', baudrate = 57600, timeout = 2, event_queue_size = 64, config_cache = True, ready_timeout = 3, led_policy = LED_POLICIES.SYNC):
+        """Prepares the RN2XX3A LoRa module. Call open() from the event loop to start communication.
+
+        Parameters:
+        region (REGIONS): LoRa Module region.
+        auto_config (CONFIG_MODES): LoRa Module operating mode. NONE is for manual configuration. LORA_TX and LORA_RX are for automatic configuration. (MODES.CONFIG_MODES.NONE is default)
+        freq_us (int): LoRa radio frequency for auto configuration, US version. (Default is 915000000)
+        freq_eu (int): LoRa radio frequency for auto configuration, EU version. (Default is 868000000)
+        port (str): Serial port device. (Default is '/dev/serial0')
+        baudrate (int): Serial port baud rate. (Default is 57600)
+        timeout (float): Response timeout in seconds. (Default is 2)
+        event_queue_size (int): Maximum number of unread events; oldest events are dropped when full. (Default is 64)
+        config_cache (bool): Keeps a shadow copy of radio and mac parameters, skipping redundant set commands and serving get commands from it. (Default is True)
+        ready_timeout (float): Maximum time in seconds to wait for the module to answer after reset; fixed delays are used if it does not. (Default is 3)
+        led_policy (LED_POLICIES): Status LED signalling during transmit and receive, see set_led_policy(). (LED_POLICIES.SYNC is default)"""
+
+        if region not in REGIONS:
+            raise ValueError('region is not a member of REGIONS.')
+        if auto_config not in CONFIG_MODES:
+            raise ValueError('auto_config is not a member of CONFIG_MODES.')
+        if event_queue_size < 1:
+            raise ValueError('event_queue_size should be at least 1.')
+        if led_policy not in LED_POLICIES:
+            raise ValueError('led_policy is not a member of LED_POLICIES.')
+
+        self.is_initialized = False
+        self.region = region
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.config_cache = config_cache
+        self.ready_timeout = ready_timeout
+        self.led_policy = led_policy
+        self._init_link()
+        self._freq = freq_us if region == REGIONS.US_RN2903 else freq_eu
+        self._auto_config = auto_config
+        self._rx_buffer = bytearray()
+        self._events = deque(maxlen = event_queue_size)
+        self._event_ready = None
+        self._cmd_lock = None
+        self._mac_lock = None
+        self._mac_tasks = set()
+        self._loop = None
+
+    async def open(self):
+        """Opens the serial port and initiates the RN2XX3A LoRa module.
+
+        Returns:
+        AsyncRN2XX3: The module itself"""
+
+        self._loop = asyncio.get_running_loop()
+        self._event_ready = asyncio.Event()
+        self._cmd_lock = asyncio.Lock()
+        self._mac_lock = asyncio.Lock()
+        self.sp = serial.Serial(self.port, self.baudrate, timeout=0, write_timeout=self.timeout)
+        self._loop.add_reader(self.sp.fileno(), self._on_readable)
+
+        await self._set_initial_settings(self._auto_config, self._freq)
+        self.is_initialized = True
+        return self
+
+    def is_open(self):
+        """Returns whether the serial port has been opened.
+
+        Returns:
+        bool: True if the serial port is open"""
+
+        return self.sp is not None and self.sp.is_open
+
+    async def close(self):
+        """Stops the radio if auto mode is selected, turns the LEDs off and closes the serial port."""
+
+        if self.sp is None:
+            return
+        try:
+            if self.is_initialized:
+                if self.auto != CONFIG_MODES.NONE:
+                    await self.radio_rxstop()
+                self.led_policy = LED_POLICIES.DISABLED
+                if self._led_writer is not None:
+                    await self._led_writer
+                await self.set_led(LEDS.CON, LED_STATES.OFF)
+                await self.set_led(LEDS.ACT, LED_STATES.OFF)
+                await self.set_led(LEDS.ERR, LED_STATES.OFF)
+        finally:
+            self.is_initialized = False
+            self._cancel_mac()
+            self._loop.remove_reader(self.sp.fileno())
+            self.sp.close()
+            self.sp = None
+            while self._pending:
+                fut = self._pending.popleft()
+                if not fut.done():
+                    fut.set_result("")
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError('AsyncRN2XX3 should be used with "async with".')
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        raise TypeError('AsyncRN2XX3 should be used with "async with".')
+
+    #Unavailable Operations
+
+    def start_reader(self, event_queue_size = 64):
+        """Not available: the event loop reads the serial port."""
+
+        raise NotImplementedError('start_reader is not available on AsyncRN2XX3; the event loop reads the serial port.')
+
+    def start_recording(self, path):
+        """Not available on the asyncio interface."""
+
+        raise NotImplementedError('start_recording is not available on AsyncRN2XX3.')
+
+    def negotiate_baudrate(self, rates = AUTO_BAUD_RATES):
+        """Not available on the asyncio interface."""
+
+        raise NotImplementedError('negotiate_baudrate is not available on AsyncRN2XX3.')
+
+    #UART Communication
+
+    def _on_readable(self):
+        """Reads available bytes from the serial port and dispatches complete lines."""
+
+        try:
+            data = self.sp.read(self.sp.in_waiting or 1)
+        except serial.SerialException:
+            return
+        if not data:
+            return
+
+        self._rx_buffer += data
+        while True:
+            end = self._rx_buffer.find(b"\r\n")
+            if end < 0:
+                break
+            line = self._rx_buffer[0:end].decode("utf-8", "replace")
+            del self._rx_buffer[0:end + 2]
+            self._dispatch(line)
+
+    def _dispatch(self, line):
+        """Routes a line either to the oldest waiting command or to the event queue.
+
+        Parameters:
+        line (str): Line received from the UART"""
+
+        op = self._mac_op
+        #Second responses which are not events, such as invalid_data_len, are not command replies once the operation is answered
+        second = op is not None and op.answered and line.startswith(op.outcomes)
+        if line.startswith(EVENT_PREFIXES) or not self._pending or second:
+            if op is not None and line.startswith(op.outcomes):
+                #Second response of the uplink or join in progress
+                self._mac_op = None
+                if not op.done.done():
+                    op.done.set_result(line)
+                return
+            self._events.append(line)
+            self._event_ready.set()
+            return
+
+        fut = self._pending.popleft()
+        if not fut.done():
+            fut.set_result(line)
+
+    async def _command(self, line, refresh = False):
+        """Writes a command line to the UART device and waits for its response.
+
+        Parameters:
+        line (str): Command line to send
+        refresh (bool): Bypasses the shadow cache (Default is False)
+
+        Returns:
+        str: Response from the device, empty if the device did not respond in time"""
+
+        entered = monotonic()
+        cached = None if refresh else self._cached_response(line)
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return cached
+
+        async with self._cmd_lock:
+            fut = self._loop.create_future()
+            self._pending.append(fut)
+            written = monotonic()
+            self.sp.write((line + "\r\n").encode("utf-8"))
+            res = await self._wait_reply(fut)
+
+        self.stats.record(line, res, monotonic() - written, written - entered)
+        self._on_response(line, res)
+        return res
+
+    async def _pipeline(self, lines, window):
+        """Writes a sequence of command lines without waiting for each response, keeping up to <window> commands in flight.
+
+        Parameters:
+        lines (list): Command lines to send
+        window (int): Maximum number of commands awaiting a response
+
+        Returns:
+        list: Responses from the device, in command order"""
+
+        responses = []
+        written = []
+        received = []
+        async with self._cmd_lock:
+            futs = []
+            for line in lines:
+                if len(futs) - len(responses) >= window:
+                    responses.append(await self._wait_reply(futs[len(responses)]))
+                    received.append(monotonic())
+                fut = self._loop.create_future()
+                self._pending.append(fut)
+                written.append(monotonic())
+                self.sp.write((line + "\r\n").encode("utf-8"))
+                futs.append(fut)
+            while len(responses) < len(futs):
+                responses.append(await self._wait_reply(futs[len(responses)]))
+                received.append(monotonic())
+
+        for line, res, sent_at, received_at in zip(lines, responses, written, received):
+            self.stats.record(line, res, received_at - sent_at)
+            self._on_response(line, res)
+        return responses
+
+    async def _wait_reply(self, fut):
+        """Waits for a response future to be resolved by the reader.
+
+        Parameters:
+        fut (Future): Response future
+
+        Returns:
+        str: Response from the device, empty if the device did not respond in time"""
+
+        try:
+            return await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            if fut in self._pending:
+                self._pending.remove(fut)
+            return ""
+
+    def _batch_owner(self):
+        """Returns the caller whose commands go into an open batch; commands from other tasks are sent as usual.
+
+        Returns:
+        asyncio.Task: Current task"""
+
+        return asyncio.current_task()
+
+    def _transact(self, cmd_type, data, refresh = False):
+        """Writes a command to the UART device.
+
+        Parameters:
+        cmd_type (str): Command type
+        data (str): Payload to send
+        refresh (bool): Bypasses the shadow cache (Default is False)
+
+        Returns:
+        awaitable: Response from the device, None if the command is queued in a batch"""
+
+        line = str(cmd_type.value + " " + ' '.join([str(e) for e in data]))
+        if self._batch is not None and self._batch.owner is self._batch_owner():
+            if self._cached_response(line) is None:
+                self._batch.commands.append(line)
+            else:
+                self.stats.cache_hits += 1
+            fut = self._loop.create_future()
+            fut.set_result(None)
+            return fut
+        return self._command(line, refresh)
+
+    def _write_data(self, cmd_type, data):
+        """Writes data to the UART device.
+
+        Parameters:
+        cmd_type (str): Command type
+        data (str): Payload to send
+
+        Returns:
+        awaitable: Response from the device"""
+
+        return self._transact(cmd_type, data)
+
+    def _read_data(self, cmd_type, data, refresh = False):
+        """Reads data from the UART device.
+
+        Parameters:
+        cmd_type (str): Command type
+        data (str): Payload to send
+        refresh (bool): Bypasses the shadow cache (Default is False)
+
+        Returns:
+        awaitable: Response from the device"""
+
+        return self._transact(cmd_type, data, refresh)
+
+    async def check_uart_buffer(self, timeout = None):
+        """Waits for an unsolicited line from the UART device.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the response timeout)
+
+        Returns:
+        str: Oldest unread line, or None if nothing was received in time"""
+
+        if not self._events:
+            self._event_ready.clear()
+            try:
+                await asyncio.wait_for(self._event_ready.wait(), self.timeout if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._events.popleft()
+
+    async def check_data(self, timeout = None):
+        """Waits for received data.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the response timeout)
+
+        Returns:
+        str: If auto mode is selected, the function returns received data. If manual mode is selected, it returns the LoRa module's raw output."""
+
+        res = await self.check_uart_buffer(timeout)
+
+        if res is None or res == "":
+            return None
+        if self.auto == CONFIG_MODES.NONE:
+            return res
+        elif self.auto == CONFIG_MODES.LORA_RX:
+            return await self._auto_rx_routine(res)
+        else:
+            return None
+
+    async def send_uart_data(self, data):
+        """Writes a raw command line to the UART device.
+
+        Parameters:
+        data (str): Command line to send
+
+        Returns:
+        str: Response from the device"""
+
+        return await self._command(str(data))
+
+    async def check_bytes(self, timeout = None):
+        """Waits for a received packet. If auto RX mode is selected, the receiver is restarted. Lines other than received packets are discarded; use check_uart_buffer() for raw output.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the response timeout)
+
+        Returns:
+        bytes: Received payload, None if no packet is received"""
+
+        res = await self.check_uart_buffer(timeout)
+
+        if res is None:
+            return None
+        elif self.auto == CONFIG_MODES.LORA_RX:
+            return await self._auto_rx_routine(res, True)
+        elif res.startswith("radio_rx", 0, 8):
+            return bytes.fromhex(res[8:].strip())
+        else:
+            return None
+
+    async def wait_tx_done(self, timeout = None):
+        """Waits for the second response of radio tx, sent when the transmission ends. Other lines received meanwhile stay queued.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds. (Default is the response timeout)
+
+        Returns:
+        str: 'radio_tx_ok' or 'radio_err', empty if the transmission did not end in time"""
+
+        deadline = monotonic() + (self.timeout if timeout is None else timeout)
+        others = []
+        res = ""
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            line = await self.check_uart_buffer(remaining)
+            if line is None:
+                break
+            if line == "radio_tx_ok" or line == "radio_err":
+                res = line
+                break
+            others.append(line)
+
+        self._events.extendleft(reversed(others))
+        return res
+
+    def _drain_radio_events(self):
+        """Discards packets and receive errors left over from an earlier receive window, so they are not taken for the result of the next one."""
+
+        stale = [line for line in self._events if line.startswith("radio_rx", 0, 8) or line == "radio_err"]
+        for line in stale:
+            self._events.remove(line)
+
+    async def receive_bytes(self, timeout):
+        """Opens the receiver and waits for one packet. The radio should be configured and the MAC paused. Lines other than the packet are discarded.
+
+        Parameters:
+        timeout (float): Maximum time to wait for a packet in seconds
+
+        Returns:
+        bytes: Received payload, None if no packet is received in time"""
+
+        self._drain_radio_events()
+        res = await self.radio_rx(0)
+        if res == "busy":
+            #The receiver is still open from an earlier call
+            await self.radio_rxstop()
+            self._drain_radio_events()
+            res = await self.radio_rx(0)
+        if res != "ok":
+            return None
+
+        line = ""
+        deadline = monotonic() + timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            line = await self.check_uart_buffer(remaining)
+            if line is None:
+                line = ""
+                break
+            if line.startswith("radio_rx", 0, 8) or line == "radio_err":
+                break
+            line = ""
+
+        if line == "":
+            #A packet may arrive while the receiver is being stopped
+            await self.radio_rxstop()
+            for event in self._events:
+                if event.startswith("radio_rx", 0, 8):
+                    self._events.remove(event)
+                    line = event
+                    break
+
+        if line.startswith("radio_rx", 0, 8):
+            res = bytes.fromhex(line[8:].strip())
+            if self.link_quality is not None:
+                await self._capture_link_quality(res, False)
+            return res
+        return None
+
+    async def _auto_rx_routine(self, data, binary = False):
+        """Processes received data.
+
+        Parameters:
+        data (str): Received data from the UART
+        binary (bool): Returns the payload as bytes instead of decoding it as UTF-8 (Default is False)
+
+        Returns:
+        str: Received data (bytes if binary is selected)"""
+
+        if data == "radio_err":
+            await self._led(LEDS.CON, LED_STATES.OFF)
+            await self._led(LEDS.ERR, LED_STATES.ON)
+            await self.radio_rx(0)
+            await self._led(LEDS.ERR, LED_STATES.OFF)
+            await self._led(LEDS.CON, LED_STATES.ON)
+            return None
+
+        elif data.startswith("radio_rx", 0, 8):
+            await self._led(LEDS.ACT, LED_STATES.ON)
+            res = bytes.fromhex(data[8:].strip())
+            if self.link_quality is None:
+                await self.radio_rx(0)
+            else:
+                await self._capture_link_quality(res, True)
+            if not binary:
+                res = res.decode("utf-8")
+            await self._led(LEDS.ACT, LED_STATES.OFF)
+            return res
+
+        else:
+            return None
+
+    async def send(self, data):
+        """Broadcasts data for auto TX mode operation.
+
+        Parameters:
+        data (string): Data to send
+
+        Returns:
+        str: Response from the LoRa module"""
+
+        data = str(data)
+        if len(data) > 255:
+            raise ValueError('data length is outside of 0 and 255.')
+
+        return await self.send_bytes(data.encode("utf-8"))
+
+    async def send_bytes(self, data):
+        """Broadcasts binary data for auto TX mode operation.
+
+        Parameters:
+        data (bytes): Data to send (bytes, bytearray or memoryview; up to 255 bytes for LoRa modulation and 64 bytes for FSK modulation)
+
+        Returns:
+        str: Response from the LoRa module"""
+
+        if isinstance(data, memoryview):
+            data = data.cast("B")
+        elif not isinstance(data, (bytes, bytearray)):
+            raise TypeError('data should be bytes, bytearray or memoryview.')
+        limit = self.radio_max_payload()
+        if len(data) > limit:
+            raise ValueError('data length is outside of 0 and ' + str(limit) + '.')
+
+        wb = data.hex()
+        if self.err_on == True:
+            self.err_on = False
+            await self._led(LEDS.ERR, LED_STATES.OFF)
+        await self._led(LEDS.ACT, LED_STATES.ON)
+        res = await self.radio_tx(wb)
+        await self._led(LEDS.ACT, LED_STATES.OFF)
+        if res == "busy" or res == "invalid_param" or res == "err":
+            self.err_on = True
+            await self._led(LEDS.ERR, LED_STATES.ON)
+        return res
+
+    async def wait_ready(self, timeout = 3):
+        """Probes the module with 'sys get ver' until it answers with its firmware version.
+
+        Parameters:
+        timeout (float): Maximum time to wait in seconds (Default is 3)
+
+        Returns:
+        bool: True if the module is ready"""
+
+        deadline = monotonic() + timeout
+        while True:
+            ver = await self.sys_get_ver()
+            if ver.startswith("RN2"):
+                self.firmware_version = ver
+                return True
+            if monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+
+    #Module Configuration
+
+    async def _set_initial_settings(self, auto_config, freq):
+        """Initiates the RN2XX3A LoRa module.
+
+        Parameters:
+        auto_config (CONFIG_MODES): LoRa Module operating mode. NONE is for manual configuration. LORA_TX and LORA_RX are for automatic configuration. (MODES.CONFIG_MODES.NONE is default)
+        freq (int): LoRa radio frequency for auto configuration. (Default is 915000000 for US)."""
+
+        self.auto = auto_config
+        start = monotonic()
+
+        #The reset response is the firmware version banner, sent once the module is ready
+        banner = await self.sys_reset()
+        if banner.startswith("RN2"):
+            self.firmware_version = banner
+            ready = True
+        else:
+            ready = await self.wait_ready(self.ready_timeout)
+
+        async with self.batch():
+            self.config_led(LEDS.CON)
+            self.config_led(LEDS.ACT)
+            self.config_led(LEDS.ERR)
+
+            self.set_led(LEDS.CON, LED_STATES.OFF)
+            self.set_led(LEDS.ACT, LED_STATES.OFF)
+            self.set_led(LEDS.ERR, LED_STATES.OFF)
+
+        if not ready:
+            await asyncio.sleep(0.5)                        #Fallback: Readiness is not confirmed
+
+        if auto_config == CONFIG_MODES.LORA_RX or auto_config == CONFIG_MODES.LORA_TX:
+            async with self.batch():
+                self.radio_set_mod(RADIO_MODES.LORA)        #radio set mod lora
+                self.radio_set_freq(freq)                   #radio set freq <freq>
+                self.radio_set_sf(SPREADING_FACTORS.SF7)    #radio set sf sf7
+                self.radio_set_bw(RADIO_BW.BW_125)          #radio set bw 125
+                self.radio_set_cr(CODING_RATES.R_4_5)       #radio set cr 4/5
+                self.radio_set_crc(CRC_HEADER_STATES.ON)    #radio set crc on
+                self.radio_set_sync(12)                     #radio set sync 12
+                self.radio_set_wdt(0)                       #radio set wdt 0
+                self.radio_set_pwr(14)                      #radio set pwr 14
+            if not ready:
+                await asyncio.sleep(0.1)
+            await self.mac_pause()                          #mac pause
+            if auto_config == CONFIG_MODES.LORA_RX:
+                if not ready:
+                    await asyncio.sleep(0.1)
+                await self.radio_rx(0)                      #radio rx 0
+                await self._led(LEDS.CON, LED_STATES.ON)
+
+        self.startup_time = monotonic() - start
+        return
+
+    async def _capture_link_quality(self, payload, rearm):
+        """Reads the link quality of the last packet, optionally restarting the receiver in the same exchange.
+
+        Parameters:
+        payload (bytes): Received payload
+        rearm (bool): Restarts continuous reception"""
+
+        lines = self._link_quality_lines(rearm)
+        self._record_link_quality(payload, lines, await self._pipeline(lines, len(lines)))
+
+    #Typed Parameters
+
+    async def radio_get_value(self, name, refresh = False):
+        """Reads a radio parameter and converts it to its type; ints for numeric values, enumeration members for settings.
+
+        Parameters:
+        name (str): Radio parameter name, a key of RADIO_PARAMETERS
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        object: Parameter value, None if the module did not answer with a valid value"""
+
+        if name not in RADIO_PARAMETERS:
+            raise ValueError('name is not a member of RADIO_PARAMETERS.')
+
+        return parse_parameter(RADIO_PARAMETERS, name, await self._read_data(CMD_TYPES.RADIO_GET, [name], refresh))
+
+    async def mac_get_value(self, name, refresh = False):
+        """Reads a LoRaWAN parameter and converts it to its type; ints for numeric values, enumeration members for settings and MacStatus for the status.
+
+        Parameters:
+        name (str): LoRaWAN parameter name, a key of MAC_PARAMETERS
+        refresh (bool): Reads the value from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        object: Parameter value, None if the module did not answer with a valid value"""
+
+        if name not in MAC_PARAMETERS:
+            raise ValueError('name is not a member of MAC_PARAMETERS.')
+
+        return parse_parameter(MAC_PARAMETERS, name, await self._read_data(CMD_TYPES.MAC_GET, [name], refresh))
+
+    async def mac_get_status_flags(self):
+        """Reads and decodes the LoRaWAN stack status.
+
+        Returns:
+        MacStatus: Decoded status, None if the module did not answer with a valid value"""
+
+        return await self.mac_get_value("status")
+
+    async def status_snapshot(self, window = 8, refresh = False):
+        """Reads every radio and LoRaWAN parameter in RADIO_PARAMETERS and MAC_PARAMETERS in one pipelined exchange. Parameters in the shadow cache are not sent to the module.
+
+        Parameters:
+        window (int): Maximum number of commands awaiting a response (Default is 8)
+        refresh (bool): Reads every parameter from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        StatusSnapshot: Parsed parameters"""
+
+        if window < 1:
+            raise ValueError('window should be at least 1.')
+
+        start = monotonic()
+        queries, answers = self._snapshot_lines(refresh)
+        lines = [query[3] for query in queries if query[3] not in answers]
+        answers.update(zip(lines, await self._pipeline(lines, window)))
+        return self._snapshot_record(queries, answers, start)
+
+    #LoRaWAN Operations
+
+    def _submit_mac(self, command, outcomes, timeout):
+        """Starts a LoRaWAN operation as a task; operations are sent one at a time, in order. Used by send_uplink() and join_network().
+
+        Parameters:
+        command (str): Command line
+        outcomes (tuple): Second responses which end the operation
+        timeout (float): Maximum time to wait for the second response in seconds
+
+        Returns:
+        asyncio.Task: Resolves with a MacOutcome"""
+
+        op = _MacOperation(command, outcomes, timeout, None, self._loop.create_future())
+        task = self._loop.create_task(self._mac_operation(op))
+        self._mac_tasks.add(task)
+        task.add_done_callback(self._mac_tasks.discard)
+        return task
+
+    async def _mac_operation(self, op):
+        """Sends a LoRaWAN operation and waits for its second response.
+
+        Parameters:
+        op (_MacOperation): Operation
+
+        Returns:
+        MacOutcome: Outcome of the operation"""
+
+        async with self._mac_lock:
+            started_at = monotonic()
+            self._mac_op = op
+            try:
+                res = await self._command(op.command)
+                if res == "ok":
+                    op.answered = True
+                    try:
+                        res = await asyncio.wait_for(asyncio.shield(op.done), op.timeout)
+                    except asyncio.TimeoutError:
+                        res = ""
+            finally:
+                if self._mac_op is op:
+                    self._mac_op = None
+            return MacOutcome(res, started_at)
+
+    def _cancel_mac(self):
+        """Cancels the LoRaWAN operations not completed yet."""
+
+        self._mac_op = None
+        for task in list(self._mac_tasks):
+            task.cancel()
+
+    #LED Signalling
+
+    def set_led_policy(self, policy):
+        """Selects how the status LEDs follow transmit and receive activity.
+
+        Parameters:
+        policy (LED_POLICIES): DISABLED leaves the LEDs alone, COALESCED applies the latest state from a background task and skips redundant changes, SYNC sets each LED before continuing"""
+
+        if policy not in LED_POLICIES:
+            raise ValueError('policy is not a member of LED_POLICIES.')
+
+        self.led_policy = policy
+
+    async def _led(self, led, state):
+        """Sets an LED from the transmit and receive paths, following the LED policy.
+
+        Parameters:
+        led (LEDS): LEDs; Con, Act or Err
+        state (LED_STATES): LED state, on or off"""
+
+        if self.led_policy == LED_POLICIES.SYNC:
+            await self.set_led(led, state)
+            self._led_wanted[led] = self._led_applied[led] = state
+        elif self.led_policy == LED_POLICIES.COALESCED:
+            self._led_wanted[led] = state
+            if self._led_writer is None or self._led_writer.done():
+                self._led_writer = self._loop.create_task(self._led_writer_routine())
+
+    async def _led_writer_routine(self):
+        """Applies the latest wanted LED states until they are all in place."""
+
+        while True:
+            changes = [(led, state) for led, state in self._led_wanted.items() if self._led_applied[led] != state]
+            if not changes:
+                return
+            for led, state in changes:
+                await self.set_led(led, state)
+                self._led_applied[led] = state
+
+    #Disposal
+
+    def __del__(self):
+        """Releases the serial port. Use close() to also stop the radio."""
+
+        try:
+            if self.sp is not None:
+                self._loop.remove_reader(self.sp.fileno())
+                self.sp.close()
+        except:
+            pass
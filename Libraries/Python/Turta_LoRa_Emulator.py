@@ -0,0 +1,709 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Firmware Emulator for Microchip RN2903A/RN2483A LoRa Module.
+# Version 1.0.0
+# Released: November 5th, 2019
+
+# Visit https://docs.turta.io for documentation.
+
+from time import sleep, monotonic
+from collections import deque
+import threading
+import random
+import pty
+import tty
+import termios
+import os
+
+try:
+    from .Turta_LoRa import *
+except ImportError:
+    from Turta_LoRa import *
+
+#Firmware version banners, sent after reset
+FIRMWARE_BANNERS = {
+    REGIONS.US_RN2903: "RN2903 1.0.5 Nov 06 2018 10:45:27",
+    REGIONS.EU_RN2483: "RN2483 1.0.5 Oct 31 2018 15:06:52"
+}
+
+#Time the firmware takes to process a command, in seconds
+PROCESSING_TIME = 0.001
+
+#Time from reset until the banner is sent, in seconds
+RESET_TIME = 0.1
+
+#Radio parameters after reset, in addition to RADIO_DEFAULTS
+EMULATED_RADIO_DEFAULTS = {"pwr": "1", "wdt": "15000", "fdev": "25000", "rxbw": "25", "afcbw": "41.7", "bt": "0.5", "iqi": "off"}
+
+#LoRaWAN parameters after reset
+EMULATED_MAC_DEFAULTS = {
+    "adr": "off", "ar": "off", "class": "A", "dr": "5", "devaddr": "00000000", "appeui": "0000000000000000",
+    "rxdelay1": "1000", "rxdelay2": "2000", "retx": "7", "pwridx": "1", "sync": "34", "dcycleps": "1",
+    "upctr": "0", "dnctr": "0", "mcast": "off", "mcastdevaddr": "00000000", "mcastdnctr": "0", "mrgn": "255", "gwnb": "0"
+}
+
+#Value returned by 'mac pause': Maximum pause time in milliseconds
+MAC_PAUSE_TIME = "4294967245"
+
+class _Frame(object):
+    """A transmission on the simulated channel."""
+
+    __slots__ = ("sender", "key", "payload", "start", "end", "collided")
+
+    def __init__(self, sender, key, payload, start, end):
+        self.sender = sender
+        self.key = key
+        self.payload = payload
+        self.start = start
+        self.end = end
+        self.collided = False
+
+class Channel(object):
+    """Simulated radio channel shared by emulated modules.
+
+    A frame reaches every other module which is receiving with the same modulation, frequency, spreading factor, bandwidth and sync word since before the frame started. Frames overlapping in time with the same settings collide, and are reported as 'radio_err' by the receivers."""
+
+    def __init__(self, loss = 0.0, snr = 8, rssi = -60, seed = None):
+        """Initiates the channel.
+
+        Parameters:
+        loss (float): Probability of a frame being lost for a receiver, between 0 and 1 (Default is 0)
+        snr (int): Signal to noise ratio reported for received frames, in dB (Default is 8)
+        rssi (int): Signal strength reported for received frames, in dBm (Default is -60)
+        seed (int): Random seed for repeatable losses (Default is None)"""
+
+        if loss < 0 or loss > 1:
+            raise ValueError('loss is outside of 0 and 1.')
+
+        self.loss = loss
+        self.snr = snr
+        self.rssi = rssi
+        self.radios = []
+        self.transmitted = 0
+        self.collisions = 0
+        self.lost = 0
+        self._active = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def attach(self, radio):
+        """Connects an emulated module to the channel.
+
+        Parameters:
+        radio (EmulatedRN2XX3): Emulated module"""
+
+        with self._lock:
+            self.radios.append(radio)
+
+    def detach(self, radio):
+        """Disconnects an emulated module from the channel.
+
+        Parameters:
+        radio (EmulatedRN2XX3): Emulated module"""
+
+        with self._lock:
+            if radio in self.radios:
+                self.radios.remove(radio)
+
+    def transmit(self, sender, key, payload, airtime):
+        """Puts a frame on the channel. It is delivered when its time on air has elapsed.
+
+        Parameters:
+        sender (EmulatedRN2XX3): Transmitting module
+        key (tuple): Modulation, frequency, spreading factor, bandwidth and sync word
+        payload (bytes): Frame payload
+        airtime (float): Time on air in seconds"""
+
+        now = monotonic()
+        frame = _Frame(sender, key, payload, now, now + airtime)
+        with self._lock:
+            self._active = [f for f in self._active if f.end > now]
+            for other in self._active:
+                if other.key == key:
+                    other.collided = True
+                    frame.collided = True
+                    self.collisions += 1
+            self._active.append(frame)
+            self.transmitted += 1
+
+        timer = threading.Timer(airtime, self._deliver, (frame,))
+        timer.daemon = True
+        timer.start()
+
+    def _deliver(self, frame):
+        """Hands a finished frame to the receiving modules.
+
+        Parameters:
+        frame (_Frame): Finished frame"""
+
+        with self._lock:
+            radios = [r for r in self.radios if r is not frame.sender]
+            lost = [self._random.random() < self.loss for r in radios]
+            self.lost += sum(lost)
+
+        for radio, is_lost in zip(radios, lost):
+            if not is_lost:
+                radio._on_air(frame)
+
+class EmulatedRN2XX3(object):
+    """Microchip RN2XX3 LoRa Module firmware, emulated on a pseudo-terminal.
+
+    Pass the port attribute to RN2XX3 to drive the emulated module. Response times follow the UART baud rate and the command processing time, radio transmissions take their time on air."""
+
+    def __init__(self, region = REGIONS.EU_RN2483, channel = None, baudrate = 57600, processing_time = PROCESSING_TIME, reset_time = RESET_TIME, join_delay = 0.5, network = True, max_baudrate = 921600):
+        """Starts the emulated module.
+
+        Parameters:
+        region (REGIONS): Emulated module; RN2483 for EU or RN2903 for US (REGIONS.EU_RN2483 is default)
+        channel (Channel): Simulated channel shared with other emulated modules; None creates a private one (Default is None)
+        baudrate (int): Emulated UART baud rate after reset, used for timing (Default is 57600)
+        processing_time (float): Command processing time in seconds (Default is PROCESSING_TIME)
+        reset_time (float): Time from reset until the banner is sent, in seconds (Default is RESET_TIME)
+        join_delay (float): Time from 'mac join' until the join response, in seconds (Default is 0.5)
+        network (bool): Whether a LoRaWAN network accepts joins and uplinks (Default is True)
+        max_baudrate (int): Fastest rate auto-baud locks on to; above it, commands are ignored until the next auto-baud or reset (Default is 921600)"""
+
+        if region not in REGIONS:
+            raise ValueError('region is not a member of REGIONS.')
+        if baudrate < 1:
+            raise ValueError('baudrate should be at least 1.')
+
+        self.region = region
+        self.channel = channel if channel is not None else Channel()
+        self.reset_baudrate = baudrate
+        self.max_baudrate = max_baudrate
+        self.processing_time = processing_time
+        self.reset_time = reset_time
+        self.join_delay = join_delay
+        self.network = network
+        self.hweui = "0004A30B" + "%08X" % random.getrandbits(32)
+        self.pins = {}
+        self.nvm = {}
+        self.eeprom = {}
+        self.history = deque(maxlen = 1000)
+        self.downlinks = deque()
+        self._outbox = deque()
+        self._outbox_cond = threading.Condition()
+        self._state_lock = threading.RLock()
+        self._timers = []
+        self._generation = 0
+        self._reset_state()
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self.channel.attach(self)
+        self._thread = threading.Thread(target = self._routine, name = "RN2XX3 emulator", daemon = True)
+        self._thread.start()
+        self._writer = threading.Thread(target = self._writer_routine, name = "RN2XX3 emulator UART", daemon = True)
+        self._writer.start()
+
+    def _reset_state(self):
+        """Restores the radio and LoRaWAN parameters after reset."""
+
+        with self._state_lock:
+            self._generation += 1
+            self.baudrate = self.reset_baudrate
+            self.garbled = False
+            self.radio = dict(RADIO_DEFAULTS)
+            self.radio.update(EMULATED_RADIO_DEFAULTS)
+            self.radio["freq"] = str(RADIO_DEFAULT_FREQ[self.region])
+            self.radio["snr"] = "-128"
+            self.radio["rssi"] = "-128"
+            self.mac = dict(EMULATED_MAC_DEFAULTS)
+            self.mac["deveui"] = self.hweui
+            self.mac.update(self.eeprom)
+            self.mac["status"] = "00000000"
+            self.mac_paused = False
+            self.joined = False
+            self.transmitting = False
+            self.receiving = False
+            self.rx_started = None
+            self._rx_id = 0
+
+    #UART
+
+    def _uart_time(self, line):
+        """Returns the time a line takes on the UART.
+
+        Parameters:
+        line (str): Line without the terminator
+
+        Returns:
+        float: Transfer time in seconds, 10 bits per character"""
+
+        return (len(line) + 2) * 10.0 / self.baudrate
+
+    def _routine(self):
+        """Reads command lines from the pseudo-terminal and answers them in order. Each line is processed once its last byte would have arrived at the baud rate."""
+
+        buffer = b""
+        arrival = 0.0
+        while self._running:
+            try:
+                chunk = os.read(self._master, 1024)
+            except OSError:
+                break
+            if not chunk:
+                break
+            now = monotonic()
+            buffer += chunk
+            while buffer.startswith(b"\x55"):
+                #Auto-baud character; the preceding break does not pass through a pseudo-terminal
+                buffer = buffer[1:]
+                self._auto_baud()
+            while b"\r\n" in buffer:
+                raw, buffer = buffer.split(b"\r\n", 1)
+                if self.garbled:
+                    continue
+                line = raw.decode("utf-8", "replace")
+                arrival = max(arrival, now) + self._uart_time(line)
+                wait = arrival + self.processing_time - monotonic()
+                if wait > 0:
+                    sleep(wait)
+                self.history.append(line)
+                for res in self._handle(line):
+                    self._emit(res)
+
+    def _auto_baud(self):
+        """Locks on to the baud rate the host has set on the pseudo-terminal."""
+
+        speeds = dict((getattr(termios, "B" + str(rate)), rate) for rate in (9600, 19200, 38400, 57600, 115200, 230400, 460800, 500000, 576000, 921600, 1000000) if hasattr(termios, "B" + str(rate)))
+        try:
+            rate = speeds.get(termios.tcgetattr(self._slave)[4])
+        except termios.error:
+            rate = None
+        if rate is None:
+            return
+        self.garbled = rate > self.max_baudrate
+        if not self.garbled:
+            self.baudrate = rate
+
+    def _emit(self, line):
+        """Queues a line for the pseudo-terminal. Lines are sent in order, each taking its UART time, while the module goes on processing commands.
+
+        Parameters:
+        line (str): Line to send"""
+
+        with self._outbox_cond:
+            self._outbox.append(line)
+            self._outbox_cond.notify()
+
+    def _writer_routine(self):
+        """Writes queued lines to the pseudo-terminal at the baud rate."""
+
+        while True:
+            with self._outbox_cond:
+                while self._running and not self._outbox:
+                    self._outbox_cond.wait()
+                if not self._running:
+                    return
+                line = self._outbox.popleft()
+            sleep(self._uart_time(line))
+            try:
+                os.write(self._master, (line + "\r\n").encode("utf-8"))
+            except OSError:
+                return
+
+    def _later(self, delay, action):
+        """Runs an action after a delay and sends the line it returns, unless the module was reset meanwhile.
+
+        Parameters:
+        delay (float): Delay in seconds
+        action (function): Returns the line to send, or None to send nothing"""
+
+        generation = self._generation
+
+        def fire():
+            with self._state_lock:
+                if generation != self._generation:
+                    return
+                res = action()
+            if res is not None:
+                self._emit(res)
+
+        timer = threading.Timer(delay, fire)
+        timer.daemon = True
+        self._timers = [t for t in self._timers if t.is_alive()]
+        self._timers.append(timer)
+        timer.start()
+
+    #Command Handling
+
+    def _handle(self, line):
+        """Processes a command line.
+
+        Parameters:
+        line (str): Command line
+
+        Returns:
+        list: Immediate responses"""
+
+        words = line.split()
+        if len(words) < 2:
+            return ["invalid_param"]
+
+        with self._state_lock:
+            if words[0] == "sys":
+                return self._handle_sys(words[1:])
+            elif words[0] == "mac":
+                return self._handle_mac(words[1:])
+            elif words[0] == "radio":
+                return self._handle_radio(words[1:])
+        return ["invalid_param"]
+
+    def _handle_sys(self, words):
+        """Processes a 'sys' command.
+
+        Parameters:
+        words (list): Command words after 'sys'
+
+        Returns:
+        list: Immediate responses"""
+
+        if words[0] in ("reset", "factoryRESET"):
+            if words[0] == "factoryRESET":
+                self.nvm.clear()
+            self._reset_state()
+            sleep(self.reset_time)
+            return [FIRMWARE_BANNERS[self.region]]
+        elif words[0] == "sleep" and len(words) == 2 and words[1].isdigit():
+            self._later(int(words[1]) / 1000.0, lambda: "ok")
+            return []
+        elif words[0] == "get" and len(words) >= 2:
+            if words[1] == "ver":
+                return [FIRMWARE_BANNERS[self.region]]
+            elif words[1] == "vdd":
+                return ["3300"]
+            elif words[1] == "hweui":
+                return [self.hweui]
+            elif words[1] == "nvm" and len(words) == 3:
+                return [self.nvm.get(words[2].lower(), "FF")]
+        elif words[0] == "set" and len(words) >= 4:
+            if words[1] == "pindig":
+                self.pins[words[2]] = words[3]
+                return ["ok"]
+            elif words[1] == "pinmode":
+                return ["ok"]
+            elif words[1] == "nvm":
+                self.nvm[words[2].lower()] = words[3].upper()
+                return ["ok"]
+        return ["invalid_param"]
+
+    def _handle_mac(self, words):
+        """Processes a 'mac' command.
+
+        Parameters:
+        words (list): Command words after 'mac'
+
+        Returns:
+        list: Immediate responses"""
+
+        cmd = words[0]
+        if cmd == "pause":
+            if self.transmitting:
+                return ["0"]
+            self.mac_paused = True
+            return [MAC_PAUSE_TIME]
+        elif cmd == "resume":
+            self.mac_paused = False
+            return ["ok"]
+        elif cmd == "reset":
+            self.mac = dict(EMULATED_MAC_DEFAULTS)
+            self.mac["deveui"] = self.hweui
+            self.mac["status"] = "00000000"
+            self.joined = False
+            return ["ok"]
+        elif cmd == "save":
+            #Parameters loaded again after reset, including the session of the last join
+            self.eeprom = dict((key, value) for key, value in self.mac.items() if key != "status")
+            return ["ok"]
+        elif cmd == "forceENABLE":
+            return ["ok"]
+        elif cmd == "join" and len(words) == 2 and words[1] in ("otaa", "abp"):
+            if self.mac_paused:
+                return ["mac_paused"]
+            if words[1] == "abp":
+                self.joined = self.network
+                return ["ok", "accepted" if self.network else "denied"]
+            self._later(self.join_delay, self._join_done)
+            return ["ok"]
+        elif cmd == "tx" and len(words) == 4 and words[1] in ("cnf", "uncnf"):
+            return self._mac_tx(words[2], words[3])
+        elif cmd == "get" and len(words) >= 2:
+            key = " ".join(words[1:])
+            if key in self.mac:
+                return [self.mac[key]]
+            if words[1] == "ch":
+                return ["0"]
+        elif cmd == "set" and len(words) >= 3:
+            if words[1] == "ch":
+                self.mac[" ".join(words[1:4])] = " ".join(words[4:])
+                return ["ok"]
+            self.mac[words[1]] = " ".join(words[2:])
+            return ["ok"]
+        return ["invalid_param"]
+
+    def _join_done(self):
+        """Completes an OTAA join.
+
+        Returns:
+        str: 'accepted' or 'denied'"""
+
+        self.joined = self.network
+        if self.joined:
+            self.mac["status"] = "00000001"
+            self.mac["devaddr"] = "%08X" % random.getrandbits(32)
+            self.mac["upctr"] = "0"
+            self.mac["dnctr"] = "0"
+            return "accepted"
+        return "denied"
+
+    def _mac_tx(self, port, data):
+        """Processes 'mac tx'.
+
+        Parameters:
+        port (str): Application port
+        data (str): Hexadecimal payload
+
+        Returns:
+        list: Immediate responses"""
+
+        if not port.isdigit() or not 1 <= int(port) <= 223 or len(data) % 2 != 0:
+            return ["invalid_param"]
+        if self.mac_paused:
+            return ["mac_paused"]
+        if not self.joined:
+            return ["not_joined"]
+        if self.transmitting:
+            return ["busy"]
+
+        self.transmitting = True
+        self.mac["upctr"] = str(int(self.mac["upctr"]) + 1)
+        airtime = self._time_on_air(len(data) // 2 + 13)
+        windows = int(self.mac["rxdelay2"]) / 1000.0 + 0.1
+
+        def done():
+            self.transmitting = False
+            if not self.network:
+                return "mac_err"
+            if self.downlinks:
+                down_port, down_data = self.downlinks.popleft()
+                self.mac["dnctr"] = str(int(self.mac["dnctr"]) + 1)
+                return "mac_rx " + str(down_port) + " " + down_data
+            return "mac_tx_ok"
+
+        self._later(airtime + windows, done)
+        return ["ok"]
+
+    def _handle_radio(self, words):
+        """Processes a 'radio' command.
+
+        Parameters:
+        words (list): Command words after 'radio'
+
+        Returns:
+        list: Immediate responses"""
+
+        cmd = words[0]
+        if cmd == "get" and len(words) == 2 and words[1] in self.radio:
+            return [self.radio[words[1]]]
+        elif cmd == "set" and len(words) == 3:
+            if words[1] not in self.radio or words[1] in ("snr", "rssi") or not self._valid_setting(words[1], words[2]):
+                return ["invalid_param"]
+            if self.transmitting or self.receiving:
+                return ["busy"]
+            self.radio[words[1]] = words[2]
+            return ["ok"]
+        elif cmd == "tx" and len(words) == 2:
+            return self._radio_tx(words[1])
+        elif cmd == "rx" and len(words) == 2 and words[1].isdigit():
+            return self._radio_rx(int(words[1]))
+        elif cmd == "rxstop":
+            self.receiving = False
+            self._rx_id += 1
+            return ["ok"]
+        elif cmd == "cw" and len(words) == 2 and words[1] in ("on", "off"):
+            return ["ok"]
+        return ["invalid_param"]
+
+    def _valid_setting(self, name, value):
+        """Checks a radio parameter value.
+
+        Parameters:
+        name (str): Parameter name
+        value (str): Parameter value
+
+        Returns:
+        bool: True if the value is accepted"""
+
+        if name == "mod":
+            return value in ("lora", "fsk")
+        elif name == "sf":
+            return value in [e.value for e in SPREADING_FACTORS]
+        elif name == "bw":
+            return value in [e.value for e in RADIO_BW]
+        elif name == "cr":
+            return value in [e.value for e in CODING_RATES]
+        elif name in ("crc", "iqi"):
+            return value in ("on", "off")
+        elif name in ("freq", "prlen", "pwr", "wdt", "bitrate", "fdev"):
+            return value.lstrip("-").isdigit()
+        return True
+
+    def _key(self):
+        """Returns the settings a receiver has to share with the transmitter.
+
+        Returns:
+        tuple: Modulation, frequency, spreading factor, bandwidth and sync word"""
+
+        if self.radio["mod"] == "fsk":
+            return ("fsk", self.radio["freq"], self.radio["bitrate"], self.radio["sync"].lower())
+        return ("lora", self.radio["freq"], self.radio["sf"], self.radio["bw"], self.radio["sync"].lower())
+
+    def _time_on_air(self, length):
+        """Returns the time on air of a payload with the current radio settings.
+
+        Parameters:
+        length (int): Payload length in bytes
+
+        Returns:
+        float: Time on air in seconds"""
+
+        r = self.radio
+        return time_on_air(length, SPREADING_FACTORS(r["sf"]), RADIO_BW(r["bw"]), CODING_RATES(r["cr"]), CRC_HEADER_STATES(r["crc"]), int(r["prlen"]), RADIO_MODES(r["mod"]), int(r["bitrate"]))
+
+    def _radio_tx(self, data):
+        """Processes 'radio tx'.
+
+        Parameters:
+        data (str): Hexadecimal payload
+
+        Returns:
+        list: Immediate responses"""
+
+        try:
+            payload = bytes.fromhex(data)
+        except ValueError:
+            return ["invalid_param"]
+        if len(payload) > RADIO_MAX_PAYLOAD[self.radio["mod"]]:
+            return ["invalid_param"]
+        if not self.mac_paused or self.transmitting or self.receiving:
+            return ["busy"]
+
+        self.transmitting = True
+        airtime = self._time_on_air(len(payload))
+        self.channel.transmit(self, self._key(), payload, airtime)
+
+        def done():
+            self.transmitting = False
+            return "radio_tx_ok"
+
+        self._later(airtime, done)
+        return ["ok"]
+
+    def _radio_rx(self, window):
+        """Processes 'radio rx'.
+
+        Parameters:
+        window (int): Receive window in symbols, 0 for continuous reception
+
+        Returns:
+        list: Immediate responses"""
+
+        if not self.mac_paused or self.transmitting or self.receiving:
+            return ["busy"]
+
+        self.receiving = True
+        self.rx_started = monotonic()
+        self._rx_id += 1
+        rx_id = self._rx_id
+
+        if window > 0:
+            if self.radio["mod"] == "fsk":
+                timeout = window * 8.0 / int(self.radio["bitrate"])
+            else:
+                timeout = window * (2 ** int(self.radio["sf"][2:])) / (float(self.radio["bw"]) * 1000)
+        else:
+            timeout = int(self.radio["wdt"]) / 1000.0
+        if timeout > 0:
+            self._later(timeout, lambda: self._rx_timeout(rx_id))
+        return ["ok"]
+
+    def _rx_timeout(self, rx_id):
+        """Ends a receive window without a frame.
+
+        Parameters:
+        rx_id (int): Receive window to end; ignored if a frame or rxstop ended it already
+
+        Returns:
+        str: 'radio_err', None if the window has ended already"""
+
+        if rx_id != self._rx_id or not self.receiving:
+            return None
+        self.receiving = False
+        return "radio_err"
+
+    def _on_air(self, frame):
+        """Receives a frame from the channel.
+
+        Parameters:
+        frame (_Frame): Finished frame"""
+
+        with self._state_lock:
+            if not self.receiving or self.rx_started is None or self.rx_started > frame.start or frame.key != self._key():
+                return
+            self.receiving = False
+            self._rx_id += 1
+            if frame.collided:
+                res = "radio_err"
+            else:
+                self.radio["snr"] = str(self.channel.snr)
+                self.radio["rssi"] = str(self.channel.rssi)
+                res = "radio_rx  " + frame.payload.hex().upper()
+        self._emit(res)
+
+    #Network
+
+    def queue_downlink(self, port, data):
+        """Queues a LoRaWAN downlink, delivered after the next uplink as 'mac_rx'.
+
+        Parameters:
+        port (int): Application port
+        data (bytes): Downlink payload"""
+
+        self.downlinks.append((port, bytes(data).hex().upper()))
+
+    #Disposal
+
+    def close(self):
+        """Stops the emulated module and releases the pseudo-terminal."""
+
+        if not self._running:
+            return
+        self.channel.detach(self)
+        with self._outbox_cond:
+            self._running = False
+            self._outbox_cond.notify()
+        for timer in self._timers:
+            timer.cancel()
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except:
+            pass
@@ -0,0 +1,1296 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Transmit Queues for Microchip RN2903A/RN2483A LoRa Module.
+# Version 1.0.0
+# Released: November 5th, 2019
+
+# Visit https://docs.turta.io for documentation.
+
+from time import sleep, monotonic
+from collections import deque
+import threading
+import heapq
+import struct
+import zlib
+import os
+
+try:
+    from .Turta_LoRa import *
+except ImportError:
+    from Turta_LoRa import *
+
+#EU868 sub-bands: (lowest frequency, highest frequency, duty cycle limit), ETSI EN 300 220
+EU868_SUB_BANDS = [
+    (863000000, 864999999, 0.001),
+    (865000000, 867999999, 0.01),
+    (868000000, 868600000, 0.01),
+    (868700000, 869200000, 0.001),
+    (869400000, 869650000, 0.1),
+    (869700000, 870000000, 0.01),
+    (433050000, 434790000, 0.1)
+]
+
+#Time to wait before retrying a frame the module answered with 'busy'
+BUSY_RETRY_DELAY = 1.0
+
+#Number of times a frame is sent before a 'busy' module makes it fail
+BUSY_RETRY_LIMIT = 10
+
+#LoRaWAN data rates: (spreading factor, bandwidth, maximum application payload); no spreading factor is FSK at 50 kbps
+LORAWAN_DATA_RATES = {
+    REGIONS.EU_RN2483: [
+        (SPREADING_FACTORS.SF12, RADIO_BW.BW_125, 51), (SPREADING_FACTORS.SF11, RADIO_BW.BW_125, 51),
+        (SPREADING_FACTORS.SF10, RADIO_BW.BW_125, 51), (SPREADING_FACTORS.SF9, RADIO_BW.BW_125, 115),
+        (SPREADING_FACTORS.SF8, RADIO_BW.BW_125, 222), (SPREADING_FACTORS.SF7, RADIO_BW.BW_125, 222),
+        (SPREADING_FACTORS.SF7, RADIO_BW.BW_250, 222), (None, None, 222)],
+    REGIONS.US_RN2903: [
+        (SPREADING_FACTORS.SF10, RADIO_BW.BW_125, 11), (SPREADING_FACTORS.SF9, RADIO_BW.BW_125, 53),
+        (SPREADING_FACTORS.SF8, RADIO_BW.BW_125, 125), (SPREADING_FACTORS.SF7, RADIO_BW.BW_125, 242),
+        (SPREADING_FACTORS.SF8, RADIO_BW.BW_500, 242)]
+}
+
+#LoRaWAN frame bytes around the application payload: MHDR, FHDR without options, FPort, MIC
+LORAWAN_OVERHEAD = 13
+
+#Responses after which a queued message is kept and retried
+RETRY_RESPONSES = ("busy", "no_free_ch")
+
+#Uplink outcomes of a transmission the module started
+UPLINK_SENT = ("mac_tx_ok", "mac_rx", "mac_err")
+
+#Responses after which a journal frame is dropped; after any other failure it is sent again
+JOURNAL_REJECTED = ("invalid_param", "invalid_data_len")
+
+#Journal record: CRC-32 of the rest, kind, sequence number, body length; followed by the body
+JOURNAL_RECORD = struct.Struct(">IBQH")
+JOURNAL_FRAME = 0x01
+JOURNAL_DONE = 0x02
+
+#Journal frame body: LoRaWAN port, confirmed flag; followed by the payload
+JOURNAL_FRAME_BODY = struct.Struct(">BB")
+
+class QueuedFrame(object):
+    """A frame waiting in a transmit queue."""
+
+    __slots__ = ("data", "frequency", "length", "airtime", "queued_at", "sent_at", "result", "attempts")
+
+    def __init__(self, data, frequency, length, airtime):
+        self.data = data
+        self.frequency = frequency
+        self.length = length
+        self.airtime = airtime
+        self.queued_at = monotonic()
+        self.sent_at = None
+        self.result = None
+        self.attempts = 0
+
+def payload_length(data):
+    """Returns the number of bytes a payload occupies on air.
+
+    Parameters:
+    data (str or bytes): Payload
+
+    Returns:
+    int: Payload length in bytes"""
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    return len(str(data).encode("utf-8"))
+
+class DutyCycleScheduler(object):
+    """Transmit queue which releases frames as soon as the sub-band duty-cycle budget allows.
+
+    After a transmission of T seconds in a sub-band with duty cycle d, the sub-band is unavailable until T / d seconds after the transmission started."""
+
+    def __init__(self, lora, sub_bands = EU868_SUB_BANDS):
+        """Initiates the scheduler.
+
+        Parameters:
+        lora (RN2XX3): LoRa module, configured for radio transmission
+        sub_bands (list): (lowest frequency, highest frequency, duty cycle) tuples (EU868_SUB_BANDS is default)"""
+
+        self.lora = lora
+        self.sub_bands = sub_bands
+        self.frames = deque()
+        self.band_ready_at = {}
+        self.radio_free_at = 0.0
+        self.sent = 0
+        self.dropped = 0
+        self._lock = threading.RLock()
+
+    def _sub_band(self, frequency):
+        """Returns the index of the sub-band containing the frequency.
+
+        Parameters:
+        frequency (int): Frequency in Hz
+
+        Returns:
+        int: Sub-band index"""
+
+        for i, band in enumerate(self.sub_bands):
+            if band[0] <= frequency <= band[1]:
+                return i
+        raise ValueError('frequency is outside of the configured sub-bands.')
+
+    def submit(self, data, frequency = None):
+        """Queues a frame for transmission.
+
+        Parameters:
+        data (str or bytes): Payload to send
+        frequency (int): Frequency in Hz; None sends on the radio's current frequency (Default is None)
+
+        Returns:
+        QueuedFrame: The queued frame"""
+
+        if frequency is None:
+            frequency = self.lora._radio_setting("freq")
+        self._sub_band(frequency)
+        length = payload_length(data)
+        frame = QueuedFrame(data, frequency, length, self.lora.radio_time_on_air(length))
+        with self._lock:
+            self.frames.append(frame)
+        return frame
+
+    def pending(self):
+        """Returns the number of queued frames.
+
+        Returns:
+        int: Number of queued frames"""
+
+        return len(self.frames)
+
+    def _schedule(self, now):
+        """Simulates the queue against the current budget.
+
+        Parameters:
+        now (float): Current monotonic time
+
+        Returns:
+        list: (frame, release time) pairs in release order"""
+
+        ready_at = dict(self.band_ready_at)
+        waiting = list(self.frames)
+        plan = []
+        t = max(now, self.radio_free_at)
+        while waiting:
+            #Earliest releasable frame; queue order breaks ties
+            best = None
+            for frame in waiting:
+                band = self._sub_band(frame.frequency)
+                start = max(t, ready_at.get(band, t))
+                if best is None or start < best[1]:
+                    best = (frame, start, band)
+            frame, start, band = best
+            waiting.remove(frame)
+            plan.append((frame, start))
+            ready_at[band] = start + frame.airtime / self.sub_bands[band][2]
+            t = start + frame.airtime
+        return plan
+
+    def wait_times(self):
+        """Returns the expected wait time for every queued frame.
+
+        Returns:
+        list: (frame, seconds until release) pairs in release order"""
+
+        now = monotonic()
+        with self._lock:
+            return [(frame, start - now) for frame, start in self._schedule(now)]
+
+    def next_release(self):
+        """Returns the time until the next frame can be released.
+
+        Returns:
+        float: Seconds until the next release, None if the queue is empty"""
+
+        now = monotonic()
+        with self._lock:
+            plan = self._schedule(now)
+        return plan[0][1] - now if plan else None
+
+    def _transmit(self, frame):
+        """Tunes the radio to the frame's frequency and starts the transmission, closing an open receiver if the module is busy.
+
+        Parameters:
+        frame (QueuedFrame): Frame to transmit
+
+        Returns:
+        str: Response from the module"""
+
+        for attempt in range(2):
+            if attempt:
+                self.lora.radio_rxstop()
+            res = "ok"
+            if self.lora._radio_setting("freq") != frame.frequency:
+                res = self.lora.radio_set_freq(frame.frequency)
+            if res == "ok":
+                if isinstance(frame.data, (bytes, bytearray, memoryview)):
+                    res = self.lora.send_bytes(frame.data)
+                else:
+                    res = self.lora.send(frame.data)
+            if res != "busy":
+                break
+        return res
+
+    def poll(self):
+        """Transmits the next frame if the budget allows it now, and waits until it is on air.
+
+        Returns:
+        QueuedFrame: The frame transmitted or dropped, None if nothing could be released"""
+
+        now = monotonic()
+        with self._lock:
+            plan = self._schedule(now)
+            if not plan or plan[0][1] > now:
+                return None
+            frame = plan[0][0]
+            band = self._sub_band(frame.frequency)
+
+            res = self._transmit(frame)
+            frame.attempts += 1
+            if res == "busy" and frame.attempts < BUSY_RETRY_LIMIT:
+                #Module is still occupied; try again later
+                self.band_ready_at[band] = now + BUSY_RETRY_DELAY
+                return None
+
+            self.frames.remove(frame)
+            if res == "ok":
+                #The budget is used once the transmission starts
+                frame.sent_at = now
+                self.band_ready_at[band] = now + frame.airtime / self.sub_bands[band][2]
+                self.radio_free_at = now + frame.airtime
+                res = self.lora.wait_tx_done(frame.airtime + 1)
+            frame.result = res
+            if res == "radio_tx_ok":
+                self.sent += 1
+            else:
+                self.dropped += 1
+            return frame
+
+    def run_pending(self):
+        """Transmits every queued frame, sleeping until the budget allows each one.
+
+        Returns:
+        list: Frames transmitted or dropped"""
+
+        done = []
+        while self.frames:
+            wait = self.next_release()
+            if wait is not None and wait > 0:
+                sleep(wait)
+            frame = self.poll()
+            if frame is not None:
+                done.append(frame)
+        return done
+
+def pack_records(records, record_size = None):
+    """Packs records into one payload.
+
+    Parameters:
+    records (list): Records (bytes)
+    record_size (int): Size of every record; None prefixes each record with its length (Default is None)
+
+    Returns:
+    bytes: Payload"""
+
+    if record_size is not None:
+        return b"".join(records)
+    return b"".join(bytes([len(record)]) + record for record in records)
+
+def unpack_records(payload, record_size = None):
+    """Splits a payload made by pack_records() into its records.
+
+    Parameters:
+    payload (bytes): Received payload
+    record_size (int): Size of every record; None if records are prefixed with their length (Default is None)
+
+    Returns:
+    list: Records (bytes)"""
+
+    records = []
+    pos = 0
+    while pos < len(payload):
+        if record_size is not None:
+            length = record_size
+        else:
+            length = payload[pos]
+            pos += 1
+        if pos + length > len(payload):
+            raise ValueError('payload is truncated.')
+        records.append(bytes(payload[pos:pos + length]))
+        pos += length
+    return records
+
+def lorawan_rate(lora, refresh = False):
+    """Returns the LoRaWAN data rate entry of the module's current data rate; the slowest one if unknown.
+
+    Parameters:
+    lora (RN2XX3): LoRa module
+    refresh (bool): Reads the data rate from the module instead of the shadow cache (Default is False)
+
+    Returns:
+    tuple: (spreading factor, bandwidth, maximum application payload)"""
+
+    rates = LORAWAN_DATA_RATES[lora.region]
+    dr = lora.mac_get_value("dr", refresh)
+    return rates[dr] if dr is not None and 0 <= dr < len(rates) else rates[0]
+
+class UplinkAggregator(object):
+    """Collects small records and sends them packed into as few frames as possible.
+
+    A frame is sent when the next record would not fit in the maximum payload of the current settings, or when the oldest buffered record has waited for the latency budget. Every frame pays the preamble, header and, for LoRaWAN, 13 bytes of MAC overhead once instead of once per record; statistics() reports how much of the airtime carries records."""
+
+    def __init__(self, lora, max_latency = 30.0, lorawan = True, portno = 1, uplink_payload_type = UPLINK_PAYLOAD_TYPES.UNCONFIRMED, record_size = None, max_payload = None):
+        """Initiates the aggregator.
+
+        Parameters:
+        lora (RN2XX3): LoRa module; joined for LoRaWAN, or configured for radio transmission with the MAC paused
+        max_latency (float): Longest time a record waits before its frame is sent, in seconds (Default is 30)
+        lorawan (bool): Sends LoRaWAN uplinks with send_uplink(), otherwise radio frames (Default is True)
+        portno (int): LoRaWAN port number (1 to 223) (Default is 1)
+        uplink_payload_type (UPLINK_PAYLOAD_TYPES): LoRaWAN uplink payload type (UPLINK_PAYLOAD_TYPES.UNCONFIRMED is default)
+        record_size (int): Size of every record; None prefixes each record with its length byte (Default is None)
+        max_payload (int): Upper limit of the frame payload; None uses the limit of the current data rate or radio settings (Default is None)"""
+
+        if max_latency < 0:
+            raise ValueError('max_latency should be at least 0.')
+        if portno < 1 or portno > 223:
+            raise ValueError('portno is outside of 1 and 223.')
+        if uplink_payload_type not in UPLINK_PAYLOAD_TYPES:
+            raise ValueError('uplink_payload_type is not a member of UPLINK_PAYLOAD_TYPES.')
+        if record_size is not None and record_size < 1:
+            raise ValueError('record_size should be at least 1.')
+
+        self.lora = lora
+        self.max_latency = max_latency
+        self.lorawan = lorawan
+        self.portno = portno
+        self.uplink_payload_type = uplink_payload_type
+        self.record_size = record_size
+        self.max_payload = max_payload
+        self.records = deque()
+        self.results = deque(maxlen = 64)
+        self._lock = threading.RLock()
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Clears the packing statistics."""
+
+        self.frames = 0
+        self.records_sent = 0
+        self.record_bytes = 0
+        self.payload_bytes = 0
+        self.capacity_bytes = 0
+        self.airtime = 0.0
+        self.airtime_unpacked = 0.0
+
+    def _rate(self, refresh = False):
+        """Returns the LoRaWAN data rate entry of the current data rate; the slowest one if unknown.
+
+        Parameters:
+        refresh (bool): Reads the data rate from the module instead of the shadow cache (Default is False)
+
+        Returns:
+        tuple: (spreading factor, bandwidth, maximum application payload)"""
+
+        return lorawan_rate(self.lora, refresh)
+
+    def payload_limit(self, refresh = False):
+        """Returns the largest frame payload for the current settings.
+
+        Parameters:
+        refresh (bool): Reads the LoRaWAN data rate from the module, as ADR may have changed it (Default is False)
+
+        Returns:
+        int: Maximum payload in bytes"""
+
+        limit = self._rate(refresh)[2] if self.lorawan else self.lora.radio_max_payload()
+        return limit if self.max_payload is None else min(limit, self.max_payload)
+
+    def _time_on_air(self, payload_length):
+        """Returns the time on air of a frame.
+
+        Parameters:
+        payload_length (int): Payload length in bytes
+
+        Returns:
+        float: Time on air in seconds"""
+
+        if not self.lorawan:
+            return self.lora.radio_time_on_air(payload_length)
+        sf, bw, limit = self._rate()
+        if sf is None:
+            return time_on_air(payload_length + LORAWAN_OVERHEAD, mode = RADIO_MODES.FSK, preamble = 5)
+        return time_on_air(payload_length + LORAWAN_OVERHEAD, sf, bw)
+
+    def _packed_length(self, record):
+        """Returns the bytes a record occupies in a frame.
+
+        Parameters:
+        record (bytes): Record
+
+        Returns:
+        int: Length in bytes"""
+
+        return len(record) if self.record_size is not None else len(record) + 1
+
+    def add(self, record):
+        """Buffers a record; sends the buffered frame first if the record does not fit in it.
+
+        Parameters:
+        record (bytes): Record (bytes, bytearray or memoryview)
+
+        Returns:
+        list: Results of the frames sent, see poll()"""
+
+        if not isinstance(record, (bytes, bytearray, memoryview)):
+            raise TypeError('record should be bytes, bytearray or memoryview.')
+        record = bytes(record)
+        if self.record_size is not None and len(record) != self.record_size:
+            raise ValueError('record length should be ' + str(self.record_size) + '.')
+        if self.record_size is None and len(record) > 255:
+            raise ValueError('record length is outside of 0 and 255.')
+
+        with self._lock:
+            limit = self.payload_limit()
+            if self._packed_length(record) > limit:
+                raise ValueError('record length is outside of 0 and ' + str(limit - (0 if self.record_size is not None else 1)) + '.')
+            sent = []
+            if sum(self._packed_length(r) for r, t in self.records) + self._packed_length(record) > limit:
+                sent = self.flush()
+            self.records.append((record, monotonic()))
+            return sent
+
+    def pending(self):
+        """Returns the number of buffered records.
+
+        Returns:
+        int: Number of buffered records"""
+
+        return len(self.records)
+
+    def next_deadline(self):
+        """Returns the time until the buffered frame is due.
+
+        Returns:
+        float: Seconds until the oldest record reaches the latency budget, None if nothing is buffered"""
+
+        with self._lock:
+            if not self.records:
+                return None
+            return self.records[0][1] + self.max_latency - monotonic()
+
+    def poll(self):
+        """Sends the buffered records if the oldest one has waited for the latency budget. Does not block for LoRaWAN.
+
+        Returns:
+        list: Results of the frames sent; futures from send_uplink() for LoRaWAN, 'radio_tx_ok' or the module's response for radio frames"""
+
+        with self._lock:
+            if not self.records or self.records[0][1] + self.max_latency > monotonic():
+                return []
+            return self.flush()
+
+    def flush(self):
+        """Sends every buffered record now, packed into as few frames as the current payload limit allows.
+
+        Returns:
+        list: Results of the frames sent, see poll()"""
+
+        sent = []
+        with self._lock:
+            limit = self.payload_limit(self.lorawan and bool(self.records))
+            while self.records:
+                #Greedy fill in arrival order; the limit may have dropped since the records were added
+                frame = []
+                length = 0
+                while self.records and length + self._packed_length(self.records[0][0]) <= limit:
+                    record = self.records.popleft()[0]
+                    frame.append(record)
+                    length += self._packed_length(record)
+                if not frame:
+                    #A record larger than the current limit: send it alone and let the module refuse it
+                    frame.append(self.records.popleft()[0])
+                sent.append(self._send(frame, limit))
+        return sent
+
+    def _send(self, frame, limit):
+        """Sends one packed frame and updates the statistics.
+
+        Parameters:
+        frame (list): Records
+        limit (int): Payload limit the frame was packed for
+
+        Returns:
+        object: Future for LoRaWAN, the transmission result for radio frames"""
+
+        payload = pack_records(frame, self.record_size)
+        airtime = self._time_on_air(len(payload))
+        unpacked = sum(self._time_on_air(len(record)) for record in frame)
+
+        if self.lorawan:
+            res = self.lora.send_uplink(payload, self.portno, self.uplink_payload_type)
+        else:
+            res = self.lora.send_bytes(payload)
+            if res == "ok":
+                res = self.lora.wait_tx_done(airtime + 1)
+
+        self.frames += 1
+        self.records_sent += len(frame)
+        self.record_bytes += sum(len(record) for record in frame)
+        self.payload_bytes += len(payload)
+        self.capacity_bytes += limit
+        self.airtime += airtime
+        self.airtime_unpacked += unpacked
+        self.results.append(res)
+        return res
+
+    def statistics(self):
+        """Returns the packing statistics.
+
+        Returns:
+        dict: frames, records, record_bytes, payload_bytes, overhead_bytes (MAC overhead and length prefixes), fill (payload over payload limit), packing_efficiency (record bytes over frame bytes), airtime and airtime_unpacked (seconds the records would take as separate frames), airtime_saved (ratio)"""
+
+        overhead = self.payload_bytes - self.record_bytes + (self.frames * LORAWAN_OVERHEAD if self.lorawan else 0)
+        return {
+            "frames": self.frames,
+            "records": self.records_sent,
+            "record_bytes": self.record_bytes,
+            "payload_bytes": self.payload_bytes,
+            "overhead_bytes": overhead,
+            "fill": float(self.payload_bytes) / self.capacity_bytes if self.capacity_bytes else 0.0,
+            "packing_efficiency": float(self.record_bytes) / (self.record_bytes + overhead) if self.record_bytes + overhead else 0.0,
+            "airtime": self.airtime,
+            "airtime_unpacked": self.airtime_unpacked,
+            "airtime_saved": 1.0 - self.airtime / self.airtime_unpacked if self.airtime_unpacked else 0.0
+        }
+
+class QueuedMessage(object):
+    """A message waiting in a priority transmit queue. The result is 'expired', 'superseded' or 'overflow' if it was dropped, the module's response for radio frames, or a MacOutcome for LoRaWAN uplinks."""
+
+    __slots__ = ("data", "priority", "deadline", "key", "portno", "uplink_payload_type", "queued_at", "sent_at", "result", "seq", "attempts")
+
+    def __init__(self, data, priority, deadline, key, portno, uplink_payload_type, seq):
+        self.data = data
+        self.priority = priority
+        self.deadline = deadline
+        self.key = key
+        self.portno = portno
+        self.uplink_payload_type = uplink_payload_type
+        self.queued_at = monotonic()
+        self.sent_at = None
+        self.result = None
+        self.seq = seq
+        self.attempts = 0
+
+    def _order(self):
+        """Returns the heap key: higher priority first, then the earlier deadline, then the older message."""
+
+        return (-self.priority, self.deadline if self.deadline is not None else float("inf"), self.seq)
+
+class PriorityTransmitQueue(object):
+    """Bounded transmit queue which sends the most urgent message first.
+
+    Messages carry a priority (higher is more urgent), an optional deadline and an optional coalescing key. A message with the key of a queued one replaces it. Messages are dropped without using the air when their deadline passes, and the least urgent message is dropped when the queue is full. Messages the module refuses with 'busy' or 'no_free_ch' (duty cycle) stay queued and are retried until their deadline, or max_attempts times if they have none; messages refused otherwise are counted as rejected."""
+
+    def __init__(self, lora, capacity = 32, lorawan = False, wait_history = 256, max_attempts = BUSY_RETRY_LIMIT):
+        """Initiates the queue.
+
+        Parameters:
+        lora (RN2XX3): LoRa module; joined for LoRaWAN, or configured for radio transmission with the MAC paused
+        capacity (int): Maximum number of queued messages (Default is 32)
+        lorawan (bool): Sends LoRaWAN uplinks with send_uplink(), otherwise radio frames (Default is False)
+        wait_history (int): Number of recent wait times kept for the statistics (Default is 256)
+        max_attempts (int): Number of times a message without a deadline is sent before 'busy' or 'no_free_ch' makes it rejected (Default is BUSY_RETRY_LIMIT)"""
+
+        if capacity < 1:
+            raise ValueError('capacity should be at least 1.')
+        if max_attempts < 1:
+            raise ValueError('max_attempts should be at least 1.')
+
+        self.lora = lora
+        self.capacity = capacity
+        self.lorawan = lorawan
+        self.max_attempts = max_attempts
+        self.sent = 0
+        self.rejected = 0
+        self.expired = 0
+        self.superseded = 0
+        self.overflow = 0
+        self.max_depth = 0
+        self.waits = deque(maxlen = wait_history)
+        self._heap = []
+        self._keys = {}
+        self._depth = 0
+        self._seq = 0
+        self._ready_at = 0.0
+        self._in_flight = None
+        self._lock = threading.RLock()
+
+    def submit(self, data, priority = 0, deadline = None, key = None, portno = 1, uplink_payload_type = UPLINK_PAYLOAD_TYPES.UNCONFIRMED):
+        """Queues a message.
+
+        Parameters:
+        data (str or bytes): Payload to send
+        priority (int): Urgency, higher is sent first (Default is 0)
+        deadline (float): Seconds from now after which the message is dropped; None keeps it until sent (Default is None)
+        key (object): Coalescing key; a queued message with the same key is dropped (Default is None)
+        portno (int): LoRaWAN port number (1 to 223) (Default is 1)
+        uplink_payload_type (UPLINK_PAYLOAD_TYPES): LoRaWAN uplink payload type (UPLINK_PAYLOAD_TYPES.UNCONFIRMED is default)
+
+        Returns:
+        QueuedMessage: The queued message; its result is 'overflow' if the queue was full of more urgent messages"""
+
+        if portno < 1 or portno > 223:
+            raise ValueError('portno is outside of 1 and 223.')
+        if uplink_payload_type not in UPLINK_PAYLOAD_TYPES:
+            raise ValueError('uplink_payload_type is not a member of UPLINK_PAYLOAD_TYPES.')
+
+        with self._lock:
+            self._seq += 1
+            message = QueuedMessage(data, priority, None if deadline is None else monotonic() + deadline, key, portno, uplink_payload_type, self._seq)
+
+            if key is not None and key in self._keys:
+                self._drop(self._keys[key], "superseded")
+                self.superseded += 1
+
+            self._admit(message)
+            return message
+
+    def _admit(self, message):
+        """Adds a message, dropping the least urgent one if the queue is full.
+
+        Parameters:
+        message (QueuedMessage): Message
+
+        Returns:
+        bool: True if the message is queued, False if every queued message is more urgent"""
+
+        if self._depth >= self.capacity:
+            victim = self._least_urgent()
+            if victim._order() < message._order():
+                message.result = "overflow"
+                self.overflow += 1
+                return False
+            self._drop(victim, "overflow")
+            self.overflow += 1
+
+        self._push(message)
+        return True
+
+    def _push(self, message):
+        """Adds a message to the heap.
+
+        Parameters:
+        message (QueuedMessage): Message"""
+
+        heapq.heappush(self._heap, (message._order(), message))
+        if message.key is not None:
+            self._keys[message.key] = message
+        self._depth += 1
+        self.max_depth = max(self.max_depth, self._depth)
+
+    def _drop(self, message, reason):
+        """Removes a queued message; the heap entry is skipped when it comes up.
+
+        Parameters:
+        message (QueuedMessage): Message
+        reason (str): Result of the dropped message"""
+
+        message.result = reason
+        if message.key is not None and self._keys.get(message.key) is message:
+            del self._keys[message.key]
+        self._depth -= 1
+
+    def _least_urgent(self):
+        """Returns the queued message which is sent last.
+
+        Returns:
+        QueuedMessage: Message"""
+
+        return max((entry[1] for entry in self._heap if entry[1].result is None), key = lambda m: m._order())
+
+    def _head(self, now):
+        """Drops expired messages and returns the most urgent one.
+
+        Parameters:
+        now (float): Current monotonic time
+
+        Returns:
+        QueuedMessage: Message, None if the queue is empty"""
+
+        for entry in self._heap:
+            message = entry[1]
+            if message.result is None and message.deadline is not None and message.deadline <= now:
+                self._drop(message, "expired")
+                self.expired += 1
+        while self._heap and self._heap[0][1].result is not None:
+            heapq.heappop(self._heap)
+        return self._heap[0][1] if self._heap else None
+
+    def depth(self):
+        """Returns the number of queued messages.
+
+        Returns:
+        int: Number of queued messages"""
+
+        with self._lock:
+            self._head(monotonic())
+            return self._depth
+
+    def _retry(self, message, now):
+        """Counts an attempt the module asked to retry, and returns whether the message may be sent again.
+
+        Parameters:
+        message (QueuedMessage): Message
+        now (float): Current monotonic time
+
+        Returns:
+        bool: True until the message's deadline, or until max_attempts attempts if it has none"""
+
+        message.attempts += 1
+        self._ready_at = now + BUSY_RETRY_DELAY
+        if message.deadline is not None:
+            return message.deadline > now
+        return message.attempts < self.max_attempts
+
+    def poll(self):
+        """Sends the most urgent message if the radio is free. Does not block for LoRaWAN uplinks; waits for radio_tx_ok for radio frames.
+
+        Returns:
+        QueuedMessage: The message sent or rejected, None if nothing was sent"""
+
+        now = monotonic()
+        with self._lock:
+            message = self._head(now)
+            if message is None or now < self._ready_at:
+                return None
+            if self._in_flight is not None and not self._in_flight.done():
+                return None
+
+            data = message.data
+            if self.lorawan:
+                if not isinstance(data, (bytes, bytearray, memoryview)):
+                    data = str(data).encode("utf-8")
+                res = self.lora.send_uplink(data, message.portno, message.uplink_payload_type)
+            elif isinstance(data, (bytes, bytearray, memoryview)):
+                res = self.lora.send_bytes(data)
+            else:
+                res = self.lora.send(data)
+
+            if res in RETRY_RESPONSES and self._retry(message, now):
+                return None
+
+            heapq.heappop(self._heap)
+            self._drop(message, res)
+            message.sent_at = now
+            if self.lorawan:
+                self._in_flight = res
+                res.add_done_callback(lambda future, message = message: self._uplink_done(message, future))
+            elif res == "ok":
+                #The transmission started when the module answered
+                self.sent += 1
+                self.waits.append(now - message.queued_at)
+                airtime = self.lora.radio_time_on_air(payload_length(data))
+                self._ready_at = monotonic() + airtime
+            else:
+                self.rejected += 1
+
+        if not self.lorawan and res == "ok":
+            #Read the second response, so it is not taken for the answer to the next command
+            message.result = self.lora.wait_tx_done(airtime + 1)
+        return message
+
+    def _uplink_done(self, message, future):
+        """Stores the outcome of an uplink and counts it; requeues the message if the module asked to retry.
+
+        Parameters:
+        message (QueuedMessage): Message sent
+        future (Future): Completed uplink"""
+
+        if future.cancelled() or future.exception() is not None:
+            return
+        outcome = future.result()
+        message.result = outcome
+        now = monotonic()
+        with self._lock:
+            if outcome.status in UPLINK_SENT:
+                self.sent += 1
+                self.waits.append(message.sent_at - message.queued_at)
+            elif outcome.status in RETRY_RESPONSES and self._retry(message, now):
+                if message.key is None or message.key not in self._keys:
+                    message.result = None
+                    message.sent_at = None
+                    self._admit(message)
+                else:
+                    self.superseded += 1
+            elif outcome.status in RETRY_RESPONSES and message.deadline is not None:
+                message.result = "expired"
+                self.expired += 1
+            else:
+                self.rejected += 1
+
+    def next_release(self):
+        """Returns the time until the next message may be sent.
+
+        Returns:
+        float: Seconds until the radio is free, None if the queue is empty"""
+
+        now = monotonic()
+        with self._lock:
+            if self._head(now) is None:
+                return None
+            return max(0.0, self._ready_at - now)
+
+    def run_pending(self):
+        """Sends every queued message, waiting for the radio in between.
+
+        Returns:
+        list: Messages sent"""
+
+        done = []
+        while True:
+            wait = self.next_release()
+            if wait is None:
+                return done
+            sleep(max(wait, 0.01))
+            message = self.poll()
+            if message is not None:
+                done.append(message)
+
+    def statistics(self):
+        """Returns the queue statistics.
+
+        Returns:
+        dict: depth, max_depth, depth of each priority, sent, rejected, expired, superseded and overflow counts, and the mean, 90th percentile and maximum wait of recently sent messages in seconds"""
+
+        with self._lock:
+            self._head(monotonic())
+            priorities = {}
+            for entry in self._heap:
+                if entry[1].result is None:
+                    priorities[entry[1].priority] = priorities.get(entry[1].priority, 0) + 1
+            waits = sorted(self.waits)
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "priorities": priorities,
+                "sent": self.sent,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "superseded": self.superseded,
+                "overflow": self.overflow,
+                "wait_mean": sum(waits) / len(waits) if waits else None,
+                "wait_p90": waits[min(len(waits) - 1, int(0.9 * len(waits)))] if waits else None,
+                "wait_max": waits[-1] if waits else None
+            }
+
+class JournalEntry(object):
+    """A frame in the uplink journal. The result is the module's response for radio frames, or a MacOutcome for LoRaWAN uplinks."""
+
+    __slots__ = ("seq", "data", "portno", "confirmed", "durable", "sent", "result")
+
+    def __init__(self, seq, data, portno, confirmed, durable):
+        self.seq = seq
+        self.data = data
+        self.portno = portno
+        self.confirmed = confirmed
+        self.durable = durable
+        self.sent = False
+        self.result = None
+
+class UplinkJournal(object):
+    """Store-and-forward transmit queue kept in append-only segment files, so frames waiting to be sent survive a restart.
+
+    Every frame is appended as a record, and a second record marks it done once the module reports radio_tx_ok, mac_tx_ok or mac_rx, or refuses it for good. Appends are collected and written with one fsync per group commit: when commit_size records are waiting, or commit_interval seconds after the first of them. At startup, frames without a done record are sent again, oldest first; a record cut short by a crash is discarded. A frame sent just before a crash may be sent twice. Segments whose frames are all done are deleted."""
+
+    def __init__(self, lora, directory, lorawan = True, commit_interval = 1.0, commit_size = 32, segment_size = 1048576):
+        """Opens the journal and loads the frames not sent yet.
+
+        Parameters:
+        lora (RN2XX3): LoRa module; joined for LoRaWAN, or configured for radio transmission with the MAC paused
+        directory (str): Directory of the segment files, created if missing
+        lorawan (bool): Sends LoRaWAN uplinks with send_uplink(), otherwise radio frames (Default is True)
+        commit_interval (float): Longest time an appended record waits for its fsync, in seconds (Default is 1)
+        commit_size (int): Number of waiting records which triggers a commit (Default is 32)
+        segment_size (int): Segment file size after which a new segment is started, in bytes (Default is 1048576)"""
+
+        if commit_interval <= 0:
+            raise ValueError('commit_interval should be greater than 0.')
+        if commit_size < 1:
+            raise ValueError('commit_size should be at least 1.')
+
+        self.lora = lora
+        self.directory = directory
+        self.lorawan = lorawan
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.segment_size = segment_size
+        self.appended = 0
+        self.sent = 0
+        self.failed = 0
+        self.commits = 0
+        self.committed_records = 0
+        self.recovered = 0
+        self.entries = deque()
+        self._segments = {}
+        self._buffer = []
+        self._buffer_since = None
+        self._ready_at = 0.0
+        self._in_flight = None
+        self._lock = threading.RLock()
+        self._commit_cond = threading.Condition(self._lock)
+        self._closed = False
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._recover()
+        self._committer = threading.Thread(target = self._committer_routine, name = "RN2XX3 journal", daemon = True)
+        self._committer.start()
+
+    #Segment Files
+
+    def _segment_path(self, number):
+        """Returns the path of a segment file.
+
+        Parameters:
+        number (int): Segment number
+
+        Returns:
+        str: File path"""
+
+        return os.path.join(self.directory, "journal-%08d.log" % number)
+
+    def _read_segment(self, path):
+        """Reads the intact records of a segment and cuts off a torn tail.
+
+        Parameters:
+        path (str): Segment file
+
+        Returns:
+        list: (kind, sequence number, body) tuples"""
+
+        with open(path, "rb") as f:
+            content = f.read()
+        records = []
+        pos = 0
+        while pos + JOURNAL_RECORD.size <= len(content):
+            crc, kind, seq, length = JOURNAL_RECORD.unpack_from(content, pos)
+            end = pos + JOURNAL_RECORD.size + length
+            if end > len(content) or zlib.crc32(content[pos + 4:end]) & 0xFFFFFFFF != crc:
+                break
+            records.append((kind, seq, content[pos + JOURNAL_RECORD.size:end]))
+            pos = end
+        if pos < len(content):
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+                os.fsync(f.fileno())
+        return records
+
+    def _recover(self):
+        """Loads the frames without a done record from the segment files."""
+
+        numbers = sorted(int(name[8:16]) for name in os.listdir(self.directory)
+            if name.startswith("journal-") and name.endswith(".log") and name[8:16].isdigit())
+        frames = {}
+        done = set()
+        self._seq = 0
+        for number in numbers:
+            seqs = set()
+            for kind, seq, body in self._read_segment(self._segment_path(number)):
+                self._seq = max(self._seq, seq)
+                if kind == JOURNAL_FRAME and len(body) >= JOURNAL_FRAME_BODY.size:
+                    portno, confirmed = JOURNAL_FRAME_BODY.unpack_from(body)
+                    frames[seq] = JournalEntry(seq, body[JOURNAL_FRAME_BODY.size:], portno, bool(confirmed), True)
+                    seqs.add(seq)
+                elif kind == JOURNAL_DONE:
+                    done.add(seq)
+            self._segments[number] = seqs
+
+        for seq in sorted(frames):
+            if seq not in done:
+                self.entries.append(frames[seq])
+        self.recovered = len(self.entries)
+
+        self._segment = numbers[-1] if numbers else 0
+        self._segments.setdefault(self._segment, set())
+        removed = self._compact()
+        self._file = open(self._segment_path(self._segment), "ab")
+        if removed or not numbers:
+            self._sync_directory()
+
+    def _sync_directory(self):
+        """Makes the creation and deletion of segment files durable; otherwise a power cut may lose a directory entry even though the file contents were synced."""
+
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _compact(self):
+        """Deletes the oldest segments as long as they hold no pending frames. Done records always follow their frame records, so a later segment is only deleted with every segment before it. Call _sync_directory() afterwards.
+
+        Returns:
+        bool: True if a segment was deleted"""
+
+        pending = set(entry.seq for entry in self.entries)
+        removed = False
+        for number in sorted(self._segments):
+            if number == self._segment or self._segments[number] & pending:
+                break
+            del self._segments[number]
+            try:
+                os.remove(self._segment_path(number))
+                removed = True
+            except OSError:
+                pass
+        return removed
+
+    def _append_record(self, kind, seq, body):
+        """Adds a record to the next group commit.
+
+        Parameters:
+        kind (int): JOURNAL_FRAME or JOURNAL_DONE
+        seq (int): Sequence number
+        body (bytes): Record body"""
+
+        record = JOURNAL_RECORD.pack(0, kind, seq, len(body))[4:] + body
+        self._buffer.append((kind, seq, struct.pack(">I", zlib.crc32(record) & 0xFFFFFFFF) + record))
+        if self._buffer_since is None:
+            self._buffer_since = monotonic()
+            self._commit_cond.notify()
+        if len(self._buffer) >= self.commit_size:
+            self.commit()
+
+    def commit(self):
+        """Writes the waiting records with one fsync, and starts a new segment when the current one is full."""
+
+        with self._lock:
+            if not self._buffer:
+                return
+            buffer = self._buffer
+            self._buffer = []
+            self._buffer_since = None
+
+            self._file.write(b"".join(record for kind, seq, record in buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.commits += 1
+            self.committed_records += len(buffer)
+            for kind, seq, record in buffer:
+                if kind == JOURNAL_FRAME:
+                    self._segments[self._segment].add(seq)
+
+            for entry in self.entries:
+                entry.durable = True
+
+            if self._file.tell() >= self.segment_size:
+                self._file.close()
+                self._segment += 1
+                self._segments[self._segment] = set()
+                self._file = open(self._segment_path(self._segment), "ab")
+                self._compact()
+                self._sync_directory()
+
+    def _committer_routine(self):
+        """Commits waiting records once the oldest has waited for the commit interval."""
+
+        with self._commit_cond:
+            while not self._closed:
+                if self._buffer_since is None:
+                    self._commit_cond.wait()
+                    continue
+                wait = self._buffer_since + self.commit_interval - monotonic()
+                if wait > 0:
+                    self._commit_cond.wait(wait)
+                    continue
+                self.commit()
+
+    #Queue
+
+    def append(self, data, portno = 1, uplink_payload_type = UPLINK_PAYLOAD_TYPES.UNCONFIRMED):
+        """Adds a frame to the journal. The frame is durable after the next group commit; call commit() to force it.
+
+        Parameters:
+        data (bytes): Payload (bytes, bytearray or memoryview); up to the LoRaWAN limit of the current data rate, or radio_max_payload() for radio frames
+        portno (int): LoRaWAN port number (1 to 223) (Default is 1)
+        uplink_payload_type (UPLINK_PAYLOAD_TYPES): LoRaWAN uplink payload type (UPLINK_PAYLOAD_TYPES.UNCONFIRMED is default)
+
+        Returns:
+        JournalEntry: The journal entry"""
+
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            raise TypeError('data should be bytes, bytearray or memoryview.')
+        if portno < 1 or portno > 223:
+            raise ValueError('portno is outside of 1 and 223.')
+        if uplink_payload_type not in UPLINK_PAYLOAD_TYPES:
+            raise ValueError('uplink_payload_type is not a member of UPLINK_PAYLOAD_TYPES.')
+
+        data = bytes(data)
+        limit = lorawan_rate(self.lora)[2] if self.lorawan else self.lora.radio_max_payload()
+        if len(data) > limit:
+            raise ValueError('data length is outside of 0 and ' + str(limit) + '.')
+        confirmed = uplink_payload_type == UPLINK_PAYLOAD_TYPES.CONFIRMED
+        with self._lock:
+            if self._closed:
+                raise ValueError('journal is closed.')
+            self._seq += 1
+            entry = JournalEntry(self._seq, data, portno, confirmed, False)
+            self.entries.append(entry)
+            self.appended += 1
+            self._append_record(JOURNAL_FRAME, entry.seq, JOURNAL_FRAME_BODY.pack(portno, 1 if confirmed else 0) + data)
+        return entry
+
+    def pending(self):
+        """Returns the number of frames not sent yet.
+
+        Returns:
+        int: Number of frames"""
+
+        return len(self.entries)
+
+    def _finish(self, entry, result, sent):
+        """Marks a frame done.
+
+        Parameters:
+        entry (JournalEntry): Frame
+        result (object): Response or MacOutcome
+        sent (bool): True if the frame was sent, False if the module refused it for good"""
+
+        with self._lock:
+            entry.result = result
+            entry.sent = sent
+            if self.entries and self.entries[0] is entry:
+                self.entries.popleft()
+            elif entry in self.entries:
+                self.entries.remove(entry)
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            if not self._closed:
+                self._append_record(JOURNAL_DONE, entry.seq, b"")
+
+    def poll(self):
+        """Sends the oldest frame not sent yet if the module is free. Does not block for LoRaWAN; waits for radio_tx_ok for radio frames.
+
+        Returns:
+        JournalEntry: The frame sent, None if nothing was sent"""
+
+        with self._lock:
+            if not self.entries or monotonic() < self._ready_at or self._closed:
+                return None
+            if self._in_flight is not None and not self._in_flight.done():
+                return None
+            entry = self.entries[0]
+
+        if self.lorawan:
+            uplink_payload_type = UPLINK_PAYLOAD_TYPES.CONFIRMED if entry.confirmed else UPLINK_PAYLOAD_TYPES.UNCONFIRMED
+            try:
+                future = self.lora.send_uplink(entry.data, entry.portno, uplink_payload_type)
+            except ValueError:
+                #Refused before reaching the module; retrying would never succeed
+                self._settle(entry, "invalid_data_len", False)
+                return entry
+            self._in_flight = future
+            future.add_done_callback(lambda future, entry = entry: self._uplink_done(entry, future))
+            return entry
+
+        try:
+            res = self.lora.send_bytes(entry.data)
+        except ValueError:
+            #The frame no longer fits the radio settings; retrying would never succeed
+            res = "invalid_data_len"
+        if res == "ok":
+            res = self.lora.wait_tx_done(self.lora.radio_time_on_air(len(entry.data)) + 1)
+        self._settle(entry, res, res == "radio_tx_ok")
+        return entry
+
+    def _uplink_done(self, entry, future):
+        """Settles a frame once its uplink completed.
+
+        Parameters:
+        entry (JournalEntry): Frame
+        future (Future): Completed uplink"""
+
+        if future.cancelled() or future.exception() is not None:
+            return
+        outcome = future.result()
+        self._settle(entry, outcome, outcome.ok)
+
+    def _settle(self, entry, result, sent):
+        """Marks a frame done if it was sent or rejected, otherwise keeps it for another attempt.
+
+        Parameters:
+        entry (JournalEntry): Frame
+        result (object): Response or MacOutcome
+        sent (bool): True if the module reported the frame sent"""
+
+        status = result.status if isinstance(result, MacOutcome) else result
+        if sent:
+            self._finish(entry, result, True)
+        elif status in JOURNAL_REJECTED:
+            self._finish(entry, result, False)
+        else:
+            #Kept for another attempt
+            entry.result = result
+            self._ready_at = monotonic() + BUSY_RETRY_DELAY
+
+    def run_pending(self, timeout = None):
+        """Sends the frames not sent yet, retrying refused ones.
+
+        Parameters:
+        timeout (float): Maximum time to keep trying, in seconds; None until the journal is empty (Default is None)
+
+        Returns:
+        int: Number of frames still pending"""
+
+        deadline = None if timeout is None else monotonic() + timeout
+        while self.entries and (deadline is None or monotonic() < deadline):
+            if self.poll() is None:
+                sleep(0.01)
+        return len(self.entries)
+
+    def statistics(self):
+        """Returns the journal statistics.
+
+        Returns:
+        dict: pending, appended, sent, failed, recovered (pending frames loaded at startup), commits, records_per_commit, segments"""
+
+        with self._lock:
+            return {
+                "pending": len(self.entries),
+                "appended": self.appended,
+                "sent": self.sent,
+                "failed": self.failed,
+                "recovered": self.recovered,
+                "commits": self.commits,
+                "records_per_commit": float(self.committed_records) / self.commits if self.commits else 0.0,
+                "segments": len(self._segments)
+            }
+
+    def close(self):
+        """Commits the waiting records and closes the journal. Frames not sent yet are sent after the next start."""
+
+        with self._lock:
+            if self._closed:
+                return
+            self.commit()
+            self._closed = True
+            self._commit_cond.notify()
+            self._file.close()
+        self._committer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
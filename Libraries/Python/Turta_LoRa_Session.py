@@ -0,0 +1,242 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# LoRaWAN Session Management for Microchip RN2903A/RN2483A LoRa Module.
+# Version 1.0.0
+# Released: November 5th, 2019
+
+# Visit https://docs.turta.io for documentation.
+
+from time import sleep, time
+import threading
+import random
+import json
+import os
+
+try:
+    from .Turta_LoRa import *
+except ImportError:
+    from Turta_LoRa import *
+
+#Uplink responses after which the session is no longer usable
+REJOIN_STATUSES = ("not_joined", "frame_counter_err_rejoin_needed")
+
+#Join retry delays in seconds: first retry, upper limit
+JOIN_BACKOFF_BASE = 15
+JOIN_BACKOFF_LIMIT = 3600
+
+def write_atomic(path, data):
+    """Replaces a file so that a crash leaves either the old or the new content.
+
+    Parameters:
+    path (str): File path
+    data (bytes): New content"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class SessionManager(object):
+    """Keeps a LoRaWAN session across restarts.
+
+    After an OTAA join the session is saved in the module with 'mac save', and the device address and frame counters are kept in a local file. At startup the saved session is resumed with an ABP join, which does not use the air, and the uplink counter is set past every value that may have been used before the restart. A new OTAA join is only made when no session can be resumed or the network asks for it; join attempts are spread with random jitter and exponential backoff, so a site power cut does not bring every node back on air at once."""
+
+    def __init__(self, lora, path, checkpoint_interval = 16, startup_jitter = 30, backoff_base = JOIN_BACKOFF_BASE, backoff_limit = JOIN_BACKOFF_LIMIT, join_timeout = MAC_JOIN_TIMEOUT):
+        """Initiates the session manager.
+
+        Parameters:
+        lora (RN2XX3): LoRa module with the OTAA keys saved, and the MAC not paused
+        path (str): Session file
+        checkpoint_interval (int): Uplinks between session file updates; also the uplink counter gap after a restart (Default is 16)
+        startup_jitter (float): Upper limit of the random delay before the first join, in seconds (Default is 30)
+        backoff_base (float): Upper limit of the random delay before the first join retry, doubled for every further retry, in seconds (Default is JOIN_BACKOFF_BASE)
+        backoff_limit (float): Highest upper limit of the retry delay, in seconds (Default is JOIN_BACKOFF_LIMIT)
+        join_timeout (float): Maximum time to wait for a join response in seconds (Default is MAC_JOIN_TIMEOUT)"""
+
+        if checkpoint_interval < 1:
+            raise ValueError('checkpoint_interval should be at least 1.')
+
+        self.lora = lora
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.startup_jitter = startup_jitter
+        self.backoff_base = backoff_base
+        self.backoff_limit = backoff_limit
+        self.join_timeout = join_timeout
+        self.session = None
+        self.rejoin_needed = False
+        self.joins = 0
+        self.join_attempts = 0
+        self.restores = 0
+        self._since_checkpoint = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Reads the session file.
+
+        Returns:
+        dict: Session with 'devaddr', 'upctr', 'dnctr' and 'saved_at' keys, None if there is no valid session file"""
+
+        try:
+            with open(self.path, "rb") as f:
+                session = json.loads(f.read().decode("utf-8"))
+            int(session["devaddr"], 16)
+            if int(session["upctr"]) < 0 or int(session["dnctr"]) < 0:
+                return None
+            return session
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def checkpoint(self):
+        """Reads the frame counters from the module and writes the session file.
+
+        Returns:
+        bool: True if the session file was written"""
+
+        with self._lock:
+            if self.session is None:
+                return False
+            upctr = self.lora.mac_get_value("upctr")
+            dnctr = self.lora.mac_get_value("dnctr")
+            if upctr is None or dnctr is None:
+                return False
+            self.session = {"devaddr": self.session["devaddr"], "upctr": upctr, "dnctr": dnctr, "saved_at": time()}
+            write_atomic(self.path, json.dumps(self.session).encode("utf-8"))
+            self._since_checkpoint = 0
+            return True
+
+    def discard(self):
+        """Forgets the session, so the next connect() makes an OTAA join."""
+
+        with self._lock:
+            self.session = None
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def restore(self):
+        """Resumes the saved session with an ABP join. The module should still hold the session saved after the OTAA join.
+
+        Returns:
+        bool: True if the session was resumed"""
+
+        session = self.load()
+        if session is None:
+            return False
+        devaddr = self.lora.mac_get_value("devaddr", True)
+        if devaddr is None or devaddr.upper() != session["devaddr"].upper():
+            #The module's saved session is not the one in the file
+            return False
+
+        #Uplinks after the last checkpoint may have used counter values up to the interval
+        upctr = min(4294967295, int(session["upctr"]) + self.checkpoint_interval)
+        if self.lora.mac_set_upctr(upctr) != "ok" or self.lora.mac_set_dnctr(int(session["dnctr"])) != "ok":
+            return False
+        outcome = self.lora.join_network(JOIN_PROCEDURE_TYPES.ABP, self.join_timeout).result()
+        if outcome.status != "accepted":
+            return False
+
+        with self._lock:
+            self.session = {"devaddr": session["devaddr"], "upctr": upctr, "dnctr": int(session["dnctr"]), "saved_at": time()}
+            write_atomic(self.path, json.dumps(self.session).encode("utf-8"))
+            self._since_checkpoint = 0
+        self.rejoin_needed = False
+        self.restores += 1
+        return True
+
+    def join(self, attempts = None):
+        """Makes an OTAA join, retrying after a random delay whose upper limit doubles with every attempt. Saves the new session in the module and in the session file.
+
+        Parameters:
+        attempts (int): Maximum number of attempts, None to retry until accepted (Default is None)
+
+        Returns:
+        bool: True if the join was accepted"""
+
+        attempt = 0
+        while attempts is None or attempt < attempts:
+            if attempt > 0:
+                sleep(random.uniform(0, min(self.backoff_limit, self.backoff_base * 2 ** (attempt - 1))))
+            attempt += 1
+            self.join_attempts += 1
+
+            outcome = self.lora.join_network(JOIN_PROCEDURE_TYPES.OTAA, self.join_timeout).result()
+            if outcome.status != "accepted":
+                continue
+
+            #Keep the session in the module's EEPROM for the next restart
+            self.lora.mac_save()
+            devaddr = self.lora.mac_get_value("devaddr", True)
+            if devaddr is None:
+                continue
+            with self._lock:
+                self.session = {"devaddr": devaddr}
+            self.checkpoint()
+            self.rejoin_needed = False
+            self.joins += 1
+            return True
+        return False
+
+    def connect(self, attempts = None):
+        """Resumes the saved session, or joins after a random startup delay if there is none.
+
+        Parameters:
+        attempts (int): Maximum number of join attempts, None to retry until accepted (Default is None)
+
+        Returns:
+        str: 'restored' or 'joined', None if the join did not succeed"""
+
+        if self.restore():
+            return "restored"
+        self.discard()
+        sleep(random.uniform(0, self.startup_jitter))
+        return "joined" if self.join(attempts) else None
+
+    def send_uplink(self, data, portno = 1, uplink_payload_type = UPLINK_PAYLOAD_TYPES.UNCONFIRMED, timeout = MAC_TX_TIMEOUT):
+        """Queues an uplink as RN2XX3.send_uplink() does, and keeps the session file up to date. Responses showing that the session is lost set rejoin_needed; call connect() then.
+
+        Parameters:
+        data (bytes): Application payload (bytes, bytearray or memoryview)
+        portno (int): Port number (1 to 223) (Default is 1)
+        uplink_payload_type (UPLINK_PAYLOAD_TYPES): Uplink payload type, either confirmed or unconfirmed (UPLINK_PAYLOAD_TYPES.UNCONFIRMED is default)
+        timeout (float): Maximum time to wait for the second response in seconds (Default is MAC_TX_TIMEOUT)
+
+        Returns:
+        Future: Resolves with a MacOutcome"""
+
+        future = self.lora.send_uplink(data, portno, uplink_payload_type, timeout)
+        future.add_done_callback(self._uplink_done)
+        return future
+
+    def _uplink_done(self, future):
+        """Counts a completed uplink and writes a checkpoint when the interval is reached.
+
+        Parameters:
+        future (Future): Completed uplink"""
+
+        if future.cancelled() or future.exception() is not None:
+            return
+        status = future.result().status
+        if status in REJOIN_STATUSES:
+            self.rejoin_needed = True
+            self.discard()
+            return
+        if status in MAC_TX_OUTCOMES:
+            self._since_checkpoint += 1
+            if self._since_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
@@ -0,0 +1,899 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Point-to-Point Transport for Microchip RN2903A/RN2483A LoRa Module.
+# Version 1.0.0
+# Released: November 5th, 2019
+
+# Visit https://docs.turta.io for documentation.
+
+from time import sleep, monotonic, time
+from collections import OrderedDict, deque
+from math import ceil, log10
+import struct
+
+try:
+    from .Turta_LoRa import *
+except ImportError:
+    from Turta_LoRa import *
+
+#Frame kinds: First byte of every transport frame
+FRAME_FRAGMENT = 0x01
+FRAME_DATA     = 0x02
+FRAME_ACK      = 0x03
+
+#Fragment header: Kind, message id, fragment index, fragment count
+FRAGMENT_HEADER = struct.Struct(">BBBB")
+
+#Data header: Kind, sequence number, flags
+DATA_HEADER = struct.Struct(">BBB")
+DATA_FLAG_POLL = 0x01
+
+#Ack: Kind, next expected sequence number, bitmap of buffered frames after it
+ACK_FRAME = struct.Struct(">BBI")
+ACK_BITMAP_BITS = 32
+
+#Control: Kind, sequence number, data rate index, output power, flags
+FRAME_CONTROL = 0x04
+CONTROL_FRAME = struct.Struct(">BBBbB")
+CONTROL_FLAG_ACK = 0x01
+
+#Data rates for adaptive control, from the most robust to the fastest: (spreading factor, bandwidth)
+DATA_RATES = [
+    (SPREADING_FACTORS.SF12, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF11, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF10, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF9, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF8, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF7, RADIO_BW.BW_125),
+    (SPREADING_FACTORS.SF7, RADIO_BW.BW_250),
+    (SPREADING_FACTORS.SF7, RADIO_BW.BW_500)
+]
+
+#Lowest SNR in dB each spreading factor demodulates at
+SNR_FLOOR = {
+    SPREADING_FACTORS.SF7: -7.5,
+    SPREADING_FACTORS.SF8: -10.0,
+    SPREADING_FACTORS.SF9: -12.5,
+    SPREADING_FACTORS.SF10: -15.0,
+    SPREADING_FACTORS.SF11: -17.5,
+    SPREADING_FACTORS.SF12: -20.0
+}
+
+#Output power limits in dBm
+POWER_RANGES = {REGIONS.US_RN2903: (2, 20), REGIONS.EU_RN2483: (-3, 14)}
+
+#Hopping channel plans in Hz: US902-928 125 kHz channels, EU868 channels in the 1% sub-bands
+HOP_CHANNELS = {
+    REGIONS.US_RN2903: [902300000 + 200000 * i for i in range(64)],
+    REGIONS.EU_RN2483: [867100000, 867300000, 867500000, 867700000, 867900000, 868100000, 868300000, 868500000]
+}
+
+#Transmission
+
+def transmit_frame(lora, frame):
+    """Transmits a frame and waits until it is on air. A receiver left open is stopped first.
+
+    Parameters:
+    lora (RN2XX3): LoRa module
+    frame (bytes): Frame to transmit
+
+    Returns:
+    bool: True if the frame is transmitted"""
+
+    res = lora.send_bytes(frame)
+    if res == "busy":
+        lora.radio_rxstop()
+        res = lora.send_bytes(frame)
+    if res != "ok":
+        return False
+    return lora.wait_tx_done(lora.radio_time_on_air(len(frame)) + 1) == "radio_tx_ok"
+
+#Fragmentation
+
+def fragment(message, msg_id, max_payload = 255):
+    """Splits a message into sequenced radio frames.
+
+    Parameters:
+    message (bytes): Message to split (bytes, bytearray or memoryview)
+    msg_id (int): Message id (0 to 255)
+    max_payload (int): Maximum frame length in bytes (Default is 255)
+
+    Returns:
+    list: Frames (bytes) in sending order"""
+
+    if msg_id < 0 or msg_id > 255:
+        raise ValueError('msg_id is outside of 0 and 255.')
+    size = max_payload - FRAGMENT_HEADER.size
+    if size < 1:
+        raise ValueError('max_payload is too small for the fragment header.')
+
+    view = memoryview(message).cast("B")
+    count = max(1, int(ceil(len(view) / float(size))))
+    if count > 255:
+        raise ValueError('message length is outside of 0 and ' + str(255 * size) + '.')
+    return [FRAGMENT_HEADER.pack(FRAME_FRAGMENT, msg_id, i, count) + view[i * size:(i + 1) * size] for i in range(count)]
+
+class _Partial(object):
+    """A message being reassembled."""
+
+    __slots__ = ("count", "parts", "size", "started")
+
+    def __init__(self, count):
+        self.count = count
+        self.parts = {}
+        self.size = 0
+        self.started = monotonic()
+
+class Reassembler(object):
+    """Rebuilds fragmented messages with bounded memory. Messages which time out or are evicted are reported in 'lost' with their missing fragment indexes."""
+
+    def __init__(self, timeout = 30, max_messages = 8, max_bytes = 65536):
+        """Initiates the reassembler.
+
+        Parameters:
+        timeout (float): Seconds a message may take to complete (Default is 30)
+        max_messages (int): Maximum number of messages reassembled at once (Default is 8)
+        max_bytes (int): Maximum number of buffered payload bytes (Default is 65536)"""
+
+        if max_messages < 1:
+            raise ValueError('max_messages should be at least 1.')
+
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.partials = OrderedDict()
+        self.buffered = 0
+        self.completed = 0
+        self.lost = deque(maxlen = 32)
+
+    def missing(self, msg_id):
+        """Returns the fragments not yet received for a message.
+
+        Parameters:
+        msg_id (int): Message id
+
+        Returns:
+        list: Missing fragment indexes, None if the message is not being reassembled"""
+
+        partial = self.partials.get(msg_id)
+        if partial is None:
+            return None
+        return [i for i in range(partial.count) if i not in partial.parts]
+
+    def _drop(self, msg_id):
+        """Drops a partial message and reports its missing fragments.
+
+        Parameters:
+        msg_id (int): Message id"""
+
+        self.lost.append((msg_id, self.missing(msg_id)))
+        self.buffered -= self.partials.pop(msg_id).size
+
+    def expire(self):
+        """Drops messages which did not complete in time.
+
+        Returns:
+        int: Number of messages dropped"""
+
+        now = monotonic()
+        expired = [msg_id for msg_id, partial in self.partials.items() if now - partial.started > self.timeout]
+        for msg_id in expired:
+            self._drop(msg_id)
+        return len(expired)
+
+    def push(self, frame):
+        """Adds a received frame.
+
+        Parameters:
+        frame (bytes): Received frame
+
+        Returns:
+        bytes: The complete message, None if the message is not complete yet or the frame is not a fragment"""
+
+        if len(frame) < FRAGMENT_HEADER.size:
+            return None
+        kind, msg_id, index, count = FRAGMENT_HEADER.unpack_from(frame)
+        if kind != FRAME_FRAGMENT or index >= count:
+            return None
+        payload = bytes(frame[FRAGMENT_HEADER.size:])
+        if count == 1:
+            self.completed += 1
+            return payload
+
+        self.expire()
+        partial = self.partials.get(msg_id)
+        if partial is not None and partial.count != count:
+            #Message id is reused by a new message
+            self._drop(msg_id)
+            partial = None
+        if partial is None:
+            while len(self.partials) >= self.max_messages:
+                self._drop(next(iter(self.partials)))
+            partial = self.partials[msg_id] = _Partial(count)
+
+        if index not in partial.parts:
+            partial.parts[index] = payload
+            partial.size += len(payload)
+            self.buffered += len(payload)
+        while self.buffered > self.max_bytes and self.partials:
+            self._drop(next(iter(self.partials)))
+        if msg_id not in self.partials or len(partial.parts) < count:
+            return None
+
+        del self.partials[msg_id]
+        self.buffered -= partial.size
+        self.completed += 1
+        return b"".join(partial.parts[i] for i in range(count))
+
+class FragmentLink(object):
+    """Sends and receives messages larger than one radio frame over a LoRa module in auto TX or RX mode.
+
+    There are no acknowledgements. An auto RX receiver restarts its receiver over the UART after every frame, and a fragment sent before that is lost; the sender waits for the gap between fragments to avoid this. A message with lost fragments never completes and is reported in the reassembler's 'lost' list once it times out."""
+
+    def __init__(self, lora, timeout = 30, max_messages = 8, max_bytes = 65536, gap = 0.1):
+        """Initiates the link.
+
+        Parameters:
+        lora (RN2XX3): LoRa module
+        timeout (float): Seconds a received message may take to complete (Default is 30)
+        max_messages (int): Maximum number of messages reassembled at once (Default is 8)
+        max_bytes (int): Maximum number of buffered payload bytes (Default is 65536)
+        gap (float): Delay between fragments, giving the receiver time to restart its receiver, in seconds (Default is 0.1)"""
+
+        if gap < 0:
+            raise ValueError('gap should be at least 0.')
+
+        self.lora = lora
+        self.gap = gap
+        self.reassembler = Reassembler(timeout, max_messages, max_bytes)
+        self._next_id = 0
+
+    def send(self, message):
+        """Sends a message, one fragment after the other.
+
+        Parameters:
+        message (bytes): Message to send (bytes, bytearray or memoryview)
+
+        Returns:
+        str: 'radio_tx_ok' if every fragment is transmitted, otherwise the failing response"""
+
+        msg_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFF
+
+        res = ""
+        for i, frame in enumerate(fragment(message, msg_id, self.lora.radio_max_payload())):
+            if i > 0:
+                sleep(self.gap)
+            res = self.lora.send_bytes(frame)
+            if res != "ok":
+                return res
+            res = self.lora.wait_tx_done(self.lora.radio_time_on_air(len(frame)) + 1)
+            if res != "radio_tx_ok":
+                return res
+        return res
+
+    def receive(self, timeout = None):
+        """Checks for a received frame and adds it to the reassembler.
+
+        Parameters:
+        timeout (float): Maximum time to wait for a frame when the background reader is running. (Default is the serial port timeout)
+
+        Returns:
+        bytes: A complete message, None if no message is complete yet"""
+
+        frame = self.lora.check_bytes(timeout)
+        if frame is None:
+            self.reassembler.expire()
+            return None
+        return self.reassembler.push(frame)
+
+#Adaptive Data Rate
+
+class RateController(object):
+    """Adaptive spreading factor, bandwidth and output power for a point-to-point link.
+
+    Both ends observe the SNR of the frames they receive and the frames lost. When the loss exceeds the target or the SNR margin above the demodulation floor gets too small, the controller raises the power and then steps to a more robust data rate. With loss under the target and enough margin, it steps to a faster data rate and then lowers the power.
+
+    A change is proposed with a control frame on the current settings. The peer acknowledges it and switches; the proposer switches once the ack arrives. If the peer hears nothing on the new settings within the fallback time, it returns to the previous ones."""
+
+    def __init__(self, lora, rates = DATA_RATES, rate = 0, power = None, target_loss = 0.1, margin = 5.0, hysteresis = 2.0, power_step = 3, window = 16, hold = 8, attempts = 3, fallback = None, turnaround = 0.01):
+        """Initiates the controller and applies the initial settings. Both ends should start with the same rate and power.
+
+        Parameters:
+        lora (RN2XX3): LoRa module, configured for radio transmission and reception with the MAC paused
+        rates (list): (SPREADING_FACTORS, RADIO_BW) pairs from the most robust to the fastest (DATA_RATES is default)
+        rate (int): Initial data rate index (Default is 0)
+        power (int): Initial output power in dBm (Default is the highest power of the region)
+        target_loss (float): Highest acceptable frame loss ratio (Default is 0.1)
+        margin (float): SNR margin above the demodulation floor to keep, in dB (Default is 5)
+        hysteresis (float): Additional margin required before speeding up, in dB (Default is 2)
+        power_step (int): Output power step in dB (Default is 3)
+        window (int): Number of recent frames the decision is based on (Default is 16)
+        hold (int): Frames to observe after a change before the next one (Default is 8)
+        attempts (int): Transmissions of a control frame before giving up (Default is 3)
+        fallback (float): Seconds without frames on new settings before returning to the previous ones (Default is derived from the time on air)
+        turnaround (float): Delay before answering a control frame, in seconds (Default is 0.01)"""
+
+        if rate < 0 or rate >= len(rates):
+            raise ValueError('rate is outside of 0 and ' + str(len(rates) - 1) + '.')
+        if window < 1 or hold < 1 or hold > window:
+            raise ValueError('hold is outside of 1 and window.')
+
+        self.lora = lora
+        self.rates = rates
+        self.min_power, self.max_power = POWER_RANGES[lora.region]
+        self.target_loss = target_loss
+        self.margin = margin
+        self.hysteresis = hysteresis
+        self.power_step = power_step
+        self.hold = hold
+        self.attempts = attempts
+        self.turnaround = turnaround
+        self.changes = 0
+        self.failed = 0
+        self.reverts = 0
+        self._fallback = fallback
+        self._samples = deque(maxlen = window)
+        self._seq = 0
+        self._revert = None
+
+        power = self.max_power if power is None else power
+        if power < self.min_power or power > self.max_power:
+            raise ValueError('power is outside of ' + str(self.min_power) + ' and ' + str(self.max_power) + '.')
+        self._apply(rate, power)
+
+    def _apply(self, rate, power):
+        """Configures the radio.
+
+        Parameters:
+        rate (int): Data rate index
+        power (int): Output power in dBm"""
+
+        sf, bw = self.rates[rate]
+        with self.lora.batch():
+            self.lora.radio_set_sf(sf)
+            self.lora.radio_set_bw(bw)
+            self.lora.radio_set_pwr(power)
+        self.rate = rate
+        self.power = power
+        self._samples.clear()
+
+    def _ack_timeout(self):
+        """Returns how long to wait for a control ack with the current settings, in seconds."""
+
+        return 2 * self.lora.radio_time_on_air(CONTROL_FRAME.size) + self.turnaround + 0.5
+
+    def _transmit(self, frame):
+        """Transmits a frame and waits until it is on air.
+
+        Parameters:
+        frame (bytes): Frame to transmit
+
+        Returns:
+        bool: True if the frame is transmitted"""
+
+        return transmit_frame(self.lora, frame)
+
+    def last_snr(self):
+        """Returns the SNR of the last received frame, from the link quality monitor if it is enabled.
+
+        Returns:
+        int: SNR in dB, None if unknown"""
+
+        monitor = self.lora.link_quality
+        if monitor is not None and monitor.samples:
+            return monitor.samples[-1].snr
+        return self.lora.radio_get_value("snr")
+
+    def observe(self, snr = None, delivered = 0, lost = 0):
+        """Adds the outcome of recent frames. A received frame confirms new settings.
+
+        Parameters:
+        snr (int): SNR of a received frame in dB, None if no frame is received (Default is None)
+        delivered (int): Number of frames which arrived (Default is 0)
+        lost (int): Number of frames which were lost (Default is 0)"""
+
+        if snr is not None:
+            self._revert = None
+        for i in range(delivered):
+            self._samples.append((snr, False))
+        for i in range(lost):
+            self._samples.append((None, True))
+        if snr is not None and not delivered:
+            self._samples.append((snr, False))
+
+    def decide(self):
+        """Returns the settings the observations call for.
+
+        Returns:
+        tuple: (data rate index, output power), None to keep the current settings"""
+
+        if len(self._samples) < self.hold:
+            return None
+
+        lost = sum(1 for snr, is_lost in self._samples if is_lost)
+        loss = float(lost) / len(self._samples)
+        snrs = sorted(snr for snr, is_lost in self._samples if snr is not None)
+        snr = snrs[len(snrs) // 10] if snrs else None
+        sf, bw = self.rates[self.rate]
+        margin = snr - SNR_FLOOR[sf] if snr is not None else None
+
+        if loss > self.target_loss or (margin is not None and margin < self.margin):
+            #More robust: more power first, then a slower data rate
+            if self.power < self.max_power:
+                return (self.rate, min(self.max_power, self.power + self.power_step))
+            if self.rate > 0:
+                return (self.rate - 1, self.power)
+            return None
+
+        if margin is None:
+            return None
+
+        #Faster: a faster data rate first, then less power
+        if self.rate + 1 < len(self.rates):
+            next_sf, next_bw = self.rates[self.rate + 1]
+            next_margin = snr - 10 * log10(float(next_bw.value) / float(bw.value)) - SNR_FLOOR[next_sf]
+            if next_margin >= self.margin + self.hysteresis:
+                return (self.rate + 1, self.power)
+        if self.power > self.min_power and margin - self.power_step >= self.margin + self.hysteresis:
+            return (self.rate, max(self.min_power, self.power - self.power_step))
+        return None
+
+    def propose(self):
+        """Negotiates the settings the observations call for with the peer, if they differ from the current ones.
+
+        Returns:
+        bool: True if the settings changed"""
+
+        change = self.decide()
+        if change is None:
+            return False
+
+        self._seq = (self._seq + 1) & 0xFF
+        rate, power = change
+        request = CONTROL_FRAME.pack(FRAME_CONTROL, self._seq, rate, power, 0)
+        for attempt in range(self.attempts):
+            if not self._transmit(request):
+                continue
+            ack = self.lora.receive_bytes(self._ack_timeout())
+            if ack is not None and len(ack) >= CONTROL_FRAME.size and ack[0] == FRAME_CONTROL:
+                kind, seq, ack_rate, ack_power, flags = CONTROL_FRAME.unpack_from(ack)
+                if flags & CONTROL_FLAG_ACK and seq == self._seq and (ack_rate, ack_power) == change:
+                    self._apply(rate, power)
+                    self.changes += 1
+                    return True
+
+        #No answer: observe a while longer before trying again
+        self.failed += 1
+        self._samples.clear()
+        return False
+
+    def handle(self, frame):
+        """Processes a received control frame; acknowledges a proposal and switches to its settings.
+
+        Parameters:
+        frame (bytes): Received frame
+
+        Returns:
+        bool: True if the frame is a control frame"""
+
+        if len(frame) < CONTROL_FRAME.size or frame[0] != FRAME_CONTROL:
+            return False
+
+        kind, seq, rate, power, flags = CONTROL_FRAME.unpack_from(frame)
+        if flags & CONTROL_FLAG_ACK or rate >= len(self.rates) or power < self.min_power or power > self.max_power:
+            return True
+
+        sleep(self.turnaround)
+        self._transmit(CONTROL_FRAME.pack(FRAME_CONTROL, seq, rate, power, CONTROL_FLAG_ACK))
+        if (rate, power) != (self.rate, self.power):
+            previous = (self.rate, self.power)
+            self._apply(rate, power)
+            fallback = self._fallback if self._fallback is not None else self.attempts * self._ack_timeout() + 1
+            self._revert = (previous, monotonic() + fallback)
+            self.changes += 1
+        return True
+
+    def check_fallback(self):
+        """Returns to the previous settings if nothing was received since a switch within the fallback time.
+
+        Returns:
+        bool: True if the settings were reverted"""
+
+        if self._revert is None or monotonic() < self._revert[1]:
+            return False
+        previous = self._revert[0]
+        self._revert = None
+        self._apply(previous[0], previous[1])
+        self.reverts += 1
+        return True
+
+#Reliable Delivery
+
+class _Slot(object):
+    """A frame waiting for acknowledgement."""
+
+    __slots__ = ("seq", "payload", "sent_at", "attempts", "acked", "resend")
+
+    def __init__(self, seq, payload):
+        self.seq = seq
+        self.payload = payload
+        self.sent_at = None
+        self.attempts = 0
+        self.acked = False
+        self.resend = True
+
+class ReliableLink(object):
+    """Selective-repeat ARQ over raw LoRa radio frames.
+
+    The sender transmits every frame of its window back to back and sets the poll flag on the last one. The receiver answers a poll with one ack frame holding the next expected sequence number and a bitmap of the frames buffered after it, so only lost frames are sent again. Both ends should be configured with the same radio settings and the MAC paused."""
+
+    def __init__(self, lora, window = 8, initial_rto = None, min_rto = 0.2, max_rto = 30, max_attempts = 8, turnaround = 0.01, controller = None):
+        """Initiates the link.
+
+        Parameters:
+        lora (RN2XX3): LoRa module
+        window (int): Maximum number of unacknowledged frames (1 to 32, Default is 8)
+        initial_rto (float): Retransmission timeout before the first round trip is measured, in seconds (Default is derived from the ack time on air)
+        min_rto (float): Lower limit of the retransmission timeout, in seconds (Default is 0.2)
+        max_rto (float): Upper limit of the retransmission timeout, in seconds (Default is 30)
+        max_attempts (int): Transmissions of a frame before giving up (Default is 8)
+        turnaround (float): Delay before answering a poll, giving the sender time to open its receiver, in seconds (Default is 0.01)
+        controller (RateController): Adapts the data rate to the measured SNR and loss; the sender proposes changes between windows (Default is None)"""
+
+        if window < 1 or window > ACK_BITMAP_BITS:
+            raise ValueError('window is outside of 1 and ' + str(ACK_BITMAP_BITS) + '.')
+
+        self.lora = lora
+        self.window = window
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_attempts = max_attempts
+        self.turnaround = turnaround
+        self.controller = controller
+        self._initial_rto = initial_rto
+        self._reset_rto()
+
+        #Sender state
+        self._next_seq = 0
+        self.sent_frames = 0
+        self.retransmissions = 0
+
+        #Receiver state
+        self._expected = 0
+        self._buffer = {}
+        self.delivered = 0
+
+    def _transmit(self, frame):
+        """Transmits a frame and waits until it is on air.
+
+        Parameters:
+        frame (bytes): Frame to transmit
+
+        Returns:
+        bool: True if the frame is transmitted"""
+
+        return transmit_frame(self.lora, frame)
+
+    def _reset_rto(self):
+        """Discards the round trip estimate, as after a change of radio settings."""
+
+        self.rto = self._initial_rto if self._initial_rto is not None else max(self.min_rto, 3 * self.lora.radio_time_on_air(ACK_FRAME.size) + 0.5)
+        self.srtt = None
+        self.rttvar = None
+
+    def _update_rto(self, rtt):
+        """Updates the retransmission timeout with a round trip sample.
+
+        Parameters:
+        rtt (float): Measured round trip time in seconds"""
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(self.max_rto, max(self.min_rto, self.srtt + 4 * self.rttvar))
+
+    def send(self, payloads):
+        """Delivers payloads in order.
+
+        Parameters:
+        payloads (list): Payloads to deliver (bytes, up to radio_max_payload() - 3 bytes each)
+
+        Returns:
+        int: Number of payloads acknowledged; less than the number given if a frame exceeded max_attempts"""
+
+        limit = self.lora.radio_max_payload() - DATA_HEADER.size
+        slots = []
+        for payload in payloads:
+            if len(payload) > limit:
+                raise ValueError('payload length is outside of 0 and ' + str(limit) + '.')
+            slots.append(_Slot(self._next_seq, bytes(payload)))
+            self._next_seq = (self._next_seq + 1) & 0xFF
+
+        base = 0
+        while base < len(slots):
+            if self.controller is not None and self.controller.propose():
+                self._reset_rto()
+
+            burst = [slot for slot in slots[base:base + self.window] if not slot.acked and slot.resend]
+            if not burst:
+                #Nothing is known to be lost; poll with the oldest unacknowledged frame
+                burst = [slots[base]]
+
+            poll = None
+            for i, slot in enumerate(burst):
+                if slot.attempts >= self.max_attempts:
+                    return base
+                flags = DATA_FLAG_POLL if i == len(burst) - 1 else 0
+                if slot.attempts > 0:
+                    self.retransmissions += 1
+                slot.attempts += 1
+                slot.resend = False
+                self.sent_frames += 1
+                if self._transmit(DATA_HEADER.pack(FRAME_DATA, slot.seq, flags) + slot.payload):
+                    slot.sent_at = monotonic()
+                    poll = slot
+
+            ack = self.lora.receive_bytes(self.rto) if poll is not None else None
+            if ack is None or len(ack) < ACK_FRAME.size or ack[0] != FRAME_ACK:
+                #Lost poll or lost ack: back off
+                self.rto = min(self.max_rto, self.rto * 2)
+                if self.controller is not None:
+                    self.controller.observe(lost = len(burst))
+                continue
+
+            if poll.attempts == 1:
+                self._update_rto(monotonic() - poll.sent_at)
+            elif self.srtt is not None:
+                #Ack for a retransmitted poll: no sample, but the backoff ends
+                self.rto = min(self.max_rto, max(self.min_rto, self.srtt + 4 * self.rttvar))
+
+            kind, expected, bitmap = ACK_FRAME.unpack_from(ack)
+            missing = 0
+            for slot in slots[base:base + self.window]:
+                offset = (slot.seq - expected) & 0xFF
+                if offset >= 0x80 or (offset > 0 and bitmap & (1 << (offset - 1))):
+                    slot.acked = True
+                elif slot.sent_at is not None:
+                    #Sent before the poll and still missing
+                    slot.resend = True
+                    missing += 1
+            if self.controller is not None:
+                self.controller.observe(self.controller.last_snr(), len(burst) - min(missing, len(burst)), min(missing, len(burst)))
+            while base < len(slots) and slots[base].acked:
+                base += 1
+        return base
+
+    def receive(self, timeout):
+        """Listens for one data frame, answers polls and returns the payloads which became deliverable in order.
+
+        Parameters:
+        timeout (float): Maximum time to wait for a frame in seconds
+
+        Returns:
+        list: Payloads delivered in order (may be empty)"""
+
+        if self.controller is not None:
+            self.controller.check_fallback()
+
+        frame = self.lora.receive_bytes(timeout)
+        if frame is not None and self.controller is not None and self.controller.handle(frame):
+            return []
+        if frame is None or len(frame) < DATA_HEADER.size or frame[0] != FRAME_DATA:
+            return []
+        if self.controller is not None:
+            self.controller.observe(self.controller.last_snr(), 1)
+
+        kind, seq, flags = DATA_HEADER.unpack_from(frame)
+        offset = (seq - self._expected) & 0xFF
+        if offset < self.window:
+            self._buffer[seq] = bytes(frame[DATA_HEADER.size:])
+
+        delivered = []
+        while self._expected in self._buffer:
+            delivered.append(self._buffer.pop(self._expected))
+            self._expected = (self._expected + 1) & 0xFF
+        self.delivered += len(delivered)
+
+        if flags & DATA_FLAG_POLL:
+            bitmap = 0
+            for i in range(ACK_BITMAP_BITS):
+                if ((self._expected + 1 + i) & 0xFF) in self._buffer:
+                    bitmap |= 1 << i
+            sleep(self.turnaround)
+            self._transmit(ACK_FRAME.pack(FRAME_ACK, self._expected, bitmap))
+        return delivered
+
+#Frequency Hopping
+
+def hop_sequence(seed, count, cycle):
+    """Returns the channel order of one hopping cycle: a permutation of the channel indexes, the same on every node sharing the seed.
+
+    Parameters:
+    seed (int): Shared 32-bit sequence seed
+    count (int): Number of channels
+    cycle (int): Cycle number
+
+    Returns:
+    list: Channel indexes"""
+
+    #xorshift32, seeded from the seed and the cycle
+    state = (seed * 0x9E3779B1 + cycle * 0x85EBCA6B + 1) & 0xFFFFFFFF or 1
+    order = list(range(count))
+    for i in range(count - 1, 0, -1):
+        state ^= (state << 13) & 0xFFFFFFFF
+        state ^= state >> 17
+        state ^= (state << 5) & 0xFFFFFFFF
+        j = state % (i + 1)
+        order[i], order[j] = order[j], order[i]
+    return order
+
+class FrequencyHopper(object):
+    """Time-slotted frequency hopping for point-to-point links.
+
+    Time is split into slots of <dwell> seconds counted from the Unix epoch, so nodes with synchronized clocks (e.g. over NTP) agree on the slot. Each slot uses the channel the shared pseudo-random sequence assigns to it; every channel is visited once per cycle. Groups of nodes using different seeds meet on the same channel only by chance, so the aggregate throughput grows with the number of channels.
+
+    A hop costs one 'radio set freq' command, pipelined with closing the receiver and sent before the transmission or reopening the receiver; the shadow configuration cache skips it when the channel does not change."""
+
+    def __init__(self, lora, channels = None, seed = 0, dwell = 0.4, guard = 0.02, clock = time):
+        """Initiates the hopper.
+
+        Parameters:
+        lora (RN2XX3): LoRa module, configured for radio transmission and reception with the MAC paused
+        channels (list): Frequencies in Hz (Default is HOP_CHANNELS of the module's region)
+        seed (int): Sequence seed, shared by the nodes of one network (Default is 0)
+        dwell (float): Slot length in seconds; US regulations allow 0.4 seconds per channel (Default is 0.4)
+        guard (float): Time kept free at both ends of a slot for hopping and clock offset, in seconds (Default is 0.02)
+        clock (function): Returns the shared time in seconds (Default is time.time)"""
+
+        if channels is None:
+            channels = HOP_CHANNELS[lora.region]
+        if not channels:
+            raise ValueError('channels should have at least 1 frequency.')
+        if dwell <= 2 * guard:
+            raise ValueError('dwell should be longer than twice the guard.')
+
+        self.lora = lora
+        self.channels = list(channels)
+        self.seed = seed & 0xFFFFFFFF
+        self.dwell = dwell
+        self.guard = guard
+        self.clock = clock
+        self.hops = 0
+        self.deferred = 0
+        self._cycle = None
+        self._order = None
+
+    def slot_at(self, t):
+        """Returns the slot number at a time.
+
+        Parameters:
+        t (float): Time from the shared clock in seconds
+
+        Returns:
+        int: Slot number"""
+
+        return int(t // self.dwell)
+
+    def channel(self, slot):
+        """Returns the frequency of a slot.
+
+        Parameters:
+        slot (int): Slot number
+
+        Returns:
+        int: Frequency in Hz"""
+
+        cycle, index = divmod(slot, len(self.channels))
+        if cycle != self._cycle:
+            self._order = hop_sequence(self.seed, len(self.channels), cycle)
+            self._cycle = cycle
+        return self.channels[self._order[index]]
+
+    def _hop(self, slot, command, stop_rx = False):
+        """Tunes the radio to the channel of a slot and issues a command once the channel is set.
+
+        Parameters:
+        slot (int): Slot number
+        command (function): Issues the command to send on the new channel
+        stop_rx (bool): Closes the open receiver first (Default is False)
+
+        Returns:
+        str: Response to the command, or the first failure"""
+
+        frequency = self.channel(slot)
+        if self.lora._radio_setting("freq") != frequency:
+            self.hops += 1
+        with self.lora.batch() as batch:
+            if stop_rx:
+                self.lora.radio_rxstop()
+            self.lora.radio_set_freq(frequency)
+        failed = batch.failed
+        if failed:
+            #Never transmit or listen on the previous slot's channel
+            return failed[0][1]
+        return command()
+
+    def send_bytes(self, data):
+        """Transmits a frame on the current slot's channel and waits until it is on air. Waits for the next slot if the frame does not fit in the current one.
+
+        Parameters:
+        data (bytes): Frame to transmit
+
+        Returns:
+        str: 'radio_tx_ok' or 'radio_err', the module's response if the transmission was refused"""
+
+        limit = self.lora.radio_max_payload()
+        if len(data) > limit:
+            raise ValueError('data length is outside of 0 and ' + str(limit) + '.')
+        airtime = self.lora.radio_time_on_air(len(data))
+        if airtime > self.dwell - 2 * self.guard:
+            raise ValueError('data does not fit in a slot.')
+
+        while True:
+            now = self.clock()
+            slot = self.slot_at(now)
+            offset = now - slot * self.dwell
+            if offset < self.guard:
+                sleep(self.guard - offset)
+                continue
+            if offset + airtime <= self.dwell - self.guard:
+                break
+            self.deferred += 1
+            sleep(self.dwell - offset)
+
+        res = self._hop(slot, lambda: self.lora.radio_tx(bytes(data).hex()))
+        if res != "ok":
+            return res
+        return self.lora.wait_tx_done(airtime + 1)
+
+    def receive_bytes(self, timeout):
+        """Follows the hopping sequence with the receiver open and waits for one frame. Starts the background reader, so listening ends on slot boundaries.
+
+        Parameters:
+        timeout (float): Maximum time to wait for a frame in seconds
+
+        Returns:
+        bytes: Received payload, None if no frame is received in time"""
+
+        if self.lora._reader is None:
+            self.lora.start_reader()
+
+        deadline = monotonic() + timeout
+        listening = False
+        try:
+            while True:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return None
+
+                now = self.clock()
+                slot = self.slot_at(now)
+                listening = self._hop(slot, lambda: self.lora.radio_rx(0), listening) == "ok"
+                if not listening:
+                    return None
+
+                slot_end = monotonic() + (slot + 1) * self.dwell - now
+                while True:
+                    wait = min(deadline, slot_end) - monotonic()
+                    if wait <= 0:
+                        break
+                    line = self.lora._read_line(wait)
+                    if line.startswith("radio_rx", 0, 8):
+                        listening = False
+                        res = bytes.fromhex(line[8:].strip())
+                        if self.lora.link_quality is not None:
+                            self.lora._capture_link_quality(res, False)
+                        return res
+                    if line == "radio_err":
+                        #Receiver closed on a CRC error: reopen in this slot
+                        listening = self.lora.radio_rx(0) == "ok"
+                        if not listening:
+                            return None
+        finally:
+            if listening:
+                self.lora.radio_rxstop()
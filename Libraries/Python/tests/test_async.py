@@ -0,0 +1,97 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Asyncio interface tests against the firmware emulator.
+
+import os
+import sys
+import asyncio
+import unittest
+import warnings
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Turta_LoRa import *
+from Turta_LoRa_Async import AsyncRN2XX3
+from Turta_LoRa_Emulator import Channel, EmulatedRN2XX3
+
+class AsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = Channel()
+        self.emulators = [EmulatedRN2XX3(channel = self.channel) for i in range(2)]
+        for emulator in self.emulators:
+            self.addCleanup(emulator.close)
+
+    def run_async(self, coroutine):
+        """Runs a coroutine, failing on coroutines which are never awaited."""
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            return asyncio.run(coroutine)
+
+    def test_port_not_opened_before_open(self):
+        lora = AsyncRN2XX3(region = REGIONS.EU_RN2483, port = self.emulators[0].port)
+        self.assertIsNone(lora.sp)
+        self.assertFalse(lora.is_open())
+
+    def test_transmit_and_receive(self):
+        peer = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulators[1].port)
+        self.addCleanup(peer.close)
+
+        async def main():
+            async with AsyncRN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulators[0].port) as lora:
+                self.assertEqual(await lora.send_bytes(b"ping"), "ok")
+                self.assertEqual(await lora.wait_tx_done(2), "radio_tx_ok")
+
+                def answer():
+                    sleep(0.3)
+                    peer.send_bytes(b"pong")
+                    peer.wait_tx_done(2)
+                reply = asyncio.get_running_loop().run_in_executor(None, answer)
+                self.assertEqual(await lora.receive_bytes(3), b"pong")
+                await reply
+                self.assertIsNone(await lora.receive_bytes(0.2))
+                self.assertEqual(await lora.sys_get_vdd(), "3300")
+
+        self.run_async(main())
+
+    def test_unavailable_operations(self):
+        lora = AsyncRN2XX3(region = REGIONS.EU_RN2483, port = self.emulators[0].port)
+        self.assertRaises(NotImplementedError, lora.start_reader)
+        self.assertRaises(NotImplementedError, lora.start_recording, "recording.bin")
+        self.assertRaises(NotImplementedError, lora.negotiate_baudrate)
+        with self.assertRaises(NotImplementedError):
+            lora.auto_baud = AUTO_BAUD_RATES
+        with self.assertRaises(TypeError):
+            with lora:
+                pass
+
+    def test_reset_is_awaitable(self):
+        async def main():
+            async with AsyncRN2XX3(region = REGIONS.EU_RN2483, port = self.emulators[0].port) as lora:
+                self.assertTrue((await lora.sys_reset()).startswith("RN2483"))
+                self.assertTrue((await lora.sys_get_ver()).startswith("RN2483"))
+
+        self.run_async(main())
+
+    def test_batch_collects_owner_task_only(self):
+        async def main():
+            async with AsyncRN2XX3(region = REGIONS.EU_RN2483, port = self.emulators[0].port) as lora:
+                opened = asyncio.Event()
+                async def other():
+                    await opened.wait()
+                    return await lora.sys_get_vdd()
+                task = asyncio.ensure_future(other())
+
+                async with lora.batch() as batch:
+                    self.assertIsNone(await lora.radio_set_freq(868300000))
+                    opened.set()
+                    self.assertEqual(await task, "3300")
+                self.assertEqual(batch.results, [("radio set freq 868300000", "ok")])
+
+        self.run_async(main())
+
+if __name__ == '__main__':
+    unittest.main()
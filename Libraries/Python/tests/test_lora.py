@@ -0,0 +1,363 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# LoRa module driver tests against the firmware emulator.
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import Future
+from time import monotonic
+
+import serial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Turta_LoRa import *
+from Turta_LoRa import _MacOperation, _Reply
+from Turta_LoRa_Emulator import EmulatedRN2XX3
+
+class LoRaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.emulator = EmulatedRN2XX3()
+        self.addCleanup(self.emulator.close)
+
+    def test_uplink_future(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.assertEqual(lora.join_network(JOIN_PROCEDURE_TYPES.OTAA).result(10).status, "accepted")
+        self.emulator.queue_downlink(7, b"\xbe\xef")
+
+        outcome = lora.send_uplink(b"\x01\x02", 3).result(10)
+        self.assertEqual((outcome.status, outcome.port, outcome.data), ("mac_rx", 7, b"\xbe\xef"))
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_second_response_not_taken_as_reply(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port, background_reader = True)
+        self.addCleanup(lora.close)
+        op = _MacOperation("mac tx uncnf 1 00", MAC_TX_OUTCOMES, 5, Future(), threading.Event())
+        op.answered = True
+        lora._mac_op = op
+        reply = _Reply()
+        with lora._event_cond:
+            lora._pending.append(reply)
+
+        lora._dispatch("invalid_data_len")
+        self.assertEqual(op.line, "invalid_data_len")
+        self.assertFalse(reply.done.is_set())
+        lora._dispatch("3300")
+        self.assertEqual(reply.line, "3300")
+
+    def test_closed_port_object(self):
+        port = serial.Serial(self.emulator.port, 57600, timeout = 2)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = port)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        lora.close()
+        self.assertFalse(lora.is_open())
+        self.assertRaises(serial.SerialException, lora.sys_get_vdd)
+
+    def test_closed_port_name_reopens(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        lora.close()
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_short_timeout_while_recording(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "uart.rec")
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        lora.start_recording(path)
+
+        start = monotonic()
+        self.assertIsNone(lora.check_uart_buffer(0.1))
+        self.assertLess(monotonic() - start, 1)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        lora.stop_recording()
+        self.assertEqual([data for t, direction, data in read_recording(path) if direction == RECORDING_WRITE], [b"sys get vdd\r\n"])
+
+    def test_replay_recording(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "uart.rec")
+        port = serial.Serial(self.emulator.port, 57600, timeout = 2)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = RecordingSerial(port, path))
+        self.assertIsNone(lora.check_uart_buffer(0.1))
+        version = lora.sys_get_ver()
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        lora.close()
+
+        replay = ReplaySerial(path, speed = 0)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = replay)
+        self.assertIsNone(lora.check_uart_buffer(0.1))
+        self.assertEqual(lora.sys_get_ver(), version)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        lora.close()
+        self.assertTrue(replay.exhausted)
+        self.assertEqual(replay.mismatches, 0)
+
+    def test_coalesced_leds_follow_last_state(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        lora.set_led_policy(LED_POLICIES.COALESCED)
+
+        def toggle(led):
+            for i in range(200):
+                lora._led(led, LED_STATES.ON if i % 2 == 0 else LED_STATES.OFF)
+            lora._led(led, LED_STATES.ON)
+        threads = [threading.Thread(target = toggle, args = (led,)) for led in LEDS]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        writer = lora._led_writer
+        lora.set_led_policy(LED_POLICIES.SYNC)
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(lora._led_applied, lora._led_wanted)
+        self.assertEqual(self.emulator.pins, dict((led.value, LED_STATES.ON.value) for led in LEDS))
+
+    def test_batch_results(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        with lora.batch(window = 2) as batch:
+            self.assertIsNone(lora.radio_set_sf(SPREADING_FACTORS.SF9))
+            lora.radio_set_bw(RADIO_BW.BW_250)
+            lora.sys_get_vdd()
+        self.assertEqual(batch.results, [("radio set sf sf9", "ok"), ("radio set bw 250", "ok"), ("sys get vdd", "3300")])
+        self.assertFalse(batch.ok)
+        self.assertEqual(batch.failed, [("sys get vdd", "3300")])
+        self.assertEqual((self.emulator.radio["sf"], self.emulator.radio["bw"]), ("sf9", "250"))
+
+        #The radio cannot be configured while receiving
+        self.assertEqual(lora.radio_rx(0), "ok")
+        with lora.batch() as batch:
+            lora.radio_set_freq(868300000)
+            lora.radio_set_sf(SPREADING_FACTORS.SF7)
+        self.assertEqual(batch.failed, [("radio set freq 868300000", "busy"), ("radio set sf sf7", "busy")])
+        self.assertEqual(lora.radio_rxstop(), "ok")
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_shadow_cache(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.emulator.history.clear()
+        hits = lora.stats.cache_hits
+
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF9), "ok")
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF9), "ok")
+        self.assertEqual(lora.radio_get_sf(), "sf9")
+        self.assertEqual(list(self.emulator.history), ["radio set sf sf9"])
+        self.assertEqual(lora.stats.cache_hits, hits + 2)
+
+        #A refused set leaves the value unknown
+        self.assertEqual(lora.radio_rx(0), "ok")
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF10), "busy")
+        self.assertEqual(lora.radio_rxstop(), "ok")
+        self.emulator.history.clear()
+        self.assertEqual(lora.radio_get_sf(), "sf9")
+        self.assertEqual(list(self.emulator.history), ["radio get sf"])
+
+        lora.invalidate_cache()
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF9), "ok")
+        self.assertEqual(list(self.emulator.history)[-1], "radio set sf sf9")
+
+        #A reset restores the defaults
+        self.assertTrue(lora.sys_reset().startswith("RN2483"))
+        self.emulator.history.clear()
+        self.assertEqual(lora.radio_get_sf(), "sf12")
+        self.assertEqual(list(self.emulator.history), ["radio get sf"])
+
+    def test_readiness_driven_startup(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.assertTrue(lora.firmware_version.startswith("RN2483"))
+        self.assertLess(lora.startup_time, 0.5)
+        self.assertTrue(lora.wait_ready(1))
+        self.assertTrue(self.emulator.mac_paused)
+
+    def test_startup_without_answer(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "silent.rec")
+        RecordingSerial(serial.Serial(self.emulator.port, 57600), path).close()
+
+        #A module which never answers is probed until ready_timeout, then the fixed delay is used
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = ReplaySerial(path, timeout = 0), ready_timeout = 0.2)
+        self.assertIsNone(lora.firmware_version)
+        self.assertGreaterEqual(lora.startup_time, 0.7)
+        self.assertFalse(lora.wait_ready(0.1))
+
+    def test_time_on_air(self):
+        self.assertAlmostEqual(time_on_air(10), 0.041216)
+        self.assertAlmostEqual(time_on_air(51, SPREADING_FACTORS.SF12), 2.465792)
+        self.assertAlmostEqual(time_on_air(10, mode = RADIO_MODES.FSK), 0.00384)
+        self.assertEqual(time_on_air([10, 10]), [time_on_air(10)] * 2)
+        self.assertRaises(ValueError, time_on_air, 10, mode = RADIO_MODES.FSK, fsk_bitrate = 0)
+
+    def test_airtime_accounting(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF9), "ok")
+        self.assertAlmostEqual(lora.radio_time_on_air(20), time_on_air(20, SPREADING_FACTORS.SF9))
+
+        for frequency in (868100000, 868100000, 868300000):
+            self.assertEqual(lora.radio_set_freq(frequency), "ok")
+            self.assertEqual(lora.send_bytes(bytes(20)), "ok")
+            self.assertEqual(lora.wait_tx_done(2), "radio_tx_ok")
+        airtime = time_on_air(20, SPREADING_FACTORS.SF9)
+        self.assertEqual(sorted(lora.airtime), [868100000, 868300000])
+        self.assertAlmostEqual(lora.airtime[868100000], 2 * airtime)
+        self.assertAlmostEqual(lora.airtime[868300000], airtime)
+        lora.reset_airtime()
+        self.assertEqual(lora.airtime, {})
+
+    def test_link_stats_snapshot(self):
+        stats = LinkStats(baudrate = 57600, log_size = 2)
+        stats.record("radio set sf sf9", "ok", 0.003)
+        stats.record("radio set sf sf7", "invalid_param", 0.0015)
+        stats.record("sys get vdd", "", 2.5, 0.001)
+        stats.record("mac pause", "4294967245", 0.004)
+
+        snapshot = stats.snapshot()
+        sf = snapshot["commands"]["radio set"]["sf"]
+        self.assertEqual((sf["count"], sf["errors"], sf["timeouts"]), (2, 1, 0))
+        self.assertEqual(sf["bytes_out"], 36)
+        self.assertAlmostEqual(sf["latency_mean"], 0.00225)
+        self.assertEqual((sf["latency_histogram"]["0.002"], sf["latency_histogram"]["0.005"]), (1, 1))
+        vdd = snapshot["commands"]["sys get"]["vdd"]
+        self.assertEqual((vdd["timeouts"], vdd["bytes_in"], vdd["latency_histogram"]["5.0"]), (1, 0, 1))
+        self.assertIn("pause", snapshot["commands"]["mac"])
+        self.assertEqual((snapshot["totals"]["count"], snapshot["totals"]["errors"], snapshot["totals"]["timeouts"]), (4, 1, 1))
+        self.assertEqual([entry[1] for entry in stats.log], ["sys get vdd", "mac pause"])
+
+        stats.reset()
+        self.assertEqual((stats.snapshot()["commands"], len(stats.log)), ({}, 0))
+
+    def test_link_stats_from_module(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        lora.stats.reset()
+        for i in range(3):
+            self.assertEqual(lora.sys_get_vdd(), "3300")
+        vdd = lora.stats.snapshot()["commands"]["sys get"]["vdd"]
+        self.assertEqual((vdd["count"], vdd["bytes_out"], vdd["bytes_in"]), (3, 39, 18))
+        self.assertGreater(vdd["latency_mean"], vdd["uart_time_mean"])
+
+    def test_replay_reports_mismatches(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "uart.rec")
+        port = RecordingSerial(serial.Serial(self.emulator.port, 57600, timeout = 2), path)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = port)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        lora.close()
+
+        replay = ReplaySerial(path, speed = 0, timeout = 0)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = replay)
+        self.assertEqual(lora.sys_get_hweui(), "3300")
+        self.assertEqual((replay.mismatches, replay.unexpected), (1, [b"sys get hweui\r\n"]))
+
+    def test_mac_status(self):
+        status = MacStatus(0x301)
+        self.assertTrue(status.joined and status.paused and status.rx_done)
+        self.assertFalse(status.adr or status.silent or status.rejoin_needed)
+        self.assertEqual(status.state, MAC_STATES.IDLE)
+        self.assertEqual(MacStatus(0x1E).state, 15)
+        self.assertTrue(MacStatus(1 << 17).rejoin_needed)
+
+    def test_typed_getters(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.assertEqual(lora.radio_get_value("sf"), SPREADING_FACTORS.SF7)
+        self.assertEqual(lora.radio_get_value("freq"), 868000000)
+        self.assertEqual(lora.radio_get_value("afcbw"), 41.7)
+        self.assertEqual(lora.mac_get_value("dr"), 5)
+        self.assertIsInstance(lora.mac_get_status_flags(), MacStatus)
+        self.assertRaises(ValueError, lora.radio_get_value, "channel")
+        self.assertIsNone(parse_parameter(RADIO_PARAMETERS, "pwr", "invalid_param"))
+
+    def test_status_snapshot(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        self.assertEqual(lora.radio_set_sf(SPREADING_FACTORS.SF10), "ok")
+        snapshot = lora.status_snapshot()
+        self.assertEqual((snapshot.radio_sf, snapshot.radio_pwr, snapshot.mac_dr), (SPREADING_FACTORS.SF10, 14, 5))
+        self.assertIsInstance(snapshot.mac_status, MacStatus)
+
+        #Cached parameters are not read again, unless refreshed
+        self.emulator.history.clear()
+        lora.status_snapshot()
+        self.assertNotIn("radio get sf", self.emulator.history)
+        self.assertIn("radio get rssi", self.emulator.history)
+        self.emulator.history.clear()
+        lora.status_snapshot(refresh = True)
+        self.assertEqual(len(self.emulator.history), len(RADIO_PARAMETERS) + len(MAC_PARAMETERS))
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_link_quality_statistics(self):
+        monitor = LinkQualityMonitor(capacity = 10, sender = lambda payload: payload[0], sequence = lambda payload: payload[1])
+        for i, sequence in enumerate([0, 1, 2, 5, 5, 6, 7, 8, 9, 10]):
+            monitor.record(bytes([1, sequence]), i + 1, -100 + i)
+        statistics = monitor.statistics(1)
+        self.assertEqual((statistics["count"], statistics["received"], statistics["expected"]), (10, 9, 11))
+        self.assertAlmostEqual(statistics["loss"], 2.0 / 11)
+        self.assertEqual((statistics["snr_min"], statistics["snr_p10"], statistics["snr_p50"], statistics["snr_p90"]), (1, 1, 5, 9))
+        self.assertEqual((statistics["snr_mean"], statistics["rssi_p90"]), (5.5, -92))
+
+        #Sequence numbers wrap around, and the ring keeps the latest samples
+        monitor.record(bytes([2, 255]), 3)
+        monitor.record(bytes([2, 0]), None)
+        self.assertEqual(monitor.statistics(2)["loss"], 0.0)
+        self.assertIsNone(monitor.statistics(2)["rssi_mean"])
+        self.assertEqual((len(monitor.samples), sorted(monitor.senders())), (10, [1, 2]))
+        self.assertIsNone(monitor.statistics(3))
+        monitor.reset()
+        self.assertEqual(monitor.summary(), {})
+
+    def test_link_quality_capture(self):
+        peer_emulator = EmulatedRN2XX3(channel = self.emulator.channel)
+        self.addCleanup(peer_emulator.close)
+        peer = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = peer_emulator.port)
+        self.addCleanup(peer.close)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = self.emulator.port)
+        self.addCleanup(lora.close)
+        monitor = lora.enable_link_quality(sequence = lambda payload: payload[0])
+
+        for sequence in (0, 1, 3):
+            threading.Timer(0.2, peer.send_bytes, (bytes([sequence]),)).start()
+            self.assertEqual(lora.receive_bytes(2), bytes([sequence]))
+            self.assertEqual(peer.wait_tx_done(2), "radio_tx_ok")
+        statistics = monitor.statistics()
+        self.assertEqual((statistics["count"], statistics["snr_p50"], statistics["rssi_p50"]), (3, 8, -60))
+        self.assertAlmostEqual(statistics["loss"], 0.25)
+
+    def test_auto_baud_negotiation(self):
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = self.emulator.port, auto_baud = AUTO_BAUD_RATES)
+        self.addCleanup(lora.close)
+        self.assertEqual((lora.baudrate, self.emulator.baudrate, lora.sp.baudrate), (230400, 230400, 230400))
+        self.assertEqual(lora.stats.baudrate, 230400)
+
+        #The module returns to the reset baud rate, and the rate is negotiated again
+        self.assertTrue(lora.sys_reset().startswith("RN2483"))
+        self.assertEqual((lora.baudrate, self.emulator.baudrate), (230400, 230400))
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_auto_baud_fallback(self):
+        for max_baudrate, rate in ((115200, 115200), (57600, 57600)):
+            emulator = EmulatedRN2XX3(max_baudrate = max_baudrate)
+            self.addCleanup(emulator.close)
+            lora = RN2XX3(region = REGIONS.EU_RN2483, port = emulator.port)
+            self.addCleanup(lora.close)
+            self.assertEqual(lora.negotiate_baudrate(), rate)
+            self.assertEqual((lora.baudrate, emulator.baudrate, lora.sp.baudrate), (rate, rate, rate))
+            self.assertEqual(lora.sys_get_vdd(), "3300")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Transmit queue tests against the firmware emulator.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+from time import monotonic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Turta_LoRa import *
+from Turta_LoRa_Emulator import EmulatedRN2XX3
+from Turta_LoRa_Queue import DutyCycleScheduler, EU868_SUB_BANDS, PriorityTransmitQueue, QueuedMessage, UplinkAggregator, UplinkJournal, pack_records, unpack_records
+
+class QueueTest(unittest.TestCase):
+
+    def radio(self, auto_config = CONFIG_MODES.LORA_TX, background_reader = False):
+        """Returns a module on a new emulator."""
+
+        emulator = EmulatedRN2XX3()
+        self.addCleanup(emulator.close)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = auto_config, port = emulator.port, background_reader = background_reader)
+        self.addCleanup(lora.close)
+        return lora
+
+    def test_duty_cycle_scheduler_reads_second_response(self):
+        lora = self.radio()
+        lora.radio_set_freq(869500000)
+        scheduler = DutyCycleScheduler(lora)
+        for i in range(3):
+            scheduler.submit(b"frame" + bytes([i]))
+
+        frames = scheduler.run_pending()
+        self.assertEqual([frame.result for frame in frames], ["radio_tx_ok"] * 3)
+        self.assertEqual((scheduler.sent, scheduler.dropped), (3, 0))
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_duty_cycle_scheduler_with_receiver_open(self):
+        lora = self.radio()
+        scheduler = DutyCycleScheduler(lora)
+        scheduler.submit(b"first", 868300000)
+        scheduler.submit(b"second", 869500000)
+
+        #Neither the channel nor the transmission can be set while receiving
+        self.assertEqual(lora.radio_rx(0), "ok")
+        frames = scheduler.run_pending()
+        self.assertEqual([frame.result for frame in frames], ["radio_tx_ok"] * 2)
+        self.assertEqual(lora._radio_setting("freq"), 869500000)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_eu868_sub_band_limits(self):
+        scheduler = DutyCycleScheduler(None)
+        self.assertEqual(EU868_SUB_BANDS[scheduler._sub_band(864000000)][2], 0.001)
+        self.assertEqual(EU868_SUB_BANDS[scheduler._sub_band(866000000)][2], 0.01)
+
+    def test_pack_records(self):
+        records = [b"", b"a", b"bc" * 100]
+        self.assertEqual(unpack_records(pack_records(records)), records)
+        self.assertEqual(pack_records([b"ab", b"cd"], 2), b"abcd")
+        self.assertEqual(unpack_records(b"abcd", 2), [b"ab", b"cd"])
+        self.assertRaises(ValueError, unpack_records, b"\x05abc")
+        self.assertRaises(ValueError, unpack_records, b"abc", 2)
+
+    def test_aggregator_packs_radio_frames(self):
+        emulator = EmulatedRN2XX3()
+        self.addCleanup(emulator.close)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = CONFIG_MODES.LORA_TX, port = emulator.port)
+        self.addCleanup(lora.close)
+        aggregator = UplinkAggregator(lora, lorawan = False, max_payload = 20)
+        records = [bytes([i]) * 5 for i in range(10)]
+        results = []
+        for record in records:
+            results.extend(aggregator.add(record))
+        self.assertEqual((results, aggregator.pending()), (["radio_tx_ok"] * 3, 1))
+        self.assertEqual(aggregator.flush(), ["radio_tx_ok"])
+        frames = [bytes.fromhex(line[9:]) for line in emulator.history if line.startswith("radio tx ")]
+        self.assertEqual([unpack_records(frame) for frame in frames], [records[0:3], records[3:6], records[6:9], records[9:]])
+
+        statistics = aggregator.statistics()
+        self.assertEqual((statistics["frames"], statistics["records"], statistics["payload_bytes"]), (4, 10, 60))
+        self.assertAlmostEqual(statistics["fill"], 0.75)
+        self.assertAlmostEqual(statistics["airtime"], 3 * lora.radio_time_on_air(18) + lora.radio_time_on_air(6))
+        self.assertAlmostEqual(statistics["airtime_unpacked"], 10 * lora.radio_time_on_air(5))
+        self.assertRaises(ValueError, aggregator.add, bytes(20))
+
+    def test_aggregator_follows_data_rate(self):
+        emulator = EmulatedRN2XX3(join_delay = 0.1)
+        self.addCleanup(emulator.close)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = emulator.port)
+        self.addCleanup(lora.close)
+        self.assertEqual(lora.join_network(JOIN_PROCEDURE_TYPES.OTAA).result(10).status, "accepted")
+        emulator.mac["rxdelay2"] = "100"
+        self.assertEqual(lora.mac_set_dr(0), "ok")
+
+        #51 bytes at DR0: five 10-byte records per frame
+        aggregator = UplinkAggregator(lora, max_latency = 0, record_size = 10, portno = 5)
+        self.assertEqual(aggregator.payload_limit(), 51)
+        futures = []
+        for i in range(7):
+            futures.extend(aggregator.add(bytes([i]) * 10))
+        futures.extend(aggregator.poll())
+        self.assertEqual([future.result(10).status for future in futures], ["mac_tx_ok"] * 2)
+        frames = [line.split(" ")[4] for line in emulator.history if line.startswith("mac tx uncnf 5 ")]
+        self.assertEqual([len(frame) // 20 for frame in frames], [5, 2])
+        self.assertEqual(aggregator.statistics()["overhead_bytes"], 2 * 13)
+
+    def test_priority_queue_reads_second_response(self):
+        lora = self.radio()
+        queue = PriorityTransmitQueue(lora)
+        messages = [queue.submit(b"message" + bytes([i]), i) for i in range(3)]
+
+        self.assertEqual(queue.run_pending(), messages[::-1])
+        self.assertEqual([message.result for message in messages], ["radio_tx_ok"] * 3)
+        self.assertEqual((queue.statistics()["sent"], queue.statistics()["rejected"]), (3, 0))
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_priority_queue_bounds_busy_retries(self):
+        #Radio commands are refused with 'busy' while the MAC is not paused
+        lora = self.radio(CONFIG_MODES.NONE)
+        queue = PriorityTransmitQueue(lora, max_attempts = 2)
+        message = queue.submit(b"refused")
+
+        self.assertEqual(queue.run_pending(), [message])
+        self.assertEqual(message.result, "busy")
+        statistics = queue.statistics()
+        self.assertEqual((statistics["sent"], statistics["rejected"], statistics["wait_max"]), (0, 1, None))
+
+    def test_priority_queue_requeue_keeps_capacity(self):
+        queue = PriorityTransmitQueue(None, capacity = 2, lorawan = True)
+        queued = [queue.submit(b"a", 5), queue.submit(b"b", 5)]
+        busy = Future()
+        busy.set_result(MacOutcome("busy", monotonic()))
+
+        low = QueuedMessage(b"low", 1, None, None, 1, UPLINK_PAYLOAD_TYPES.UNCONFIRMED, 10)
+        queue._uplink_done(low, busy)
+        self.assertEqual((queue.depth(), low.result), (2, "overflow"))
+
+        high = QueuedMessage(b"high", 9, None, None, 1, UPLINK_PAYLOAD_TYPES.UNCONFIRMED, 11)
+        queue._uplink_done(high, busy)
+        self.assertEqual(queue.depth(), 2)
+        self.assertIsNone(high.result)
+        self.assertEqual(queued[1].result, "overflow")
+
+    def test_journal_replays_after_crash(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        lora = self.radio()
+
+        journal = UplinkJournal(lora, directory, lorawan = False, commit_size = 8)
+        self.addCleanup(journal.close)
+        entries = [journal.append(b"record" + bytes([i])) for i in range(5)]
+        journal.poll()
+        journal.commit()
+        self.assertTrue(entries[0].sent)
+
+        #Crash: the journal is not closed, and the last record is torn
+        journal._file.write(b"\x00\x01\x02")
+        journal._file.flush()
+
+        recovered = UplinkJournal(lora, directory, lorawan = False)
+        self.addCleanup(recovered.close)
+        self.assertEqual([entry.data for entry in recovered.entries], [entry.data for entry in entries[1:]])
+        self.assertEqual(recovered.run_pending(30), 0)
+        self.assertEqual(recovered.statistics()["sent"], 4)
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+
+    def test_journal_drops_frames_over_the_payload_limit(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        lora = self.radio(background_reader = True)
+
+        journal = UplinkJournal(lora, directory, lorawan = False)
+        self.addCleanup(journal.close)
+        self.assertRaises(ValueError, journal.append, bytes(lora.radio_max_payload() + 1))
+        entry = journal.append(bytes(100))
+        journal.append(b"small")
+
+        #FSK frames are shorter than LoRa frames
+        self.assertEqual(lora.radio_set_mod(RADIO_MODES.FSK), "ok")
+        self.assertEqual(journal.run_pending(10), 0)
+        self.assertEqual((entry.sent, entry.result), (False, "invalid_data_len"))
+        self.assertEqual((journal.statistics()["sent"], journal.statistics()["failed"]), (1, 1))
+
+        lorawan = UplinkJournal(lora, os.path.join(directory, "lorawan"))
+        self.addCleanup(lorawan.close)
+        self.assertEqual(lora.mac_set_dr(0), "ok")
+        self.assertRaises(ValueError, lorawan.append, bytes(52))
+
+if __name__ == '__main__':
+    unittest.main()
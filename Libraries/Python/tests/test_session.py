@@ -0,0 +1,99 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# LoRaWAN session management tests against the firmware emulator.
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from time import sleep
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Turta_LoRa import *
+from Turta_LoRa_Emulator import EmulatedRN2XX3
+from Turta_LoRa_Session import SessionManager
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "session.json")
+
+    def emulator(self, network = True):
+        """Returns a new emulator with short receive windows."""
+
+        emulator = EmulatedRN2XX3(join_delay = 0.1, network = network)
+        self.addCleanup(emulator.close)
+        emulator.eeprom["rxdelay2"] = "100"
+        return emulator
+
+    def radio(self, emulator):
+        """Returns a module on an emulator."""
+
+        lora = RN2XX3(region = REGIONS.EU_RN2483, port = emulator.port)
+        self.addCleanup(lora.close)
+        return lora
+
+    def wait_checkpoint(self, manager, upctr):
+        """Waits until the session file holds an uplink counter."""
+
+        for i in range(50):
+            session = manager.load()
+            if session is not None and session["upctr"] == upctr:
+                return
+            sleep(0.05)
+        self.fail("no checkpoint with upctr " + str(upctr))
+
+    def test_restore_skips_counter_gap(self):
+        emulator = self.emulator()
+        lora = self.radio(emulator)
+        manager = SessionManager(lora, self.path, checkpoint_interval = 2, startup_jitter = 0)
+        self.assertEqual(manager.connect(1), "joined")
+        devaddr = emulator.mac["devaddr"]
+        for i in range(3):
+            self.assertEqual(manager.send_uplink(b"reading").result(10).status, "mac_tx_ok")
+        self.wait_checkpoint(manager, 2)
+        lora.close()
+
+        #Restart: the third uplink is not in the session file
+        lora = self.radio(emulator)
+        manager = SessionManager(lora, self.path, checkpoint_interval = 2, startup_jitter = 0)
+        self.assertEqual(manager.connect(1), "restored")
+        self.assertEqual((emulator.mac["devaddr"], emulator.mac["upctr"]), (devaddr, "4"))
+        self.assertEqual((manager.joins, manager.join_attempts, manager.restores), (0, 0, 1))
+        self.assertEqual(manager.load()["upctr"], 4)
+        self.assertEqual(manager.send_uplink(b"reading").result(10).status, "mac_tx_ok")
+
+    def test_rejoin_when_session_is_lost(self):
+        emulator = self.emulator()
+        manager = SessionManager(self.radio(emulator), self.path, startup_jitter = 0)
+        self.assertEqual(manager.connect(1), "joined")
+
+        #The network no longer knows the device
+        emulator.joined = False
+        self.assertEqual(manager.send_uplink(b"reading").result(10).status, "not_joined")
+        for i in range(50):
+            if manager.rejoin_needed:
+                break
+            sleep(0.05)
+        self.assertTrue(manager.rejoin_needed)
+        self.assertIsNone(manager.load())
+        self.assertEqual(manager.connect(1), "joined")
+        self.assertFalse(manager.rejoin_needed)
+        self.assertEqual(manager.joins, 2)
+
+    def test_join_backoff(self):
+        manager = SessionManager(self.radio(self.emulator(network = False)), self.path, startup_jitter = 5, backoff_base = 10, backoff_limit = 30)
+        with mock.patch("Turta_LoRa_Session.sleep") as slept, mock.patch("Turta_LoRa_Session.random") as jitter:
+            jitter.uniform.side_effect = lambda low, high: high
+            self.assertIsNone(manager.connect(4))
+        self.assertEqual([call[0][0] for call in slept.call_args_list], [5, 10, 20, 30])
+        self.assertEqual((manager.join_attempts, manager.joins), (4, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# Turta LoRa HAT Helper for Raspbian.
+# Distributed under the terms of the MIT license.
+
+# Point-to-point transport tests against the firmware emulator.
+
+import os
+import sys
+import threading
+import unittest
+from time import sleep
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Turta_LoRa import *
+from Turta_LoRa_Emulator import Channel, EmulatedRN2XX3
+from Turta_LoRa_Transport import CONTROL_FRAME, FRAME_CONTROL, FragmentLink, FrequencyHopper, RateController, ReliableLink, hop_sequence, transmit_frame
+
+class TransportTest(unittest.TestCase):
+
+    def radio(self, channel, auto_config = CONFIG_MODES.LORA_TX):
+        """Returns a module on a new emulator attached to the channel."""
+
+        emulator = EmulatedRN2XX3(channel = channel)
+        self.addCleanup(emulator.close)
+        lora = RN2XX3(region = REGIONS.EU_RN2483, auto_config = auto_config, port = emulator.port)
+        self.addCleanup(lora.close)
+        return lora
+
+    def radio_settings(self, controller):
+        """Returns the spreading factor, bandwidth and power read from the controller's module."""
+
+        lora = controller.lora
+        return (lora.radio_get_sf(True), lora.radio_get_bw(True), lora.radio_get_pwr(True))
+
+    def listen(self, function):
+        """Calls a function repeatedly from a thread until the test ends."""
+
+        stop = threading.Event()
+        def routine():
+            while not stop.is_set():
+                function()
+        thread = threading.Thread(target = routine, daemon = True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(stop.set)
+
+    def test_receive_bytes_with_receiver_left_open(self):
+        channel = Channel()
+        a = self.radio(channel)
+        b = self.radio(channel)
+        self.assertEqual(b.radio_rx(0), "ok")
+
+        #Both directions start while the receiver is still open
+        threading.Timer(0.3, a.send_bytes, (b"late",)).start()
+        self.assertEqual(b.receive_bytes(2), b"late")
+        self.assertEqual(a.wait_tx_done(2), "radio_tx_ok")
+        self.assertEqual(b.radio_rx(0), "ok")
+        self.assertTrue(transmit_frame(b, b"busy"))
+        self.assertEqual(b.sys_get_vdd(), "3300")
+
+    def test_receive_bytes_timeout_leaves_link_usable(self):
+        channel = Channel()
+        a = self.radio(channel)
+        b = self.radio(channel)
+        for i in range(3):
+            self.assertIsNone(b.receive_bytes(0.2))
+        self.assertTrue(transmit_frame(b, b"after"))
+        self.assertEqual(b.sys_get_vdd(), "3300")
+
+    def test_reliable_link_over_lossy_channel(self):
+        channel = Channel(loss = 0.2, seed = 1)
+        sender = ReliableLink(self.radio(channel), max_attempts = 20, max_rto = 1)
+        receiver = ReliableLink(self.radio(channel))
+        received = []
+        self.listen(lambda: received.extend(receiver.receive(0.5)))
+
+        payloads = [bytes([i]) * 50 for i in range(30)]
+        self.assertEqual(sender.send(payloads), len(payloads))
+        self.assertEqual(received, payloads)
+
+    def test_fragment_link_to_auto_rx_receiver(self):
+        channel = Channel()
+        sender = FragmentLink(self.radio(channel))
+        receiver = FragmentLink(self.radio(channel, CONFIG_MODES.LORA_RX))
+        received = []
+        def receive():
+            message = receiver.receive(0.5)
+            if message is not None:
+                received.append(message)
+        self.listen(receive)
+
+        message = bytes(range(256)) * 2
+        self.assertEqual(sender.send(message), "radio_tx_ok")
+        for i in range(50):
+            if received:
+                break
+            sleep(0.1)
+        self.assertEqual(received, [message])
+
+    def test_hop_sequence(self):
+        order = hop_sequence(7, 64, 3)
+        self.assertEqual(sorted(order), list(range(64)))
+        self.assertEqual(hop_sequence(7, 64, 3), order)
+        self.assertNotEqual(hop_sequence(7, 64, 4), order)
+        self.assertNotEqual(hop_sequence(8, 64, 3), order)
+
+        hopper = FrequencyHopper(self.radio(Channel()), seed = 7, dwell = 0.4)
+        self.assertEqual(hopper.slot_at(1.0), 2)
+        cycle = [hopper.channel(slot) for slot in range(16, 24)]
+        self.assertEqual(sorted(cycle), sorted(hopper.channels))
+        self.assertEqual(cycle, [hopper.channels[i] for i in hop_sequence(7, 8, 2)])
+
+    def test_frequency_hopper_link(self):
+        channel = Channel()
+        sender = FrequencyHopper(self.radio(channel), seed = 3)
+        receiver = FrequencyHopper(self.radio(channel), seed = 3)
+        received = []
+        def receive():
+            for i in range(5):
+                received.append(receiver.receive_bytes(10))
+        thread = threading.Thread(target = receive)
+        thread.start()
+        self.assertRaises(ValueError, sender.send_bytes, bytes(250))
+
+        for i in range(5):
+            sleep(sender.dwell)
+            self.assertEqual(sender.send_bytes(bytes([i]) * 8), "radio_tx_ok")
+        thread.join(15)
+        self.assertEqual(received, [bytes([i]) * 8 for i in range(5)])
+        self.assertGreater(sender.hops, 1)
+
+    def test_frequency_hopper_keeps_channel_on_failed_hop(self):
+        lora = self.radio(Channel())
+        hopper = FrequencyHopper(lora, channels = [868300000], dwell = 1)
+        self.assertRaises(ValueError, hopper.send_bytes, bytes(lora.radio_max_payload() + 1))
+
+        #The channel cannot be changed while the receiver is open
+        self.assertEqual(lora.radio_rx(0), "ok")
+        self.assertEqual(hopper.send_bytes(b"hop"), "busy")
+        self.assertEqual(lora.sys_get_vdd(), "3300")
+        self.assertEqual(lora.radio_rxstop(), "ok")
+        self.assertEqual(hopper.send_bytes(b"hop"), "radio_tx_ok")
+
+    def test_rate_controller_decisions(self):
+        controller = RateController(self.radio(Channel()), rate = 2, power = 8)
+        self.assertEqual(self.radio_settings(controller), ("sf10", "125", "8"))
+        controller.observe(-12, 7)
+        self.assertIsNone(controller.decide())
+
+        #Margin of 3 dB over the SF10 floor: more power, then a slower rate
+        controller.observe(-12)
+        self.assertEqual(controller.decide(), (2, 11))
+        controller._apply(2, 14)
+        controller.observe(-12, 8)
+        self.assertEqual(controller.decide(), (1, 14))
+
+        #Loss over the target with a good margin
+        controller.observe(10, 6, 2)
+        self.assertEqual(controller.decide(), (1, 14))
+
+        #Enough margin for SF9, then for less power at the fastest rate
+        controller._apply(2, 14)
+        controller.observe(10, 8)
+        self.assertEqual(controller.decide(), (3, 14))
+        controller._apply(len(controller.rates) - 1, 14)
+        controller.observe(10, 8)
+        self.assertEqual(controller.decide(), (len(controller.rates) - 1, 11))
+
+    def test_rate_controller_negotiation(self):
+        channel = Channel()
+        proposer = RateController(self.radio(channel), rate = 4)
+        peer = RateController(self.radio(channel), rate = 4)
+        def answer():
+            frame = peer.lora.receive_bytes(0.5)
+            if frame is not None:
+                peer.handle(frame)
+        self.listen(answer)
+
+        proposer.observe(10, 8)
+        self.assertTrue(proposer.propose())
+        self.assertEqual((proposer.rate, peer.rate, proposer.changes, peer.changes), (5, 5, 1, 1))
+        self.assertEqual(self.radio_settings(proposer)[0], "sf7")
+
+    def test_rate_controller_fallback(self):
+        controller = RateController(self.radio(Channel()), rate = 4, fallback = 0.2)
+        self.assertTrue(controller.handle(CONTROL_FRAME.pack(FRAME_CONTROL, 1, 5, 14, 0)))
+        self.assertEqual(controller.rate, 5)
+        self.assertFalse(controller.check_fallback())
+
+        #Nothing heard on the new settings
+        sleep(0.3)
+        self.assertTrue(controller.check_fallback())
+        self.assertEqual((controller.rate, controller.reverts), (4, 1))
+
+        #A frame on the new settings confirms them
+        controller.handle(CONTROL_FRAME.pack(FRAME_CONTROL, 2, 5, 14, 0))
+        controller.observe(8)
+        sleep(0.3)
+        self.assertFalse(controller.check_fallback())
+        self.assertEqual(controller.rate, 5)
+        self.assertFalse(controller.handle(b"data"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+#This sample demonstrates receiving packets with the asyncio interface while doing other work.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+import asyncio
+from turta_lorahat import Turta_LoRa
+from turta_lorahat import Turta_LoRa_Async
+
+async def receive(lora):
+    while True:
+        #Wait for a packet without blocking the event loop
+        buffer = await lora.check_data()
+
+        #If data is received, print it
+        if buffer is not None:
+            print(buffer)
+
+async def heartbeat():
+    while True:
+        print("Still running...")
+        await asyncio.sleep(10)
+
+async def main():
+    #Initialize
+    async with Turta_LoRa_Async.AsyncRN2XX3(region = Turta_LoRa.REGIONS.US_RN2903, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX) as lora:
+        print("Radio is set to receive.")
+        await asyncio.gather(receive(lora), heartbeat())
+
+try:
+    asyncio.run(main())
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+#This sample compares reconfiguring the radio with sequential commands and with a pipelined command batch.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from time import perf_counter
+from turta_lorahat import Turta_LoRa
+
+#Settings to switch between on every round
+PROFILES = [
+    (868100000, Turta_LoRa.SPREADING_FACTORS.SF7, Turta_LoRa.RADIO_BW.BW_125, 14),
+    (868300000, Turta_LoRa.SPREADING_FACTORS.SF9, Turta_LoRa.RADIO_BW.BW_250, 10),
+    (868500000, Turta_LoRa.SPREADING_FACTORS.SF12, Turta_LoRa.RADIO_BW.BW_125, 5)
+]
+ROUNDS = 30
+
+def reconfigure(lora, profile):
+    freq, sf, bw, pwr = profile
+    lora.radio_set_freq(freq)
+    lora.radio_set_sf(sf)
+    lora.radio_set_bw(bw)
+    lora.radio_set_pwr(pwr)
+    lora.radio_set_cr(Turta_LoRa.CODING_RATES.R_4_5)
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_TX)
+
+try:
+    #Sequential: One round trip per command
+    start = perf_counter()
+    for i in range(ROUNDS):
+        reconfigure(lora, PROFILES[i % len(PROFILES)])
+    sequential = (perf_counter() - start) / ROUNDS
+
+    #Batch: Commands are pipelined, responses are matched in order
+    failures = 0
+    start = perf_counter()
+    for i in range(ROUNDS):
+        with lora.batch() as b:
+            reconfigure(lora, PROFILES[i % len(PROFILES)])
+        failures += len(b.failed)
+    batched = (perf_counter() - start) / ROUNDS
+
+    print("Sequential......: " + str(round(sequential * 1000, 1)) + " ms per reconfiguration")
+    print("Batch...........: " + str(round(batched * 1000, 1)) + " ms per reconfiguration")
+    print("Speedup.........: " + str(round(sequential / batched, 2)) + "x")
+    print("Failed commands.: " + str(failures))
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
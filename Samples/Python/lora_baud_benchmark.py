@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+#This sample measures the command latency at each UART baud rate the module accepts with auto-baud.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from time import perf_counter
+from turta_lorahat import Turta_LoRa
+
+RATES = (57600, 115200, 230400, 460800)
+COMMANDS = 100
+
+#Longest command line: radio tx with a 255 byte payload
+TX_LINE = len("radio tx ") + 2 * 255 + 2
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483)
+
+try:
+    for rate in RATES:
+        if lora.negotiate_baudrate([rate]) != rate:
+            print(str(rate).rjust(7) + " baud: not accepted, back at " + str(lora.baudrate) + " baud")
+            continue
+
+        latencies = []
+        for i in range(COMMANDS):
+            start = perf_counter()
+            lora.sys_get_vdd()
+            latencies.append(perf_counter() - start)
+        latencies.sort()
+
+        print(str(rate).rjust(7) + " baud: " +
+            "mean " + str(round(sum(latencies) / COMMANDS * 1000, 2)) + " ms, " +
+            "p90 " + str(round(latencies[int(COMMANDS * 0.9)] * 1000, 2)) + " ms, " +
+            "255 byte radio tx line " + str(round(TX_LINE * 10.0 / rate * 1000, 1)) + " ms")
+
+    #Back to the reset baud rate
+    lora.negotiate_baudrate([])
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
+
+finally:
+    lora.close()
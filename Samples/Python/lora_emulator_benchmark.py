@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+#This sample measures command latency and packet throughput against two emulated LoRa modules sharing a simulated channel.
+#It runs on any Linux computer, no LoRa HAT is required.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+from time import perf_counter
+from turta_lorahat import Turta_LoRa, Turta_LoRa_Emulator
+
+COMMANDS = 100
+PACKETS = 20
+
+#Emulated modules on a shared channel
+channel = Turta_LoRa_Emulator.Channel()
+rx_module = Turta_LoRa_Emulator.EmulatedRN2XX3(channel = channel)
+tx_module = Turta_LoRa_Emulator.EmulatedRN2XX3(channel = channel)
+
+#Initialize
+rx = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX, port = rx_module.port, background_reader = True)
+tx = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_TX, port = tx_module.port)
+
+try:
+    #Command round trip
+    start = perf_counter()
+    for i in range(COMMANDS):
+        tx.sys_get_vdd()
+    latency = (perf_counter() - start) / COMMANDS
+
+    #Packets, from send to reception
+    received = 0
+    start = perf_counter()
+    for i in range(PACKETS):
+        tx.send("Packet " + str(i))
+        tx.wait_tx_done()
+        if rx.check_data(1) is not None:
+            received += 1
+    elapsed = perf_counter() - start
+
+    print("Command latency.: " + str(round(latency * 1000, 2)) + " ms")
+    print("Throughput......: " + str(round(PACKETS / elapsed, 2)) + " packets/s")
+    print("Received........: " + str(received) + " of " + str(PACKETS))
+    print("Time on air.....: " + str(round(tx.radio_time_on_air(9) * 1000, 1)) + " ms per packet")
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
+
+finally:
+    rx.close()
+    tx.close()
+    rx_module.close()
+    tx_module.close()
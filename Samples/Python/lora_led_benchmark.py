@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+#This sample measures the packet rate with each status LED policy.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from time import perf_counter
+from turta_lorahat import Turta_LoRa
+
+PACKETS = 20
+PAYLOAD = b"\x00" * 8
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_TX)
+
+#Shortest time on air, so the UART traffic is a visible share of every packet
+lora.radio_set_sf(Turta_LoRa.SPREADING_FACTORS.SF7)
+lora.radio_set_bw(Turta_LoRa.RADIO_BW.BW_500)
+
+try:
+    for policy in (Turta_LoRa.LED_POLICIES.SYNC, Turta_LoRa.LED_POLICIES.COALESCED, Turta_LoRa.LED_POLICIES.DISABLED):
+        lora.set_led_policy(policy)
+        failures = 0
+        start = perf_counter()
+        for i in range(PACKETS):
+            if lora.send_bytes(PAYLOAD) != "ok" or lora.wait_tx_done() != "radio_tx_ok":
+                failures += 1
+        elapsed = perf_counter() - start
+
+        print((policy.name + " ").ljust(16, ".") + ": " + str(round(PACKETS / elapsed, 2)) + " packets/s, " + str(failures) + " failed")
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+#This sample receives packets and shows the link quality of each sender.
+#The first byte of each payload is taken as the sender id, the second as a sequence number.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from turta_lorahat import Turta_LoRa
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX)
+monitor = lora.enable_link_quality(capacity = 128, sender = lambda payload: payload[0], sequence = lambda payload: payload[1])
+print("Radio is set to receive.")
+
+try:
+    while True:
+        payload = lora.check_bytes()
+        if payload is None or len(payload) < 2:
+            continue
+
+        stats = monitor.statistics(payload[0])
+        print("Sender " + str(payload[0]) + ": SNR " + str(monitor.samples[-1].snr) + " dB" +
+            ", median SNR " + str(stats["snr_p50"]) + " dB" +
+            ", 10th percentile SNR " + str(stats["snr_p10"]) + " dB" +
+            ", mean RSSI " + str(stats["rssi_mean"]) + " dBm" +
+            ", loss " + str(round(stats["loss"] * 100, 1)) + "%")
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+#This sample transmits packets, then shows where the time went for each command on the UART link.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from turta_lorahat import Turta_LoRa
+
+PACKETS = 10
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_TX)
+lora.stats.reset()
+
+try:
+    for i in range(PACKETS):
+        lora.send("Packet " + str(i))
+        lora.wait_tx_done()
+
+    snapshot = lora.stats.snapshot()
+    for cmd_type, subcommands in sorted(snapshot["commands"].items()):
+        for sub, stats in sorted(subcommands.items()):
+            print((cmd_type + " " + sub + " ").ljust(20, ".") + ": " + str(stats["count"]) + " calls, " +
+                "round trip " + str(round(stats["latency_mean"] * 1000, 2)) + " ms, " +
+                "UART " + str(round(stats["uart_time_mean"] * 1000, 2)) + " ms, " +
+                "library " + str(round(stats["overhead_mean"] * 1000, 3)) + " ms, " +
+                str(stats["timeouts"]) + " timeouts, " + str(stats["errors"]) + " errors")
+
+    totals = snapshot["totals"]
+    print("Commands/s..........: " + str(round(totals["commands_per_second"], 1)))
+    print("Bytes/s.............: " + str(round(totals["bytes_per_second"], 1)))
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+#This sample records the UART traffic while receiving packets, then replays the recording without the radio.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from time import monotonic
+from turta_lorahat import Turta_LoRa
+
+RECORDING = "lora_rx.rec"
+PACKETS = 5
+REPLAY_SPEED = 10
+
+try:
+    #Record: Initialization and reception are written to the recording file
+    lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX, record_path = RECORDING)
+    print("Recording " + str(PACKETS) + " packets.")
+    received = 0
+    while received < PACKETS:
+        buffer = lora.check_data()
+        if buffer is not None:
+            received += 1
+            print(buffer)
+    lora.stop_recording()
+    lora.close()
+
+    #Replay: The same calls are answered from the recording
+    print("Replaying at " + str(REPLAY_SPEED) + "x speed.")
+    replay = Turta_LoRa.ReplaySerial(RECORDING, speed = REPLAY_SPEED)
+    start = monotonic()
+    lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX, port = replay)
+    while not replay.exhausted:
+        buffer = lora.check_data()
+        if buffer is not None:
+            print(buffer)
+    print("Replayed in " + str(round(monotonic() - start, 2)) + " s, " + str(replay.mismatches) + " commands differed from the recording.")
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
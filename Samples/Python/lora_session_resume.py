@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+#This sample demonstrates resuming the LoRaWAN session after a restart, without joining again.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should enable SPI and I2C from the Raspberry Pi's configuration.
+# To do so, type 'sudo raspi-config' to the terminal, then go to 'Interfacing Options' and enable both SPI and I2C.
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+# - The OTAA keys should be stored in the module with 'mac save' beforehand.
+
+from time import sleep
+from turta_lorahat import Turta_LoRa
+from turta_lorahat import Turta_LoRa_Session
+from turta_lorahat import Turta_Analog
+
+#Initialize
+analog = Turta_Analog.ADC()
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483)
+session = Turta_LoRa_Session.SessionManager(lora, "lorawan_session.json")
+
+#Resume the last session, or join if there is none
+print("Connecting...")
+print("Result:", session.connect())
+
+try:
+    while True:
+        #Rejoin if the network no longer knows the session
+        if session.rejoin_needed:
+            print("Rejoining...")
+            print("Result:", session.connect())
+
+        #Send the board temperature
+        board_temp_c = analog.read_temperature()
+        payload = int(round(board_temp_c * 10)).to_bytes(2, "big", signed = True)
+        outcome = session.send_uplink(payload, 1).result()
+        print("Uplink:", outcome.status)
+
+        #Wait
+        sleep(60)
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    session.checkpoint()
+    lora.close()
+    print('Bye.')
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+#This sample reads the radio and LoRaWAN parameters in one pipelined exchange, as typed values.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+
+from time import sleep
+from turta_lorahat import Turta_LoRa
+
+#Initialize
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483, auto_config = Turta_LoRa.CONFIG_MODES.LORA_RX)
+
+try:
+    while True:
+        status = lora.status_snapshot()
+
+        print("Read in.........: " + str(round(status.duration * 1000, 1)) + " ms")
+        print("Frequency.......: " + str(status.radio_freq) + " Hz")
+        print("Spreading factor: " + status.radio_sf.name)
+        print("Bandwidth.......: " + status.radio_bw.value + " kHz")
+        print("Power...........: " + str(status.radio_pwr) + " dBm")
+        print("Last SNR........: " + str(status.radio_snr) + " dB")
+        print("Joined..........: " + str(status.mac_status.joined))
+        print("MAC state.......: " + str(status.mac_status.state))
+        print("-----")
+
+        #Wait
+        sleep(5.0)
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    print('Bye.')
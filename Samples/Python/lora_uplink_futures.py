@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+#This sample demonstrates queueing LoRaWAN uplinks and doing other work while the receive windows are open.
+#Install LoRa HAT library with "pip3 install turta-lorahat"
+
+#Raspberry Pi Configuration
+# - You should enable SPI and I2C from the Raspberry Pi's configuration.
+# To do so, type 'sudo raspi-config' to the terminal, then go to 'Interfacing Options' and enable both SPI and I2C.
+# - You should swap the serial ports of the Raspberry Pi.
+# Set "/dev/ttyAMA0" to 'serial0'. Also, disable the console on 'serial0'.
+# For a how-to, visit our documentation at https://docs.turta.io/how-tos/raspberry-pi/raspbian/swapping-the-serial-ports
+# - The LoRaWAN keys should be stored in the module with 'mac save' beforehand.
+
+from time import sleep
+from turta_lorahat import Turta_LoRa
+from turta_lorahat import Turta_Analog
+
+#Initialize
+analog = Turta_Analog.ADC()
+lora = Turta_LoRa.RN2XX3(region = Turta_LoRa.REGIONS.EU_RN2483)
+
+#Join; the uplinks below wait in the queue until the join completes
+join = lora.join_network(Turta_LoRa.JOIN_PROCEDURE_TYPES.OTAA)
+uplinks = []
+
+try:
+    while True:
+        #Queue the board temperature, returns at once
+        board_temp_c = analog.read_temperature()
+        payload = int(round(board_temp_c * 10)).to_bytes(2, "big", signed = True)
+        uplinks.append(lora.send_uplink(payload, 1))
+
+        #Report completed operations
+        if join is not None and join.done():
+            print("Join:", join.result().status)
+            join = None
+        for uplink in [u for u in uplinks if u.done()]:
+            uplinks.remove(uplink)
+            outcome = uplink.result()
+            print("Uplink:", outcome.status, "in", round(outcome.completed_at - outcome.started_at, 2), "s")
+            if outcome.data is not None:
+                print("Downlink on port", outcome.port, ":", outcome.data.hex())
+
+        #Other work goes here
+        sleep(10)
+
+#Exit on CTRL+C
+except KeyboardInterrupt:
+    lora.close()
+    print('Bye.')